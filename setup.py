@@ -4,6 +4,7 @@ from codecs import open
 import os
 
 from setuptools import setup, find_packages
+from setuptools.command.build_py import build_py
 
 DESCRIPTION = "A python client and CLI for accessing the SolidFire API."
 
@@ -13,6 +14,16 @@ if os.path.exists('README.rst'):
 else:
     LONG_DESCRIPTION = DESCRIPTION
 
+
+class BuildPy(build_py):
+    """Regenerates the sfcli command manifest in the build tree."""
+
+    def run(self):
+        build_py.run(self)
+        from solidfire.cli import commands
+        commands.write_manifest(os.path.join(self.build_lib, 'solidfire',
+                                             'cli', 'commands'))
+
 setup(
     name='solidfire-python',
     version='0.0.1',
@@ -23,6 +34,7 @@ setup(
     packages=find_packages(exclude=["solidfire.tests"]),
     license='MIT',
     zip_safe=False,
+    cmdclass={'build_py': BuildPy},
     url='http://github.com/j-griffith/solidfire-python',
     entry_points={
         'console_scripts': [
@@ -31,7 +43,6 @@ setup(
     },
     install_requires=[
         'six >= 1.7.0',
-        'prettytable >= 0.7.0',
         'click >= 5',
         'requests >= 2.7.0',
         'prompt_toolkit',
@@ -39,7 +50,13 @@ setup(
     tests_require=[
         'mock',
         'nose2',
+        'prettytable >= 0.7.0',
     ],
+    extras_require={
+        # solidfire.tests.benchmark prints its results with prettytable.
+        'benchmark': ['prettytable >= 0.7.0'],
+    },
+    test_suite='nose2.collector.collector',
     keywords=['solidfire'],
     classifiers=[
         'Environment :: Console',
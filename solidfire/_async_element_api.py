@@ -0,0 +1,284 @@
+"""Implementation of solidfire.async_element_api; import that instead.
+
+This module uses Python 3.6+ syntax; async_element_api refuses to import
+it on older versions rather than failing with a SyntaxError.
+"""
+
+import asyncio
+import base64
+import logging
+import ssl
+import time
+
+from six.moves.urllib import parse
+
+from solidfire import codec
+from solidfire import solidfire_element_api
+from solidfire import throttle
+from solidfire import utils
+
+LOG = logging.getLogger(__name__)
+
+
+class _Connection(object):
+    """A single keep-alive HTTP/1.1 connection."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.reused = False
+
+    def close(self):
+        self.writer.close()
+
+
+class _ConnectionPool(object):
+    """Per-endpoint pool of idle connections with a cap on open ones."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._idle = {}
+        self._slots = {}
+        self._ssl_context = None
+
+    def _get_ssl_context(self):
+        # Mirrors verify=False on the synchronous client.
+        if self._ssl_context is None:
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+            self._ssl_context = context
+        return self._ssl_context
+
+    def slot(self, key):
+        if key not in self._slots:
+            self._slots[key] = asyncio.Semaphore(self.maxsize)
+        return self._slots[key]
+
+    async def acquire(self, key):
+        idle = self._idle.setdefault(key, [])
+        while idle:
+            conn = idle.pop()
+            if not conn.writer.is_closing():
+                conn.reused = True
+                return conn
+        scheme, host, port = key
+        ssl_context = self._get_ssl_context() if scheme == 'https' else None
+        reader, writer = await asyncio.open_connection(host, port,
+                                                       ssl=ssl_context)
+        return _Connection(reader, writer)
+
+    def release(self, key, conn, keep_alive=True):
+        if keep_alive and not conn.writer.is_closing():
+            self._idle.setdefault(key, []).append(conn)
+        else:
+            conn.close()
+
+    def close(self):
+        for conns in self._idle.values():
+            for conn in conns:
+                conn.close()
+        self._idle = {}
+
+
+async def _read_headers(reader):
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            return headers
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+
+async def _read_body(reader, headers):
+    """Returns (body, reusable); reusable is False if EOF ended the body."""
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                # Skip any trailers up to the terminating blank line.
+                while (await reader.readline()) not in (b'\r\n', b''):
+                    pass
+                return b''.join(chunks), True
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+    if 'content-length' in headers:
+        return (await reader.readexactly(int(headers['content-length'])),
+                True)
+    # NOTE: Only the server closing the connection ends this body, so the
+    # connection can't be used again.
+    return await reader.read(), False
+
+
+async def _http_post(conn, url, body, auth):
+    """POSTs body over conn; returns (status, body, keep_alive)."""
+    parsed = parse.urlsplit(url)
+    credentials = base64.b64encode(
+        ('%s:%s' % auth).encode('utf-8')).decode('ascii')
+    request = ('POST %s HTTP/1.1\r\n'
+               'Host: %s\r\n'
+               'Authorization: Basic %s\r\n'
+               'Content-Type: application/json\r\n'
+               'Content-Length: %d\r\n'
+               'Connection: keep-alive\r\n'
+               '\r\n' % (parsed.path or '/', parsed.netloc, credentials,
+                         len(body)))
+    conn.writer.write(request.encode('latin-1') + body)
+    await conn.writer.drain()
+
+    while True:
+        status_line = await conn.reader.readline()
+        if not status_line:
+            raise ConnectionResetError('Connection closed by %s' %
+                                       parsed.netloc)
+        status = int(status_line.split()[1])
+        headers = await _read_headers(conn.reader)
+        # Interim responses (100 Continue and the like) precede the real
+        # one.
+        if not 100 <= status < 200:
+            break
+    data, reusable = await _read_body(conn.reader, headers)
+    keep_alive = reusable and \
+        headers.get('connection', '').lower() != 'close'
+    return status, data, keep_alive
+
+
+class AsyncSolidFireAPI(solidfire_element_api.SolidFireAPI):
+    """The asyncio API for controlling a SolidFire cluster."""
+    def __init__(self, *args, **kwargs):
+        super(AsyncSolidFireAPI, self).__init__(*args, **kwargs)
+        self._pool = _ConnectionPool(self.pool_maxsize)
+        # Set whenever an in-flight limiter slot is given back.
+        self._released = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    def close(self):
+        """Close any pooled connections held by this client."""
+        super(AsyncSolidFireAPI, self).close()
+        self._pool.close()
+
+    async def aclose(self):
+        """Coroutine flavour of close(), as used by async with."""
+        self.close()
+
+    async def _acquire(self, limiter):
+        """Waits for a slot of limiter without blocking the event loop."""
+        if self._released is None:
+            self._released = asyncio.Event()
+        while not limiter.try_acquire():
+            self._released.clear()
+            await self._released.wait()
+
+    def _release(self, limiter, method, latency, overloaded):
+        limiter.release(method, latency, overloaded)
+        self._released.set()
+
+    async def _apost(self, url, body, auth):
+        parsed = parse.urlsplit(url)
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        key = (parsed.scheme, parsed.hostname, port)
+        async with self._pool.slot(key):
+            while True:
+                conn = await self._pool.acquire(key)
+                try:
+                    status, data, keep_alive = await _http_post(
+                        conn, url, body, auth)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    conn.close()
+                    # An idle keep-alive connection may have been dropped
+                    # by the server; retry once on a fresh connection.
+                    if conn.reused:
+                        continue
+                    raise
+                except BaseException:
+                    conn.close()
+                    raise
+                self._pool.release(key, conn, keep_alive)
+                return status, data
+
+    async def send_request(self, method, params, endpoint=None,
+                           result_key=None, stream=False, fields=None):
+        if stream:
+            raise ValueError('AsyncSolidFireAPI reads responses whole; '
+                             'call without stream=True')
+        url, endpoint_dict, payload = self._prepare_request(method, params,
+                                                            endpoint)
+
+        body = codec.encode(payload)
+        LOG.debug('Issue SolidFire API call: %s', codec.LazyText(body))
+
+        limiter = self._get_limiter(endpoint_dict['url'])
+        attempt = 0
+        while True:
+            attempt += 1
+            await self._acquire(limiter)
+            start_time = time.time()
+            overloaded = False
+            ok = False
+            data = b''
+            try:
+                status, data = await asyncio.wait_for(
+                    self._apost(url, body, (endpoint_dict['login'],
+                                            endpoint_dict['password'])),
+                    self.timeout)
+                if status >= 500:
+                    response = {'error': {'name': 'xHTTPError',
+                                          'code': status,
+                                          'message': 'HTTP %s from %s' %
+                                                     (status, url)}}
+                else:
+                    response = codec.decode(data)
+                result = self._parse_response(response, result_key,
+                                              fields)
+                ok = True
+            except Exception as ex:
+                overloaded = throttle.is_overload(ex)
+                if not self.retry_policy.should_retry(method, ex, attempt):
+                    raise
+                LOG.debug('Retrying %s after error: %s', method, ex)
+            finally:
+                duration = time.time() - start_time
+                self._release(limiter, method, duration, overloaded)
+                self.metrics.record(method, start_time, duration, ok,
+                                    len(body), len(data))
+            if ok:
+                if self._listeners:
+                    self._notify(method, params, response['result'])
+                return result
+            await asyncio.sleep(self.retry_policy.delay(attempt))
+
+    async def map(self, method, params_list,
+                  concurrency=utils.DEFAULT_CONCURRENCY, ordered=False):
+        """Issue `method` once for every dict in params_list concurrently.
+
+        Asynchronous generator counterpart of SolidFireAPI.map; at most
+        `concurrency` calls are in flight and (index, result, error)
+        tuples are yielded in completion or input order."""
+        limit = asyncio.Semaphore(concurrency)
+
+        async def call(index, params):
+            async with limit:
+                try:
+                    return index, await self.send_request(method, params), None
+                except Exception as ex:
+                    return index, None, ex
+
+        tasks = [asyncio.ensure_future(call(index, params))
+                 for index, params in enumerate(params_list)]
+        try:
+            if ordered:
+                for task in tasks:
+                    yield await task
+            else:
+                for task in asyncio.as_completed(tasks):
+                    yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -1,23 +1,60 @@
-import json
 import logging
+import threading
 import time
 
 import warnings
 import requests
 from requests.packages.urllib3 import exceptions
 
+from solidfire import codec
 from solidfire import exceptions as sfexceptions
+from solidfire import metrics
 
 LOG = logging.getLogger(__name__)
 
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = 10
+
 
 class SolidFireClient(object):
     """The API for controlling a SolidFire cluster."""
     def __init__(self, *args, **kwargs):
         self.endpoint_dict = kwargs.get('endpoint_dict')
         self.endpoint_version = kwargs.get('endpoint_version', '7.0')
+        self.pool_connections = kwargs.get('pool_connections',
+                                           DEFAULT_POOL_CONNECTIONS)
+        self.pool_maxsize = kwargs.get('pool_maxsize', DEFAULT_POOL_MAXSIZE)
         self.raw = True
-        self.request_history = []
+        self.metrics = metrics.MetricsStore(
+            kwargs.get('history_size', metrics.DEFAULT_HISTORY_SIZE))
+        # Bounded (method, start_time, duration, status) history.
+        self.request_history = self.metrics.recent
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        """Keep-alive HTTP session shared by every call on this client."""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = requests.adapters.HTTPAdapter(
+                        pool_connections=self.pool_connections,
+                        pool_maxsize=self.pool_maxsize,
+                        pool_block=True)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    session.verify = False
+                    self._session = session
+        return self._session
+
+    def close(self):
+        """Close any pooled connections held by this client."""
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
 
     def issue_request(self, method, params, endpoint=None):
         if params is None:
@@ -27,35 +64,37 @@ class SolidFireClient(object):
         # to enable some of the multi-cluster features like replication etc
         if endpoint is None:
             endpoint_dict = self.endpoint_dict
+        else:
+            endpoint_dict = endpoint
         payload = {'method': method, 'params': params}
         url = '%s/json-rpc/%s/' % (endpoint_dict['url'], self.endpoint_version)
-        LOG.debug('Issue SolidFire API call: %s' % json.dumps(payload))
+        data = codec.encode(payload)
+        LOG.debug('Issue SolidFire API call: %s', codec.LazyText(data))
 
         start_time = time.time()
         with warnings.catch_warnings():
             warnings.simplefilter("ignore", exceptions.InsecureRequestWarning)
-            req = requests.post(url,
-                                data=json.dumps(payload),
-                                auth=(endpoint_dict['login'],
-                                      endpoint_dict['password']),
-                                verify=False,
-                                timeout=30)
+            req = self.session.post(url,
+                                    data=data,
+                                    auth=(endpoint_dict['login'],
+                                          endpoint_dict['password']),
+                                    verify=False,
+                                    timeout=30)
 
         # FIXME(jdg): Failure cases like wrong password
         # missing something that cause req.json to puke
-        response = req.json()
-        req.close()
+        response = codec.decode(req.content)
         end_time = time.time()
         duration = end_time - start_time
 
-        LOG.debug('Raw response data from SolidFire API: %s' % response)
+        LOG.debug('Raw response data from SolidFire API: %s', response)
         # TODO(jdg): Add check/retry catch for things where it's appropriate
         if 'error' in response:
             msg = ('API response: %s'), response
-            self.request_history.append(
-                (method, start_time, duration, 'failed'))
-            LOG.error('Error in API request: %s' % response['error'])
+            self.metrics.record(method, start_time, duration, False,
+                                len(data), len(req.content))
+            LOG.error('Error in API request: %s', response['error'])
             raise sfexceptions.SolidFireRequestException(msg)
-        self.request_history.append(
-            (method, start_time, duration, 'ok'))
+        self.metrics.record(method, start_time, duration, True,
+                            len(data), len(req.content))
         return response['result']
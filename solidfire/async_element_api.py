@@ -0,0 +1,28 @@
+"""asyncio flavour of the SolidFire Element API client.
+
+AsyncSolidFireAPI inherits every method wrapper from
+solidfire_element_api.SolidFireAPI and only replaces the transport, so the
+two clients always expose the same method surface.  Each wrapper returns a
+coroutine instead of a result:
+
+    >>> sf_client = AsyncSolidFireAPI(endpoint_dict=endpoint_info,
+    ...                               api_version='7.0')
+    >>> volumes = await sf_client.list_volumes()
+    >>> await sf_client.aclose()
+
+Requests go over a small HTTP/1.1 keep-alive connection pool built on
+asyncio streams, so thousands of calls can be in flight from one event
+loop without a thread per call, within the same adaptive in-flight limit
+as the synchronous client.  Responses are read whole; stream=True is
+refused.  This module requires Python 3.6+.
+"""
+
+import sys
+
+if sys.version_info < (3, 6):
+    raise ImportError('solidfire.async_element_api requires Python 3.6 or '
+                      'later')
+
+from solidfire._async_element_api import AsyncSolidFireAPI  # noqa: E402
+
+__all__ = ['AsyncSolidFireAPI']
@@ -0,0 +1,88 @@
+"""sfcli command groups, one cmd_<name>.py module per group.
+
+Listing the groups (for `sfcli --help` or shell completion) goes through
+a manifest of names and short help strings instead of scanning this
+directory and importing every module.  The manifest lives in _manifest.py
+and is regenerated by setup.py at build time; refresh it after adding or
+renaming a command group with:
+
+    python -c 'from solidfire.cli import commands; commands.write_manifest()'
+
+Until then the directory is scanned instead, since a command module
+missing from the manifest, or changed since it was written, would
+otherwise be left out of the listing or described wrongly.
+"""
+
+import os
+
+COMMANDS_DIR = os.path.dirname(os.path.abspath(__file__))
+MANIFEST_FILE = '_manifest.py'
+
+# Seconds a command module may be newer than the manifest without making
+# it stale; installers write the files of a package one after another.
+MTIME_SLACK = 2.0
+
+
+def _modules(path):
+    return [filename for filename in os.listdir(path)
+            if filename.startswith('cmd_') and filename.endswith('.py')]
+
+
+def scan(path=COMMANDS_DIR):
+    """Returns {name: short help} for the cmd_*.py modules under path.
+
+    Modules are parsed rather than imported, so this works without the
+    CLI's dependencies installed."""
+    import ast
+
+    commands = {}
+    for filename in sorted(_modules(path)):
+        with open(os.path.join(path, filename)) as source:
+            tree = ast.parse(source.read(), filename)
+        doc = ''
+        for node in tree.body:
+            if isinstance(node, ast.FunctionDef) and node.name == 'cli':
+                doc = (ast.get_docstring(node) or '').split('\n')[0]
+        commands[filename[4:-3]] = doc
+    return commands
+
+
+def write_manifest(path=COMMANDS_DIR):
+    """Regenerates the manifest for the command modules under path."""
+    lines = ['# Generated by solidfire.cli.commands.write_manifest, '
+             'do not edit.', '', 'COMMANDS = {']
+    for name, doc in sorted(scan(path).items()):
+        lines.append('    %r: %r,' % (name, doc))
+    lines.append('}')
+    with open(os.path.join(path, MANIFEST_FILE), 'w') as manifest:
+        manifest.write('\n'.join(lines) + '\n')
+
+
+def is_stale(manifest, path=COMMANDS_DIR):
+    """True if manifest doesn't match the command modules under path.
+
+    Only file names and modification times are compared, so this is
+    cheap; a module newer than the manifest counts as changed."""
+    try:
+        modules = _modules(path)
+        if set(name[4:-3] for name in modules) != set(manifest):
+            return True
+        written = os.path.getmtime(os.path.join(path, MANIFEST_FILE))
+        return any(os.path.getmtime(os.path.join(path, name)) >
+                   written + MTIME_SLACK for name in modules)
+    except OSError:
+        return False
+
+
+def load_manifest():
+    """Returns {name: short help} for every command group.
+
+    The command modules are scanned if the manifest is missing or
+    stale."""
+    try:
+        from solidfire.cli.commands._manifest import COMMANDS
+    except ImportError:
+        return scan()
+    if is_stale(COMMANDS):
+        return scan()
+    return COMMANDS
@@ -0,0 +1,8 @@
+# Generated by solidfire.cli.commands.write_manifest, do not edit.
+
+COMMANDS = {
+    'accounts': 'Account methods.',
+    'inventory': 'Local inventory mirror.',
+    'snapshots': 'Snapshot methods.',
+    'volumes': 'Volume methods.',
+}
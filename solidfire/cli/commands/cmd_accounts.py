@@ -2,6 +2,7 @@ import click
 
 from solidfire.cli import utils as cli_utils
 from solidfire.cli.cli import pass_context
+from solidfire.managers import paging
 from solidfire.solidfire_element_api import SolidFireRequestException
 from solidfire import utils
 
@@ -17,7 +18,7 @@ def cli(ctx):
 @pass_context
 def list(ctx):
     """List Accounts."""
-    accounts = ctx.sfapi.list_accounts()
+    accounts = paging.iter_accounts(ctx.sfapi)
     key_list = ['username', 'status', 'initiatorSecret', 'targetSecret',
                 'volumes', 'attributes', 'accountID']
     cli_utils.print_list(accounts, key_list)
@@ -37,18 +38,22 @@ def delete(ctx, accounts, purge):
 
 
 @cli.command('show', short_help='Show details for the specified account')
-@click.argument('account-id',
-                type=int,
+@click.argument('account',
                 required=True)
-def show(ctx, account_id):
-    account = ctx.sfapi.get_account_by_id(account_id)['account']
+@pass_context
+def show(ctx, account):
+    """Show the account with the given ID or username."""
+    if account.isdigit():
+        account = ctx.sfapi.get_account_by_id(int(account))['account']
+    else:
+        account = ctx.sfapi.get_account_by_name(account)['account']
     cli_utils.print_dict(account)
 
 
 @cli.command('add', short_help='Add new account to Cluster')
 @click.argument('user-name',
                 required=True)
-@click.option('--intiator-secret',
+@click.option('--initiator-secret', '--intiator-secret', 'initiator_secret',
               default=None,
               help='Chap Initiator Secret to assign to account.')
 @click.option('--target-secret',
@@ -58,13 +63,18 @@ def show(ctx, account_id):
               default=None,
               help='Key Value pairs to set account attributes '
                    '(--attributes attrName=val1,attrName2=val2...)')
+@pass_context
 def add(ctx, user_name,
         initiator_secret=None, target_secret=None,
         attributes=None):
-    """Creates <count> clones of volume specified by volume-id."""
+    """Creates a new account named <user-name>."""
     if attributes:
         attributes = utils.kv_string_to_dict(attributes)
-    new_account_id = ctx.sfapi.add_account(user_name, initiator_secret,
-                                           target_secret, attributes)
-    account = ctx.sfapi.get_account_by_id(new_account_id)['account']
+    result = ctx.sfapi.add_account(user_name, initiator_secret,
+                                   target_secret, attributes)
+    account = result.get('account')
+    if account is None:
+        # Older clusters only return the new account's ID.
+        account = ctx.sfapi.get_account_by_id(
+            result['accountID'])['account']
     cli_utils.print_dict(account)
@@ -0,0 +1,101 @@
+import os
+import re
+
+import click
+
+from solidfire.cli import utils as cli_utils
+from solidfire.cli.cli import pass_context
+from solidfire.managers import inventory as inventory_mgr
+
+
+@click.group()
+@click.option('--db',
+              default=None,
+              help='Inventory database file (defaults to one per cluster '
+                   'in the sfcli config directory).')
+@click.option('--full-interval',
+              default=inventory_mgr.DEFAULT_FULL_INTERVAL,
+              type=click.IntRange(0, None),
+              help='Seconds after which a sync reloads everything.')
+@pass_context
+def cli(ctx, db=None, full_interval=inventory_mgr.DEFAULT_FULL_INTERVAL):
+    """Local inventory mirror."""
+    ctx.sfapi = ctx.client
+    if db is None:
+        endpoint = ctx.client.endpoint_dict or {}
+        cluster = endpoint.get('mvip') or endpoint.get('url') or 'default'
+        app_dir = click.get_app_dir('solidfire')
+        if not os.path.isdir(app_dir):
+            os.makedirs(app_dir)
+        db = os.path.join(app_dir, 'inventory-%s.db' %
+                          re.sub(r'[^\w.-]+', '_', cluster))
+    # NOTE: Queries are answered locally, so the cluster's API version is
+    # only worked out (which may mean asking the cluster) by sync.
+    ctx.inventory = inventory_mgr.Inventory(ctx.sfapi, db,
+                                            full_interval=full_interval)
+    click.get_current_context().call_on_close(ctx.inventory.close)
+
+
+@cli.command('sync', short_help='Update the local inventory.')
+@click.option('--full/--incremental',
+              default=False,
+              help='Reload everything instead of fetching changes.')
+@pass_context
+def sync(ctx, full=False):
+    """Bring the local inventory up to date with the cluster."""
+    ctx.inventory.api_version = ctx.sfapi_endpoint_version
+    stats = ctx.inventory.sync(full=full)
+    cli_utils.print_dict(stats, 'Sync')
+
+
+@cli.command('volumes', short_help='List volumes from the inventory.')
+@click.option('--name',
+              default=None,
+              help='Only volumes with exactly this name.')
+@click.option('--match',
+              default=None,
+              help='Only volumes whose name matches this pattern, with % '
+                   'and _ as wildcards.')
+@click.option('--account',
+              default=None,
+              type=int,
+              help='Only volumes owned by this account ID.')
+@click.option('--status',
+              default=None,
+              type=click.Choice(['active', 'deleted']),
+              help='Only volumes with this status.')
+@pass_context
+def volumes(ctx, name=None, match=None, account=None, status=None):
+    """List volumes from the local inventory."""
+    key_list = ['volumeID', 'name', 'accountID', 'status', 'totalSize']
+    vols = ctx.inventory.volumes(name=name, account_id=account,
+                                 status=status, pattern=match)
+    cli_utils.print_list(vols, key_list)
+
+
+@cli.command('totals', short_help='Per account volume totals.')
+@pass_context
+def totals(ctx):
+    """Show active volume counts and sizes per account."""
+    key_list = ['accountID', 'username', 'volumes', 'totalSize']
+    cli_utils.print_list(ctx.inventory.account_totals(), key_list)
+
+
+@cli.command('uuids', short_help='List mismatched UUIDs.')
+@click.option('--account',
+              default=None,
+              type=int,
+              help='Only volumes owned by this account ID.')
+@pass_context
+def uuids(ctx, account=None):
+    """List volumes whose attributes UUID isn't part of their name."""
+    mismatched = []
+    for v in ctx.inventory.volumes(account_id=account, status='active'):
+        meta_uuid = (v.get('attributes') or {}).get('uuid')
+        if meta_uuid and meta_uuid not in v['name']:
+            mismatched.append({'ID': v['volumeID'],
+                               'Name': v['name'],
+                               'Attributes-UUID': meta_uuid})
+
+    key_list = ['ID', 'Name', 'Attributes-UUID']
+    cli_utils.print_list(mismatched, key_list)
@@ -0,0 +1,185 @@
+import re
+import time
+
+import click
+
+from solidfire.cli import utils as cli_utils
+from solidfire.cli.cli import pass_context
+from solidfire.managers import paging
+from solidfire.managers import scheduler as scheduler_mgr
+from solidfire.managers import snapshots as snapshot_mgr
+from solidfire import utils
+
+_DURATION_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400,
+                   'w': 7 * 86400}
+
+
+@click.group()
+@pass_context
+def cli(ctx):
+    """Snapshot methods."""
+    ctx.sfapi = ctx.client
+
+
+def _parse_duration(value):
+    """Converts '90', '30m', '12h', '7d' or '2w' to seconds."""
+    match = re.match(r'^(\d+)([smhdw]?)$', value.strip())
+    if match is None:
+        raise click.BadParameter('expected a number of seconds or a '
+                                 'number with s, m, h, d or w')
+    return int(match.group(1)) * _DURATION_UNITS[match.group(2)]
+
+
+@cli.command('list', short_help='List snapshots.')
+@click.option('--volume-id',
+              default=None,
+              type=int,
+              help='Only snapshots of this volume.')
+@pass_context
+def list(ctx, volume_id=None):
+    """List snapshots, grouped by volume and oldest first."""
+    key_list = ['snapshotID', 'volumeID', 'name', 'createTime', 'status']
+    if volume_id is not None:
+        snaps = snapshot_mgr.SnapshotIndex(
+            ctx.sfapi.list_snapshots(volume_id, fields=key_list))
+    else:
+        snaps = snapshot_mgr.SnapshotIndex.load(ctx.sfapi, fields=key_list)
+    cli_utils.print_list(snaps, key_list)
+
+
+@cli.command('prune', short_help='Delete snapshots past retention.')
+@click.option('--keep-last',
+              default=None,
+              type=click.IntRange(0, None),
+              help='Keep this many of the newest snapshots per volume.')
+@click.option('--max-age',
+              default=None,
+              help='Keep snapshots newer than this (seconds, or with an '
+                   's, m, h, d or w suffix).')
+@click.option('--volume-ids',
+              default=None,
+              help='Comma separated volume IDs to prune (default all).')
+@click.option('--attributes',
+              default=None,
+              help='Only prune snapshots with these attributes '
+                   '(key=value,...).')
+@click.option('--dry-run/--no-dry-run',
+              default=False,
+              help='List the snapshots that would be deleted.')
+@click.option('--concurrency',
+              default=utils.DEFAULT_CONCURRENCY,
+              type=click.IntRange(1, None),
+              help='Maximum number of API calls in flight.')
+@pass_context
+def prune(ctx, keep_last=None, max_age=None, volume_ids=None,
+          attributes=None, dry_run=False,
+          concurrency=utils.DEFAULT_CONCURRENCY):
+    """Delete the snapshots that --keep-last and --max-age don't keep.
+
+        With both given a snapshot is kept if either keeps it.  Snapshots
+        that aren't in the done state (such as the active one) are
+        skipped.
+    """
+    if keep_last is None and max_age is None:
+        raise click.UsageError('Give --keep-last, --max-age or both.')
+    policy = snapshot_mgr.RetentionPolicy(
+        keep_last=keep_last,
+        max_age=_parse_duration(max_age) if max_age else None,
+        volume_ids=([int(vid) for vid in volume_ids.split(',') if vid]
+                    if volume_ids else None),
+        attributes=utils.kv_string_to_dict(attributes) if attributes
+        else None)
+    index = snapshot_mgr.SnapshotIndex.load(ctx.sfapi)
+    delete, skipped = snapshot_mgr.retention_plan(index, [policy])
+    for snap in skipped:
+        ctx.log('Skipping snapshot %s of volume %s (%s)' %
+                (snap['snapshotID'], snap['volumeID'], snap.get('status')))
+    if dry_run:
+        cli_utils.print_list(delete, ['snapshotID', 'volumeID', 'name',
+                                      'createTime'])
+        return
+
+    start = time.time()
+    deleted, errors = snapshot_mgr.prune(ctx.sfapi, delete,
+                                         concurrency=concurrency)
+    elapsed = time.time() - start
+    for snapshot_id in sorted(errors):
+        ctx.log('Delete failed for snapshot %s: %s' %
+                (snapshot_id, cli_utils.error_message(errors[snapshot_id])))
+    ctx.log('Deleted %d of %d snapshots in %.2fs (%.1f/s)' %
+            (len(deleted), len(delete), elapsed,
+             len(deleted) / elapsed if elapsed else 0))
+
+
+@cli.command('schedule', short_help='Snapshot volumes on a schedule.')
+@click.option('--interval',
+              required=True,
+              help='Time between snapshots of a volume (seconds, or with '
+                   'an s, m, h, d or w suffix).')
+@click.option('--volume-ids',
+              default=None,
+              help='Comma separated volume IDs (default all active '
+                   'volumes).')
+@click.option('--name-format',
+              default=None,
+              help='strftime format for snapshot names, filled in with '
+                   'the UTC time each snapshot was due.')
+@click.option('--attributes',
+              default=None,
+              help='Attributes for the snapshots (key=value,...).')
+@click.option('--rate',
+              default=scheduler_mgr.DEFAULT_RATE,
+              type=click.FloatRange(0.01, None),
+              help='Maximum snapshots started per second.')
+@click.option('--concurrency',
+              default=utils.DEFAULT_CONCURRENCY,
+              type=click.IntRange(1, None),
+              help='Maximum number of API calls in flight.')
+@click.option('--report-interval',
+              default='60',
+              help='Time between progress reports.')
+@click.option('--duration',
+              default=None,
+              help='Stop after this long (default run until interrupted).')
+@pass_context
+def schedule(ctx, interval, volume_ids=None, name_format=None,
+             attributes=None, rate=scheduler_mgr.DEFAULT_RATE,
+             concurrency=utils.DEFAULT_CONCURRENCY, report_interval='60',
+             duration=None):
+    """Snapshot every volume once per --interval until interrupted.
+
+        Each volume is snapshotted at its own point in the interval, so
+        the work is spread out, and never more than --rate a second.
+    """
+    interval = _parse_duration(interval)
+    report_interval = _parse_duration(report_interval)
+    end = time.time() + _parse_duration(duration) if duration else None
+    if volume_ids:
+        volume_ids = [int(vid) for vid in volume_ids.split(',') if vid]
+    else:
+        volume_ids = [vol['volumeID'] for vol in paging.iter_active_volumes(
+            ctx.sfapi, fields=['volumeID'])]
+    if attributes:
+        attributes = utils.kv_string_to_dict(attributes)
+
+    def on_result(volume_schedule, due, result, error):
+        if error is not None:
+            ctx.log('Snapshot of volume %s failed: %s' %
+                    (volume_schedule.volume_id,
+                     cli_utils.error_message(error)))
+
+    scheduler = scheduler_mgr.SnapshotScheduler(
+        ctx.sfapi,
+        [scheduler_mgr.SnapshotSchedule(volume_id, interval,
+                                        name_format=name_format,
+                                        attributes=attributes)
+         for volume_id in volume_ids],
+        rate=rate, concurrency=concurrency, on_result=on_result)
+    ctx.log('Scheduled %d volumes every %ds' % (len(scheduler), interval))
+    try:
+        while end is None or time.time() < end:
+            scheduler.run(report_interval if end is None else
+                          min(report_interval, end - time.time()))
+            cli_utils.print_dict(scheduler.stats(), 'Scheduler')
+    except KeyboardInterrupt:
+        cli_utils.print_dict(scheduler.stats(), 'Scheduler')
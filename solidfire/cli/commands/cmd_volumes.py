@@ -1,8 +1,15 @@
+import sys
+import time
+
 import click
 
 from solidfire.cli import utils as cli_utils
 from solidfire.cli.cli import pass_context
-from solidfire.solidfire_element_api import SolidFireRequestException
+from solidfire.managers import clones as clone_mgr
+from solidfire.managers import paging
+from solidfire.managers import stats as stats_mgr
+from solidfire.managers import volumes as volume_mgr
+from solidfire import records
 from solidfire import utils
 
 
@@ -13,28 +20,40 @@ def cli(ctx):
     ctx.sfapi = ctx.client
 
 
-def _list_volumes(ctx, accounts=None, deleted=True):
-    volumes = []
+def _parse_accounts(accounts):
+    """Converts a comma separated --accounts value into account IDs."""
+    if not accounts:
+        return None
+    return [int(acct) for acct in str(accounts).split(',') if acct]
+
+
+def _list_volumes(ctx, accounts=None, deleted=True,
+                  page_size=paging.DEFAULT_PAGE_SIZE, fields=None):
+    """Returns a generator of volumes in volumeID order.
+
+    Volumes are fetched a page at a time, so callers can start consuming
+    results before the whole cluster has been listed.  fields limits the
+    keys kept for each volume."""
     if ctx.sfapi_endpoint_version >= 8:
-        volumes = ctx.sfapi.list_volumes(accounts=accounts)
-    else:
-        active_vols = ctx.sfapi.list_active_volumes()
-        deleted_vols = ctx.sfapi.list_deleted_volumes()
-        if accounts:
-            active_vols = [vol for vol in active_vols if
-                           vol['accountID'] in accounts]
-            deleted_vols = [vol for vol in deleted_vols if
-                            vol['accountID'] in accounts]
-        volumes.extend(active_vols)
-        if deleted:
-            volumes.extend(deleted_vols)
-    return sorted(volumes, key=lambda k: k['volumeID'])
+        return paging.iter_volumes(
+            ctx.sfapi, page_size=page_size, accounts=accounts,
+            volume_status=None if deleted else 'active', fields=fields)
+
+    fields = records.with_keys(fields, 'volumeID', 'accountID')
+    volumes = paging.iter_active_volumes(ctx.sfapi, page_size=page_size,
+                                         fields=fields)
+    if deleted:
+        deleted_vols = sorted(ctx.sfapi.list_deleted_volumes(fields=fields),
+                              key=lambda k: k['volumeID'])
+        volumes = paging.merge_by_id([volumes, deleted_vols])
+    if accounts:
+        return (vol for vol in volumes if vol['accountID'] in accounts)
+    return volumes
 
 
 def _get_volume(ctx, volume_id):
-    volumes = _list_volumes(ctx)
-    vols = [vol for vol in volumes if vol['volumeID'] == int(volume_id)]
-    vol = vols[0]
+    vol = volume_mgr.get_volume(ctx.sfapi, volume_id,
+                                api_version=ctx.sfapi_endpoint_version)
 
     # qos = vol['qos']
     # TODO(jdg): Add an option for curve, and figure
@@ -43,6 +62,19 @@ def _get_volume(ctx, volume_id):
     return vol
 
 
+def _print_volumes(ctx, vol_ids):
+    """Fetches the given volumes with one ranged listing and prints them."""
+    vols = volume_mgr.get_volumes(ctx.sfapi, vol_ids,
+                                  api_version=ctx.sfapi_endpoint_version)
+    for vid in vol_ids:
+        vol = vols.get(vid)
+        if vol is None:
+            ctx.log('Volume %s not found' % vid)
+            continue
+        vol['qos'].pop('curve', None)
+        cli_utils.print_dict(vol)
+
+
 @cli.command('list', short_help='List volumes.')
 @click.option('--deleted/--no-deleted',
               default=True,
@@ -50,52 +82,61 @@ def _get_volume(ctx, volume_id):
 @click.option('--accounts',
               default=None,
               help='List only for the specified list of account ID\'s.')
+@click.option('--page-size',
+              default=paging.DEFAULT_PAGE_SIZE,
+              type=click.IntRange(1, None),
+              help='Number of volumes to fetch per API call.')
 @pass_context
-def list(ctx, accounts=None, deleted=True):
+def list(ctx, accounts=None, deleted=True,
+         page_size=paging.DEFAULT_PAGE_SIZE):
     """List Volumes."""
-    volumes = _list_volumes(ctx, accounts, deleted)
     key_list = ['volumeID', 'iqn', 'enable512e',
                 'qos', 'totalSize']
+    volumes = _list_volumes(ctx, _parse_accounts(accounts), deleted,
+                            page_size, fields=key_list)
     cli_utils.print_list(volumes, key_list)
 
 
+def _map_volumes(ctx, method, volumes, concurrency):
+    """Issue `method` for each volume ID, logging per-volume failures."""
+    params_list = [{'volumeID': int(vid)} for vid in volumes]
+    for index, result, error in ctx.sfapi.map(method, params_list,
+                                              concurrency=concurrency):
+        if error is not None:
+            ctx.log('%s failed for volume %s: %s' %
+                    (method, volumes[index], cli_utils.error_message(error)))
+
+
 @cli.command('delete', short_help='Deletes a volume(s).')
 @click.argument('volumes',
                 nargs=-1)
 @click.option('--purge/--no-purge',
               default=False,
               help='Purge volume(s) on delete.')
+@click.option('--concurrency',
+              default=utils.DEFAULT_CONCURRENCY,
+              type=click.IntRange(1, None),
+              help='Maximum number of API calls in flight.')
 @pass_context
-def delete(ctx, volumes, purge):
+def delete(ctx, volumes, purge, concurrency=utils.DEFAULT_CONCURRENCY):
     """Delete the specified volumeID(s)."""
-    for vid in volumes:
-        try:
-            ctx.sfapi.delete_volume(vid)
-        except SolidFireRequestException as ex:
-            ctx.log(ex.msg[1]['error']['message'])
-            pass
+    _map_volumes(ctx, 'DeleteVolume', volumes, concurrency)
     if purge:
-        for vid in volumes:
-            try:
-                ctx.sfapi.purge_deleted_volume(vid)
-            except SolidFireRequestException as ex:
-                ctx.log(ex.msg[1]['error']['message'])
-                pass
+        _map_volumes(ctx, 'PurgeDeletedVolume', volumes, concurrency)
 
 
 @cli.command('purge', short_help='Purges the specified deleted volume(s).')
 @click.argument('volumes',
                 nargs=-1,
                 required=True)
+@click.option('--concurrency',
+              default=utils.DEFAULT_CONCURRENCY,
+              type=click.IntRange(1, None),
+              help='Maximum number of API calls in flight.')
 @pass_context
-def purge(ctx, volumes):
+def purge(ctx, volumes, concurrency=utils.DEFAULT_CONCURRENCY):
     """Purge the specified deleted volumeID(s)."""
-    for vid in volumes:
-        try:
-            ctx.sfapi.purge_deleted_volume(vid)
-        except SolidFireRequestException as ex:
-            ctx.log(ex.msg[1]['error']['message'])
-            pass
+    _map_volumes(ctx, 'PurgeDeletedVolume', volumes, concurrency)
 
 
 @cli.command('show', short_help='Show detailed info for a single volume')
@@ -104,6 +145,9 @@ def purge(ctx, volumes):
 @pass_context
 def show(ctx, volume_id):
     vol = _get_volume(ctx, volume_id)
+    if vol is None:
+        ctx.log('Volume %s not found' % volume_id)
+        return
     qos = vol['qos']
     # TODO(jdg): Add an option for curve, and figure
     # out a way to display it.  For now just remove it
@@ -134,42 +178,62 @@ def show(ctx, volume_id):
               '(--qos minIOPS=700,maxIOPS=900,burstIOPS=1000)')
 @click.option('--count',
               default=1,
+              type=click.IntRange(1, None),
               help='Number of volumes to create.')
+@click.option('--concurrency',
+              default=utils.DEFAULT_CONCURRENCY,
+              type=click.IntRange(1, None),
+              help='Maximum number of create calls in flight.')
 @pass_context
 def create(ctx, size, account_id, name,
            enable512e=True, attributes=None,
-           qos=None, count=1):
+           qos=None, count=1, concurrency=utils.DEFAULT_CONCURRENCY):
     """Creates <count> volumes of <size> on the SolidFire Cluster.
 
         Where size can be specified in bytes GibiBytes or GigaBytes
         (1073741824 | 1Gi | 1G).
     """
-    vol_ids = []
     size = utils.string_to_bytes(size)
     if qos:
-        qos = utils.kv_string_to_dict(qos)
-        for k, v in qos.iteritems():
-            qos[k] = int(v)
+        qos = dict((k, int(v)) for k, v in
+                   utils.kv_string_to_dict(qos).items())
     if attributes:
-        import pdb;pdb.set_trace()
         attributes = utils.kv_string_to_dict(attributes)
 
-    vname = name
-    for i in xrange(0, int(count)):
-        if i > 0:
-            vname = name + ('-%s' % i)
-        vol_ids.append(ctx.sfapi.create_volume(vname, account_id,
-                                               size, enable512e,
-                                               qos, attributes))
-    for vid in vol_ids:
-        vol = _get_volume(ctx, vid)
-        qos = vol['qos']
-        qos.pop('curve', None)
-        cli_utils.print_dict(vol)
+    specs = []
+    for i in range(0, count):
+        spec = {'name': name if i == 0 else name + ('-%s' % i),
+                'accountID': account_id,
+                'totalSize': size,
+                'enable512e': enable512e,
+                'attributes': attributes}
+        if qos:
+            spec['qos'] = qos
+        specs.append(spec)
+
+    start = time.time()
+    vols, errors = volume_mgr.create_volumes(
+        ctx.sfapi, specs, concurrency=concurrency,
+        api_version=ctx.sfapi_endpoint_version)
+    elapsed = time.time() - start
+    for index in range(count):
+        if index in errors:
+            ctx.log('Create failed for volume %s: %s' %
+                    (specs[index]['name'],
+                     cli_utils.error_message(errors[index])))
+        else:
+            vol = vols[index]
+            vol.get('qos', {}).pop('curve', None)
+            cli_utils.print_dict(vol)
+    if count > 1:
+        ctx.log('Created %d of %d volumes in %.2fs (%.1f/s)' %
+                (len(vols), count, elapsed,
+                 len(vols) / elapsed if elapsed else 0))
 
 
 @cli.command('clone', short_help='Clones a volume(s)')
 @click.argument('volume-id',
+                type=int,
                 required=True)
 @click.option('--from-snapshot',
               type=int,
@@ -196,39 +260,135 @@ def create(ctx, size, account_id, name,
                    '(readOnly, readWrite, locked, replicationTarget)')
 @click.option('--count',
               default=1,
+              type=click.IntRange(1, None),
               help='Number of clones to create.')
+@click.option('--wait/--no-wait',
+              default=True,
+              help='Wait for the clone operations to complete, or start '
+                   'them all and print their async handles.')
+@click.option('--limit',
+              default=None,
+              type=click.IntRange(1, None),
+              help='Clones in flight at once (defaults to the cluster\'s '
+                   'cloneJobsPerVolumeMax).')
 @pass_context
 def clone(ctx, volume_id, name, from_snapshot,
           new_account_id=None, new_size=None,
-          attributes=None, access='rw', count=1):
-    """Creates <count> clones of volume specified by volume-id."""
-    vol_ids = []
+          attributes=None, access='rw', count=1, wait=True, limit=None):
+    """Creates <count> clones of volume specified by volume-id.
+
+    Clones beyond the cluster's limit of concurrent clones per volume are
+    started as earlier ones finish.  --no-wait starts every clone at once
+    and prints the async handles to poll; the cluster rejects clones
+    beyond its limit."""
     if attributes:
         attributes = utils.kv_string_to_dict(attributes)
-    clone_name = name
-    for i in xrange(0, int(count)):
-        if i > 0:
-            clone_name = name + ('-%s' % i)
-        vol_ids.append(ctx.sfapi.clone_volume(volume_id, clone_name,
-                                              new_account_id=new_account_id,
-                                              new_size=new_size,
-                                              access=access,
-                                              snapshot_id=from_snapshot,
-                                              attributes=attributes))
-    for vid in vol_ids:
-        vol = _get_volume(ctx, vid)
-        qos = vol['qos']
-        qos.pop('curve', None)
-        cli_utils.print_dict(vol)
+    specs = []
+    for i in range(0, count):
+        spec = {'volumeID': volume_id,
+                'name': name if i == 0 else name + ('-%s' % i),
+                'access': access}
+        for key, value in (('newAccountID', new_account_id),
+                           ('newSize', new_size),
+                           ('snapshotID', from_snapshot),
+                           ('attributes', attributes)):
+            if value is not None:
+                spec[key] = value
+        specs.append(spec)
 
+    vol_ids = []
+    started = []
+    if limit is None and wait:
+        limit = ctx.capabilities.limit('cloneJobsPerVolumeMax')
+    orchestrator = clone_mgr.CloneOrchestrator(ctx.sfapi, specs, limit=limit,
+                                               wait=wait)
+    progress = sys.stderr.isatty() and count > 1 and wait
+    for index, result, error in orchestrator:
+        if error is not None:
+            ctx.log('Clone %s failed: %s' %
+                    (specs[index]['name'], cli_utils.error_message(error)))
+        elif not wait:
+            started.append(dict(result, name=specs[index]['name']))
+        else:
+            vol_ids.append(result['volumeID'])
+        if progress:
+            click.echo('\r%d/%d clones finished, %d in flight (%.1f/s)' %
+                       (orchestrator.completed + orchestrator.failed,
+                        count, orchestrator.in_flight,
+                        orchestrator.throughput), nl=False, err=True)
+    if progress:
+        click.echo(err=True)
+    if not wait:
+        cli_utils.print_list(started, ['name', 'volumeID', 'cloneID',
+                                       'asyncHandle'])
+        return
+    if count > 1:
+        ctx.log('Cloned %d of %d volumes in %.2fs (%.1f/s, %d at a time)' %
+                (len(vol_ids), count, time.time() - orchestrator.start_time,
+                 orchestrator.throughput, orchestrator.limit))
+    _print_volumes(ctx, sorted(vol_ids))
 
-@cli.command('stats', short_help='Show stats for the specified volume')
-@click.argument('volume-id',
-                required=True)
+
+def _log_stats_errors(ctx, sampler):
+    for chunk, error in sampler.errors:
+        ctx.log('Stats failed for volumes %s-%s: %s' %
+                (chunk[0], chunk[-1], cli_utils.error_message(error)))
+
+
+@cli.command('stats', short_help='Show stats for the specified volume(s)')
+@click.argument('volume-ids',
+                nargs=-1)
+@click.option('--watch/--no-watch',
+              default=False,
+              help='Keep sampling and show per second rates.')
+@click.option('--interval',
+              default=5.0,
+              type=float,
+              help='Seconds between samples with --watch.')
+@click.option('--count',
+              default=None,
+              type=click.IntRange(1, None),
+              help='Stop after this many refreshes with --watch.')
+@click.option('--chunk-size',
+              default=stats_mgr.DEFAULT_CHUNK_SIZE,
+              type=click.IntRange(1, None),
+              help='Volumes per stats call.')
+@click.option('--concurrency',
+              default=utils.DEFAULT_CONCURRENCY,
+              type=click.IntRange(1, None),
+              help='Maximum number of stats calls in flight.')
 @pass_context
-def stats(ctx, volume_id):
-    stats_info = ctx.sfapi.get_volume_stats(volume_id)['volumeStats']
-    cli_utils.print_dict(stats_info)
+def stats(ctx, volume_ids, watch=False, interval=5.0, count=None,
+          chunk_size=stats_mgr.DEFAULT_CHUNK_SIZE,
+          concurrency=utils.DEFAULT_CONCURRENCY):
+    """Show cumulative stats, or rates with --watch.
+
+    With no volume IDs every active volume is sampled."""
+    if len(volume_ids) == 1 and not watch:
+        stats_info = ctx.sfapi.get_volume_stats(volume_ids[0])['volumeStats']
+        cli_utils.print_dict(stats_info)
+        return
+
+    sampler = stats_mgr.VolumeStatsSampler(
+        ctx.sfapi, volume_ids, api_version=ctx.sfapi_endpoint_version,
+        chunk_size=chunk_size, concurrency=concurrency)
+    if not watch:
+        sampler.sample()
+        _log_stats_errors(ctx, sampler)
+        key_list = ('volumeID',) + stats_mgr.FIELDS
+        cli_utils.print_list(
+            (dict(sampler.samples[-1].get(vid), volumeID=vid)
+             for vid in sampler.samples[-1].volume_ids), key_list)
+        return
+
+    key_list = ['volumeID', 'readIOPS', 'writeIOPS', 'readBps', 'writeBps',
+                'readLatencyUSec', 'writeLatencyUSec', 'latencyUSec']
+    for rates in sampler.watch(interval, count):
+        if sys.stdout.isatty():
+            click.clear()
+        _log_stats_errors(ctx, sampler)
+        click.echo(time.strftime('%Y-%m-%d %H:%M:%S'))
+        cli_utils.print_list(rates, key_list)
 
 
 @cli.command('uuids', short_help='List mismatched UUIDs.')
@@ -238,7 +398,8 @@ def stats(ctx, volume_id):
 @pass_context
 def uuids(ctx, accounts=None):
     """List Volumes."""
-    volumes = _list_volumes(ctx, accounts, False)
+    volumes = _list_volumes(ctx, _parse_accounts(accounts), False,
+                            fields=['volumeID', 'name', 'attributes'])
     mismatched = []
     for v in volumes:
         if v['attributes']:
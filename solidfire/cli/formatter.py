@@ -1,37 +1,195 @@
+"""Streaming output formatters for the sfcli --format option.
+
+Every formatter writes rows as they are pulled from an iterable, so a
+listing fed from a paged or streamed generator starts printing right away
+and never needs the whole result set in memory.  json, ndjson, csv and
+raw output use constant memory; table output looks ahead at the first
+LOOKAHEAD rows to size its columns (with some headroom) and wraps any
+later cell that still doesn't fit.
+"""
+
+import abc
+import csv
+import itertools
+import sys
+import textwrap
+
 import six
-import strutils
-import prettytable
+
+from solidfire import codec
+
+FORMATS = ('table', 'raw', 'json', 'ndjson', 'csv')
+
+# Rows buffered by the table formatter to pick column widths.
+LOOKAHEAD = 100
+MAX_COLUMN_WIDTH = 80
+
+
+def _field_value(obj, field, formatters):
+    if field in formatters:
+        return formatters[field](obj)
+    if isinstance(obj, dict):
+        return obj.get(field, '')
+    return getattr(obj, field.replace(' ', '_'), '')
+
+
+def _json_text(value):
+    return codec.encode(value).decode('utf-8')
 
 
-def print_dict(d, property="Property"):
-    pt = prettytable.PrettyTable([property, 'Value'], caching=False)
-    pt.aligns = ['l', 'l']
-    [pt.add_row(list(r)) for r in six.iteritems(d)]
-    print(strutils.safe_encode(pt.get_string(sortby=property)))
+@six.add_metaclass(abc.ABCMeta)
+class Formatter(object):
+    """Writes rows (dicts or objects) restricted to the given fields."""
 
+    def __init__(self, fields, out=None, formatters=None):
+        self.fields = list(fields)
+        self.out = out or sys.stdout
+        self.formatters = formatters or {}
 
-def print_list(objs, fields, formatters={}, order_by=None):
-    pt = prettytable.PrettyTable([f for f in fields], caching=False)
-    pt.aligns = ['l' for f in fields]
-    pt.max_width = 20
+    def _record(self, obj):
+        return dict((field, _field_value(obj, field, self.formatters))
+                    for field in self.fields)
 
-    for o in objs:
-        row = []
-        for field in fields:
-            if field == 'qos':
+    def write(self, text):
+        self.out.write(text + '\n')
+
+    @abc.abstractmethod
+    def write_rows(self, rows):
+        """Writes every row pulled from the iterable rows."""
+
+    def write_dict(self, data, property='Property'):
+        """Writes a single object as property/value rows."""
+        self.fields = [property, 'Value']
+        self.formatters = {}
+        self.write_rows({property: key, 'Value': value}
+                        for key, value in sorted(six.iteritems(data)))
+
+
+class TableFormatter(Formatter):
+
+    lookahead = LOOKAHEAD
+    max_width = MAX_COLUMN_WIDTH
+
+    def _cells(self, obj):
+        cells = []
+        for field in self.fields:
+            value = _field_value(obj, field, self.formatters)
+            if field == 'qos' and isinstance(value, dict) and \
+                    'curve' in value:
                 # The QoS attribute is ridiculously long with the curve
-                # data, which frankly isn't that useful for an end user, so
-                # let's pop it off of the object here for display
-                getattr(o, field).pop('curve', None)
-            if field in formatters:
-                row.append(formatters[field](o))
-            else:
-                field_name = field.replace(' ', '_')
-                if type(o) == dict and field in o:
-                    data = o[field]
-                else:
-                    data = getattr(o, field_name, '')
-                row.append(data)
-        pt.add_row(row)
-
-    print(pt)
+                # data, which frankly isn't that useful for an end user,
+                # so leave it out of the table.
+                value = dict((k, v) for k, v in six.iteritems(value)
+                             if k != 'curve')
+            cells.append(six.text_type(value))
+        return cells
+
+    def _write_cells(self, cells, widths):
+        if all(len(cell) <= width and '\n' not in cell
+               for cell, width in zip(cells, widths)):
+            self.write('| %s |' % ' | '.join(
+                cell.center(width) for cell, width in zip(cells, widths)))
+            return
+        columns = []
+        for cell, width in zip(cells, widths):
+            lines = []
+            for part in cell.split('\n'):
+                lines.extend(textwrap.wrap(part, width) or [''])
+            columns.append(lines)
+        for index in range(max(len(lines) for lines in columns)):
+            self.write('| %s |' % ' | '.join(
+                (lines[index] if index < len(lines) else '').center(width)
+                for lines, width in zip(columns, widths)))
+
+    def write_rows(self, rows):
+        rows = iter(rows)
+        head = [self._cells(row) for row in
+                itertools.islice(rows, self.lookahead)]
+        longest = [0] * len(self.fields)
+        for cells in head:
+            for index, cell in enumerate(cells):
+                longest[index] = max([longest[index]] +
+                                     [len(line) for line in cell.split('\n')])
+        # NOTE: Values later in a listing tend to be a little longer
+        # (IDs and names gain digits), so leave some headroom rather than
+        # wrapping every row past the lookahead.
+        widths = [max(len(field), min(length + max(2, length // 5),
+                                      self.max_width))
+                  for field, length in zip(self.fields, longest)]
+        rule = '+%s+' % '+'.join('-' * (width + 2) for width in widths)
+        self.write(rule)
+        self._write_cells(self.fields, widths)
+        self.write(rule)
+        for cells in head:
+            self._write_cells(cells, widths)
+        for row in rows:
+            self._write_cells(self._cells(row), widths)
+        self.write(rule)
+
+
+class JSONFormatter(Formatter):
+
+    def write_rows(self, rows):
+        separator = '['
+        for row in rows:
+            self.write(separator + _json_text(self._record(row)))
+            separator = ','
+        self.write('[]' if separator == '[' else ']')
+
+    def write_dict(self, data, property='Property'):
+        self.write(_json_text(data))
+
+
+class NDJSONFormatter(Formatter):
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.write(_json_text(self._record(row)))
+
+    def write_dict(self, data, property='Property'):
+        self.write(_json_text(data))
+
+
+class CSVFormatter(Formatter):
+
+    def write_rows(self, rows):
+        writer = csv.writer(self.out, lineterminator='\n')
+        writer.writerow(self.fields)
+        for row in rows:
+            values = []
+            for field in self.fields:
+                value = _field_value(row, field, self.formatters)
+                if isinstance(value, (dict, list)):
+                    value = _json_text(value)
+                elif value is None:
+                    value = ''
+                values.append(value)
+            writer.writerow(values)
+
+
+class RawFormatter(Formatter):
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.write('%s' % self._record(row))
+
+    def write_dict(self, data, property='Property'):
+        self.write('%s' % data)
+
+
+_FORMATTERS = {
+    'table': TableFormatter,
+    'raw': RawFormatter,
+    'json': JSONFormatter,
+    'ndjson': NDJSONFormatter,
+    'csv': CSVFormatter,
+}
+
+
+def get_formatter(format, fields=(), out=None, formatters=None):
+    """Returns the formatter for one of FORMATS."""
+    try:
+        cls = _FORMATTERS[format]
+    except KeyError:
+        raise ValueError('Unknown output format %s' % format)
+    return cls(fields, out=out, formatters=formatters)
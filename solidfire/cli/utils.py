@@ -1,13 +1,29 @@
-import prettytable
+import click
 
-import six
+from solidfire.cli import formatter
+from solidfire.solidfire_element_api import SolidFireRequestException
 
 
-def print_dict(d, property="Property"):
-    pt = prettytable.PrettyTable([property, 'Value'], caching=False)
-    pt.aligns = ['l', 'l']
-    [pt.add_row(list(r)) for r in six.iteritems(d)]
-    print(pt.get_string(sortby=property))
+def _output_format(format=None):
+    """Returns format, or the --format chosen for the running command."""
+    if format is not None:
+        return format
+    ctx = click.get_current_context(silent=True)
+    if ctx is not None:
+        format = ctx.find_root().params.get('format')
+    return format or 'table'
+
+
+def print_dict(d, property="Property", format=None, out=None):
+    fmt = formatter.get_formatter(_output_format(format), out=out)
+    fmt.write_dict(d, property)
+
+
+def error_message(error):
+    """Returns the cluster's message for a failed request."""
+    if isinstance(error, SolidFireRequestException):
+        return error.msg[1]['error']['message']
+    return str(error)
 
 
 def kv_string_to_dict(kv_string):
@@ -18,30 +34,9 @@ def kv_string_to_dict(kv_string):
         new_dict[kvs[0]] = kvs[1]
 
 
-def print_list(objs, fields, formatters={}, order_by=None):
-    pt = prettytable.PrettyTable([f for f in fields], caching=False)
-    pt.aligns = ['l' for f in fields]
-    pt.max_width = 80
-    if not objs:
-        objs = []
-
-    for o in objs:
-        row = []
-        for field in fields:
-            if field == 'qos':
-                # The QoS attribute is ridiculously long with the curve
-                # data, which frankly isn't that useful for an end user, so
-                # let's pop it off of the object here for display
-                o['qos'].pop('curve', None)
-            if field in formatters:
-                row.append(formatters[field](o))
-            else:
-                field_name = field.replace(' ', '_')
-                if type(o) == dict and field in o:
-                    data = o[field]
-                else:
-                    data = getattr(o, field_name, '')
-                row.append(data)
-        pt.add_row(row)
-
-    print(pt)
+def print_list(objs, fields, formatters={}, order_by=None, format=None,
+               out=None):
+    """Writes objs (any iterable, consumed lazily) in the output format."""
+    fmt = formatter.get_formatter(_output_format(format), fields, out=out,
+                                  formatters=formatters)
+    fmt.write_rows(objs or [])
@@ -0,0 +1,121 @@
+"""JSON encoding and decoding for API payloads.
+
+The fastest JSON library available is used for request bodies and
+responses, falling back to the standard library json module.  The
+SOLIDFIRE_JSON environment variable, or use(), picks a backend by name.
+
+encode() always returns UTF-8 bytes and decode() accepts bytes or text, so
+callers don't need to care which backend is active.  A document the fast
+backend refuses (integers beyond 64 bits, for instance) is handed to the
+standard library instead of failing.
+"""
+
+import json
+import logging
+import os
+
+import six
+
+LOG = logging.getLogger(__name__)
+
+# Backends in order of preference.
+PREFERRED = ('orjson', 'ujson', 'simplejson', 'json')
+
+
+def _stdlib_encode(obj):
+    return json.dumps(obj).encode('utf-8')
+
+
+def _stdlib_decode(data):
+    if isinstance(data, six.binary_type):
+        data = data.decode('utf-8')
+    return json.loads(data)
+
+
+def _load_backend(name):
+    """Returns (encode, decode) for a backend, or None if not installed."""
+    if name == 'json':
+        return _stdlib_encode, _stdlib_decode
+    try:
+        module = __import__(name)
+    except ImportError:
+        return None
+    if name == 'orjson':
+        return module.dumps, module.loads
+
+    def encode(obj):
+        return module.dumps(obj).encode('utf-8')
+
+    def decode(data):
+        if isinstance(data, six.binary_type):
+            data = data.decode('utf-8')
+        return module.loads(data)
+    return encode, decode
+
+
+BACKEND = None
+_encode = _stdlib_encode
+_decode = _stdlib_decode
+
+
+def use(name=None):
+    """Selects the JSON backend; None picks the best one installed.
+
+    Returns the name of the backend now in use."""
+    global BACKEND, _encode, _decode
+    names = PREFERRED if name is None else (name,)
+    for candidate in names:
+        funcs = _load_backend(candidate)
+        if funcs is not None:
+            BACKEND = candidate
+            _encode, _decode = funcs
+            return BACKEND
+    raise ValueError('JSON backend %s is not available' % name)
+
+
+def _init():
+    # NOTE: The backend is picked on first use rather than at import time,
+    # importing a fast JSON library is a noticeable share of sfcli startup.
+    try:
+        use(os.environ.get('SOLIDFIRE_JSON') or None)
+    except ValueError as ex:
+        LOG.warning('%s, using the best available instead', ex)
+        use()
+
+
+def encode(obj):
+    """Serializes obj to UTF-8 encoded JSON bytes."""
+    if BACKEND is None:
+        _init()
+    try:
+        return _encode(obj)
+    except (TypeError, ValueError, OverflowError):
+        if _encode is _stdlib_encode:
+            raise
+        return _stdlib_encode(obj)
+
+
+def decode(data):
+    """Parses a JSON document given as bytes or text."""
+    if BACKEND is None:
+        _init()
+    try:
+        return _decode(data)
+    except (TypeError, ValueError, OverflowError):
+        if _decode is _stdlib_decode:
+            raise
+        return _stdlib_decode(data)
+
+
+class LazyText(object):
+    """Defers turning an encoded payload into text until it is logged."""
+
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __str__(self):
+        if isinstance(self.data, six.binary_type):
+            return self.data.decode('utf-8', 'replace')
+        return str(self.data)
@@ -0,0 +1,185 @@
+"""Bring volume access groups to a desired membership in few calls.
+
+reconcile() takes the initiators and volumes each group should have,
+reads every group with one paged ListVolumeAccessGroups, and issues only
+the Add/Remove calls for the differences, in chunks of chunk_size
+members.  Calls run concurrently in three rounds: removals first, since
+an initiator can only belong to one group and may be moving between
+groups, then CreateVolumeAccessGroup for groups that don't exist yet,
+then additions.  Resyncing thousands of volumes of which a few changed
+costs a couple of calls instead of one per volume.
+"""
+
+import six
+
+from solidfire.managers import paging
+from solidfire import utils
+
+# Members sent per Add/Remove call.
+DEFAULT_CHUNK_SIZE = 500
+
+_METHODS = {
+    ('initiators', 'add'): 'AddInitiatorsToVolumeAccessGroup',
+    ('initiators', 'remove'): 'RemoveInitiatorsFromVolumeAccessGroup',
+    ('volumes', 'add'): 'AddVolumesToVolumeAccessGroup',
+    ('volumes', 'remove'): 'RemoveVolumesFromVolumeAccessGroup',
+}
+
+
+def _chunks(members, size):
+    for start in range(0, len(members), size):
+        yield members[start:start + size]
+
+
+def _diff(current, desired, key):
+    """Returns (to_add, to_remove) for one member list of one group."""
+    if key == 'initiators':
+        # NOTE: IQNs and WWPNs are case insensitive; the cluster keeps
+        # whatever case they were added with.
+        have = dict((member.lower(), member) for member in current)
+        want = dict((member.lower(), member) for member in desired)
+    else:
+        have = dict((int(member), int(member)) for member in current)
+        want = dict((int(member), int(member)) for member in desired)
+    return ([want[member] for member in sorted(set(want) - set(have))],
+            [have[member] for member in sorted(set(have) - set(want))])
+
+
+class Plan(object):
+    """The calls reconcile() makes, computed without making any.
+
+    changes maps each desired group key to {'initiators': (added,
+    removed), 'volumes': (added, removed)}, with only the member lists
+    that change; group_ids maps it to the volumeAccessGroupID, or None for
+    groups still to be created."""
+
+    def __init__(self):
+        self.changes = {}
+        self.group_ids = {}
+        self.removals = []
+        self.creates = []
+        self.additions = []
+
+    @property
+    def calls(self):
+        return len(self.removals) + len(self.creates) + len(self.additions)
+
+    def __bool__(self):
+        return bool(self.calls)
+
+    __nonzero__ = __bool__
+
+
+def _find(groups, by_name, key):
+    if isinstance(key, six.integer_types):
+        return groups.get(key)
+    found = by_name.get(key, [])
+    if len(found) > 1:
+        raise ValueError('More than one volume access group is named %s; '
+                         'use its ID' % key)
+    return found[0] if found else None
+
+
+def make_plan(groups, desired, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Computes the Plan taking groups (as listed) to desired.
+
+    desired maps a group name or volumeAccessGroupID to a dict with
+    'initiators' and/or 'volumes'; a list that is left out is not
+    changed.  Groups missing from desired are left alone, and names
+    that don't exist yet are created."""
+    by_id = dict((group['volumeAccessGroupID'], group) for group in groups)
+    by_name = {}
+    for group in groups:
+        by_name.setdefault(group['name'], []).append(group)
+    plan = Plan()
+    for key in sorted(desired, key=str):
+        want = desired[key]
+        group = _find(by_id, by_name, key)
+        if group is None and isinstance(key, six.integer_types):
+            raise ValueError('Volume access group %s does not exist' % key)
+        changes = {}
+        create = None
+        if group is None:
+            create = {'name': key}
+            if 'attributes' in want:
+                create['attributes'] = want['attributes']
+            plan.creates.append((key, create))
+        plan.group_ids[key] = (group['volumeAccessGroupID']
+                               if group is not None else None)
+        for member_key in ('initiators', 'volumes'):
+            if member_key not in want:
+                continue
+            added, removed = _diff(group[member_key] if group else [],
+                                   want[member_key], member_key)
+            if not added and not removed:
+                continue
+            changes[member_key] = (added, removed)
+            for chunk in _chunks(removed, chunk_size):
+                plan.removals.append(
+                    (key, _METHODS[member_key, 'remove'], member_key, chunk))
+            chunks = list(_chunks(added, chunk_size))
+            if create is not None and chunks:
+                create[member_key] = chunks.pop(0)
+            for chunk in chunks:
+                plan.additions.append(
+                    (key, _METHODS[member_key, 'add'], member_key, chunk))
+        if changes or create is not None:
+            plan.changes[key] = changes
+    return plan
+
+
+def _run(client, calls, concurrency, errors):
+    """Issues (key, method, params) calls concurrently.
+
+    Records the first error of each group in errors and skips the calls
+    of groups that already failed."""
+    calls = [call for call in calls if call[0] not in errors]
+    results = {}
+    for index, result, error in utils.bounded_map(
+            lambda call: client.send_request(call[1], call[2]), calls,
+            concurrency=concurrency):
+        key = calls[index][0]
+        if error is not None:
+            errors.setdefault(key, error)
+        else:
+            results[index] = result
+    return calls, results
+
+
+def execute(client, plan, concurrency=utils.DEFAULT_CONCURRENCY):
+    """Makes the calls of a Plan; returns {group key: error}.
+
+    A group whose call fails gets no further calls, so its removals may
+    have been made without its additions."""
+    errors = {}
+    ids = dict(plan.group_ids)
+
+    def member_calls(entries):
+        return [(key, method, {'volumeAccessGroupID': ids[key],
+                               member_key: members})
+                for key, method, member_key, members in entries]
+
+    _run(client, member_calls(plan.removals), concurrency, errors)
+    calls, results = _run(
+        client, [(key, 'CreateVolumeAccessGroup', params)
+                 for key, params in plan.creates], concurrency, errors)
+    for index, result in results.items():
+        ids[calls[index][0]] = result['volumeAccessGroupID']
+    _run(client, member_calls(entry for entry in plan.additions
+                              if ids[entry[0]] is not None),
+         concurrency, errors)
+    return errors
+
+
+def reconcile(client, desired, chunk_size=DEFAULT_CHUNK_SIZE,
+              concurrency=utils.DEFAULT_CONCURRENCY, dry_run=False,
+              page_size=paging.DEFAULT_PAGE_SIZE):
+    """Brings the access groups to desired; returns (plan, errors).
+
+    See make_plan() for the form of desired.  With dry_run nothing is
+    changed and errors is empty."""
+    groups = list(paging.iter_volume_access_groups(client, page_size))
+    plan = make_plan(groups, desired, chunk_size)
+    if dry_run:
+        return plan, {}
+    return plan, execute(client, plan, concurrency)
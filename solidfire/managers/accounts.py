@@ -0,0 +1,162 @@
+"""An in-process directory of a cluster's accounts.
+
+Tools built on the library resolve account names and IDs all the time,
+and each GetAccountByName/GetAccountByID is a round trip.
+AccountDirectory loads every account once with ListAccounts and indexes
+it by ID and by username.  Lookups after that are dictionary reads.
+
+The directory listens on its client (see SolidFireAPI.add_listener), so
+AddAccount, ModifyAccount and RemoveAccount calls made through the same
+client patch it as they succeed.  Accounts changed by other clients are
+only seen after invalidate(), except that a lookup which misses asks the
+cluster before giving up.
+
+Volume lists change with every create and delete, so they aren't kept:
+records have no 'volumes' key.
+"""
+
+import threading
+
+import six
+
+from solidfire.managers import paging
+from solidfire import solidfire_element_api
+
+_MODIFIABLE = ('username', 'status', 'initiatorSecret', 'targetSecret',
+               'attributes')
+
+
+def _strip(account):
+    account = dict(account)
+    account.pop('volumes', None)
+    return account
+
+
+class AccountDirectory(object):
+    """Accounts of one cluster indexed by accountID and username."""
+
+    def __init__(self, client, page_size=paging.DEFAULT_PAGE_SIZE):
+        self.client = client
+        self.page_size = page_size
+        self._lock = threading.RLock()
+        self._by_id = None
+        self._by_name = {}
+        client.add_listener(self._on_request)
+
+    def close(self):
+        """Stops following writes made through the client."""
+        self.client.remove_listener(self._on_request)
+
+    @property
+    def loaded(self):
+        return self._by_id is not None
+
+    def load(self):
+        """(Re)loads every account from the cluster."""
+        by_id = {}
+        by_name = {}
+        for account in paging.iter_accounts(self.client, self.page_size):
+            account = _strip(account)
+            by_id[account['accountID']] = account
+            by_name[account['username']] = account
+        with self._lock:
+            self._by_id = by_id
+            self._by_name = by_name
+
+    def invalidate(self):
+        """Drops everything; the next lookup loads the accounts again."""
+        with self._lock:
+            self._by_id = None
+            self._by_name = {}
+
+    def _lookup(self, index, key):
+        with self._lock:
+            if self._by_id is None:
+                self.load()
+            return getattr(self, index).get(key)
+
+    def _add(self, account):
+        account = _strip(account)
+        with self._lock:
+            if self._by_id is None:
+                return account
+            old = self._by_id.get(account['accountID'])
+            if old is not None:
+                self._by_name.pop(old['username'], None)
+            self._by_id[account['accountID']] = account
+            self._by_name[account['username']] = account
+        return account
+
+    def _remove(self, account_id):
+        with self._lock:
+            if self._by_id is None:
+                return
+            old = self._by_id.pop(account_id, None)
+            if old is not None:
+                self._by_name.pop(old['username'], None)
+
+    def _fetch(self, method, params):
+        try:
+            result = self.client.send_request(method, params)
+        except solidfire_element_api.SolidFireRequestException as ex:
+            if ex.msg[1].get('error', {}).get('name') == 'xUnknownAccount':
+                return None
+            raise
+        return self._add(result['account'])
+
+    def get(self, account_id):
+        """Returns the account with the given ID, or None."""
+        account_id = int(account_id)
+        account = self._lookup('_by_id', account_id)
+        if account is None:
+            account = self._fetch('GetAccountByID',
+                                  {'accountID': account_id})
+        return dict(account) if account is not None else None
+
+    def by_name(self, username):
+        """Returns the account with the given username, or None."""
+        account = self._lookup('_by_name', username)
+        if account is None:
+            account = self._fetch('GetAccountByName',
+                                  {'username': username})
+        return dict(account) if account is not None else None
+
+    def resolve(self, account):
+        """Returns the accountID for an ID or username, or None.
+
+        Strings of digits are taken as IDs."""
+        if isinstance(account, six.integer_types) or \
+                str(account).isdigit():
+            found = self.get(account)
+        else:
+            found = self.by_name(account)
+        return found['accountID'] if found is not None else None
+
+    def accounts(self):
+        """Returns every account, in accountID order."""
+        with self._lock:
+            if self._by_id is None:
+                self.load()
+            return [dict(self._by_id[account_id])
+                    for account_id in sorted(self._by_id)]
+
+    def _on_request(self, method, params, result):
+        if method == 'AddAccount':
+            if isinstance(result, dict) and 'account' in result:
+                self._add(result['account'])
+            # NOTE: Older clusters only return the new ID; the account is
+            # fetched by the first lookup that misses it.
+        elif method == 'ModifyAccount':
+            with self._lock:
+                if self._by_id is None:
+                    return
+                account = self._by_id.get(int(params['accountID']))
+                if account is None:
+                    return
+                account = dict(account)
+                for key in _MODIFIABLE:
+                    if key in params:
+                        account[key] = params[key]
+                self._add(account)
+        elif method == 'RemoveAccount':
+            self._remove(int(params['accountID']))
@@ -0,0 +1,168 @@
+"""Wait on many asynchronous operations at once.
+
+Methods such as CloneVolume and CopyVolume return an asyncHandle that has
+to be polled with GetAsyncResult.  AsyncResultWaiter polls any number of
+handles together: every poll round goes out through the client's bounded
+map(), handles that are still running back off geometrically, and a handle
+is dropped as soon as its final result has been seen (the cluster only
+hands out a final result once).  A poll that fails in transit, or that the
+cluster turns away as busy, says nothing about the operation, so the
+handle is polled again with the same backoff.  Handles can be added while
+the waiter is being iterated, which is how CloneOrchestrator refills its
+slots.
+"""
+
+import heapq
+import random
+import time
+
+from solidfire.managers import errors
+from solidfire import solidfire_element_api
+from solidfire import throttle
+from solidfire import utils
+
+DEFAULT_INITIAL_INTERVAL = 0.5
+DEFAULT_MAX_INTERVAL = 10.0
+DEFAULT_BACKOFF = 1.5
+
+# Polls of one handle in a row that may fail in transit before the handle
+# is given up on with the last error.
+DEFAULT_MAX_POLL_ERRORS = 20
+
+
+def _poll_failed(error):
+    """Whether error is about the poll rather than the operation."""
+    return (not isinstance(error,
+                           solidfire_element_api.SolidFireRequestException) or
+            throttle.is_rejected(error))
+
+
+class AsyncResultWaiter(object):
+    """Iterates over (handle, result, error) as async operations finish.
+
+    Exactly one of result/error is set for each handle; result is the
+    GetAsyncResult response of a successful operation.  A handle fails
+    when its result reports an error, when timeout runs out, or after
+    max_poll_errors polls in a row failed in transit.  completed, failed,
+    pending and throughput can be read at any point for progress."""
+
+    def __init__(self, client, handles,
+                 concurrency=utils.DEFAULT_CONCURRENCY,
+                 initial_interval=DEFAULT_INITIAL_INTERVAL,
+                 max_interval=DEFAULT_MAX_INTERVAL,
+                 backoff=DEFAULT_BACKOFF,
+                 timeout=None,
+                 max_poll_errors=DEFAULT_MAX_POLL_ERRORS):
+        self.client = client
+        self.handles = []
+        self.concurrency = concurrency
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.timeout = timeout
+        self.max_poll_errors = max_poll_errors
+        self.total = 0
+        self.completed = 0
+        self.failed = 0
+        self.polls = 0
+        self.poll_errors = 0
+        self.start_time = None
+        self._schedule = []
+        self._deadlines = {}
+        # handle -> polls in a row that failed in transit
+        self._poll_errors = {}
+        for handle in handles:
+            self.add(handle)
+
+    def add(self, handle):
+        """Starts waiting on another handle, polling it right away.
+
+        A timeout counts from the time the handle is added."""
+        now = time.time()
+        self.handles.append(handle)
+        self.total += 1
+        if self.timeout is not None:
+            self._deadlines[handle] = now + self.timeout
+        heapq.heappush(self._schedule, (now, handle, self.initial_interval))
+
+    @property
+    def pending(self):
+        return self.total - self.completed - self.failed
+
+    @property
+    def elapsed(self):
+        if self.start_time is None:
+            return 0.0
+        return time.time() - self.start_time
+
+    @property
+    def throughput(self):
+        """Finished operations per second so far."""
+        elapsed = self.elapsed
+        if not elapsed:
+            return 0.0
+        return (self.completed + self.failed) / elapsed
+
+    def _next_interval(self, interval):
+        # Jitter keeps handles issued together from being polled in lockstep.
+        interval = min(interval * self.backoff, self.max_interval)
+        return interval * random.uniform(0.8, 1.2)
+
+    def __iter__(self):
+        """Yields until every handle added so far has finished.
+
+        Iterating again resumes with handles added since."""
+        if self.start_time is None:
+            self.start_time = time.time()
+        schedule = self._schedule
+
+        while schedule:
+            delay = schedule[0][0] - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            now = time.time()
+            due = []
+            while schedule and schedule[0][0] <= now:
+                due.append(heapq.heappop(schedule))
+
+            params_list = [{'asyncHandle': handle} for _, handle, _ in due]
+            self.polls += len(params_list)
+            for index, result, error in self.client.map(
+                    'GetAsyncResult', params_list,
+                    concurrency=self.concurrency):
+                _, handle, interval = due[index]
+                deadline = self._deadlines.get(handle)
+                running = error is None and result.get('status') != 'complete'
+                if error is not None and _poll_failed(error):
+                    self.poll_errors += 1
+                    count = self._poll_errors.get(handle, 0) + 1
+                    self._poll_errors[handle] = count
+                    running = count < self.max_poll_errors
+                elif error is None:
+                    self._poll_errors.pop(handle, None)
+                if running:
+                    if deadline is not None and time.time() >= deadline:
+                        error = errors.failure('Timed out waiting for '
+                                               'async handle %s' % handle,
+                                               'xAsyncResultTimeout')
+                    else:
+                        interval = self._next_interval(interval)
+                        heapq.heappush(schedule, (time.time() + interval,
+                                                  handle, interval))
+                        continue
+                if error is None and 'error' in result:
+                    error = solidfire_element_api.SolidFireRequestException(
+                        ('API response: %s', result))
+                self._deadlines.pop(handle, None)
+                self._poll_errors.pop(handle, None)
+                if error is not None:
+                    self.failed += 1
+                    yield handle, None, error
+                else:
+                    self.completed += 1
+                    yield handle, result, None
+
+
+def wait_for_async_results(client, handles, **kwargs):
+    """Returns an AsyncResultWaiter over handles; see its docstring."""
+    return AsyncResultWaiter(client, handles, **kwargs)
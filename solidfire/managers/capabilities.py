@@ -0,0 +1,149 @@
+"""API version and limits discovery, cached per cluster.
+
+Which calls a client can use depends on the cluster's API version:
+ListVolumes with its server side filters, for instance, arrived in 8.0
+and older clusters need ListActiveVolumes plus ListDeletedVolumes.
+negotiate() asks the cluster once (GetClusterVersionInfo and GetLimits),
+points the client at the newest API version both sides support and
+returns a Capabilities.  With a CapabilityCache the answer is kept on
+disk per cluster for ttl seconds, so short lived processes such as
+sfcli don't pay a discovery round trip on every run.
+"""
+
+import os
+import time
+
+from solidfire import codec
+
+# Newest API version this library knows the methods of.
+MAX_API_VERSION = 8.0
+
+# Seconds a cached answer is trusted; clusters are rarely upgraded.
+DEFAULT_TTL = 24 * 3600
+
+
+def _version(value):
+    return float('.'.join(str(value).split('.')[:2]))
+
+
+class Capabilities(object):
+    """What one cluster supports, as found by discover()."""
+
+    def __init__(self, api_version, cluster_version=None, limits=None,
+                 discovered=None):
+        self.api_version = _version(api_version)
+        self.cluster_version = cluster_version
+        self.limits = limits or {}
+        self.discovered = discovered
+
+    @property
+    def endpoint_version(self):
+        """API version clients should talk to, as a string ('8.0')."""
+        return '%.1f' % min(self.api_version, MAX_API_VERSION)
+
+    @property
+    def supports_list_volumes(self):
+        return self.api_version >= 8
+
+    def limit(self, name, default=None):
+        return self.limits.get(name, default)
+
+    def to_dict(self):
+        return {'apiVersion': self.api_version,
+                'clusterVersion': self.cluster_version,
+                'limits': self.limits,
+                'discovered': self.discovered}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['apiVersion'], data.get('clusterVersion'),
+                   data.get('limits'), data.get('discovered'))
+
+
+def cluster_key(endpoint_dict):
+    """Returns the key a cluster's capabilities are cached under."""
+    return endpoint_dict.get('url') or endpoint_dict.get('mvip')
+
+
+def discover(client):
+    """Asks the cluster for its API version and limits (two calls)."""
+    info = client.get_cluster_version_info()
+    return Capabilities(info['clusterAPIVersion'],
+                        info.get('clusterVersion'),
+                        client.get_limits(), time.time())
+
+
+class CapabilityCache(object):
+    """Capabilities of any number of clusters kept in one JSON file.
+
+    A missing or unreadable file is treated as empty; entries older than
+    ttl seconds are ignored."""
+
+    def __init__(self, path, ttl=DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as cache:
+                return codec.decode(cache.read())
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _fresh(self, entry):
+        return time.time() - entry.get('discovered', 0) <= self.ttl
+
+    def get(self, key):
+        """Returns the cached Capabilities for key, or None if stale."""
+        entry = self._load().get(key)
+        if entry is None or not self._fresh(entry):
+            return None
+        return Capabilities.from_dict(entry)
+
+    def _save(self, entries):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        # NOTE: Write and rename so concurrent sfcli runs never read a
+        # half written file.
+        tmp = '%s.%d' % (self.path, os.getpid())
+        with open(tmp, 'wb') as cache:
+            cache.write(codec.encode(entries))
+        os.rename(tmp, self.path)
+
+    def put(self, key, capabilities):
+        entries = dict((k, entry) for k, entry in self._load().items()
+                       if self._fresh(entry))
+        entries[key] = capabilities.to_dict()
+        self._save(entries)
+
+    def invalidate(self, key):
+        entries = self._load()
+        if entries.pop(key, None) is not None:
+            self._save(entries)
+
+
+def cached(client, cache):
+    """Returns the cached Capabilities for client's cluster, or None.
+
+    Applies the cached API version to the client without any calls."""
+    capabilities = cache.get(cluster_key(client.endpoint_dict))
+    if capabilities is not None:
+        client.api_version = capabilities.endpoint_version
+    return capabilities
+
+
+def negotiate(client, cache=None, refresh=False):
+    """Sets client.api_version for its cluster and returns Capabilities.
+
+    The cache, if given, is used unless refresh is set, and updated after
+    a discovery."""
+    capabilities = None
+    if cache is not None and not refresh:
+        capabilities = cached(client, cache)
+    if capabilities is None:
+        capabilities = discover(client)
+        if cache is not None:
+            cache.put(cluster_key(client.endpoint_dict), capabilities)
+        client.api_version = capabilities.endpoint_version
+    return capabilities
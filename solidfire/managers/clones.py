@@ -0,0 +1,191 @@
+"""Clone many volumes as fast as the cluster allows.
+
+A cluster only runs a limited number of clones of the same source volume
+at a time (cloneJobsPerVolumeMax from GetLimits) and rejects CloneVolume
+beyond that.  CloneOrchestrator reads the limit once, keeps exactly that
+many clones of each source in flight and starts the next one as soon as
+polling shows a running clone has finished, so a fan-out from a golden
+image proceeds at the cluster's maximum clone rate.
+"""
+
+import collections
+import time
+
+from solidfire.managers import async_results
+from solidfire import throttle
+from solidfire import utils
+
+# Used when GetLimits doesn't report cloneJobsPerVolumeMax.
+DEFAULT_CLONES_PER_VOLUME = 2
+
+# Finished clones are noticed within this many seconds, so keep it short;
+# the default waiter backoff would leave slots idle for up to 10s.
+DEFAULT_MAX_POLL_INTERVAL = 2.0
+
+# Seconds before a source rejected with xMaxClonesPerVolumeExceeded (clones
+# started elsewhere) is tried again.
+DEFAULT_RETRY_INTERVAL = 1.0
+
+# Times a clone is retried after being rejected that way before it is
+# reported as failed.
+DEFAULT_MAX_RETRIES = 60
+
+_LIMIT_ERRORS = ('xMaxClonesPerVolumeExceeded', 'xMaxClonesExceeded')
+
+
+def clone_limit(client):
+    """Returns how many clones of one volume the cluster runs at once."""
+    limits = client.get_limits()
+    return int(limits.get('cloneJobsPerVolumeMax',
+                          DEFAULT_CLONES_PER_VOLUME))
+
+
+class CloneOrchestrator(object):
+    """Iterates over (index, clone, error) as clones finish.
+
+    specs is a list of CloneVolume parameter dicts (volumeID, name and
+    any of newAccountID, newSize, access, snapshotID, attributes); index
+    is the position of the spec.  clone is the CloneVolume response
+    (volumeID, cloneID, asyncHandle) for a clone that succeeded, and
+    exactly one of clone/error is set.  limit defaults to the cluster's
+    cloneJobsPerVolumeMax.  With wait=False every clone is started at
+    once and iteration ends right after, without polling; clones the
+    cluster turns away for its limit fail with that error instead of
+    waiting for a slot.  Otherwise a clone rejected because too many
+    clones of its source are running fails with that error once it has
+    been retried max_retries times, or retry_timeout seconds after it was
+    first rejected.  completed, failed, in_flight and throughput can be read
+    at any point for progress."""
+
+    def __init__(self, client, specs, limit=None,
+                 concurrency=utils.DEFAULT_CONCURRENCY,
+                 max_poll_interval=DEFAULT_MAX_POLL_INTERVAL,
+                 retry_interval=DEFAULT_RETRY_INTERVAL,
+                 max_retries=DEFAULT_MAX_RETRIES, retry_timeout=None,
+                 timeout=None, wait=True):
+        self.client = client
+        self.specs = list(specs)
+        self.limit = limit
+        self.concurrency = concurrency
+        self.retry_interval = retry_interval
+        self.max_retries = max_retries
+        self.retry_timeout = retry_timeout
+        self.wait = wait
+        self.total = len(self.specs)
+        self.completed = 0
+        self.failed = 0
+        self.start_time = None
+        self.waiter = async_results.AsyncResultWaiter(
+            client, [], concurrency=concurrency,
+            max_interval=max_poll_interval, timeout=timeout)
+        self._queues = collections.OrderedDict()
+        for index, spec in enumerate(self.specs):
+            self._queues.setdefault(spec['volumeID'],
+                                    collections.deque()).append(index)
+        self._running = {}
+        self._per_source = collections.Counter()
+        self._retry_at = {}
+        # index -> (retries so far, time first rejected)
+        self._retries = {}
+
+    @property
+    def in_flight(self):
+        return len(self._running)
+
+    @property
+    def pending(self):
+        return self.total - self.completed - self.failed
+
+    @property
+    def throughput(self):
+        """Finished clones per second so far."""
+        if self.start_time is None:
+            return 0.0
+        elapsed = time.time() - self.start_time
+        return (self.completed + self.failed) / elapsed if elapsed else 0.0
+
+    def _may_retry(self, index, now):
+        """Counts a retry of index; False once it is out of retries."""
+        retries, since = self._retries.get(index, (0, now))
+        if retries >= self.max_retries or (
+                self.retry_timeout is not None and
+                now - since >= self.retry_timeout):
+            self._retries.pop(index, None)
+            return False
+        self._retries[index] = (retries + 1, since)
+        return True
+
+    def _fill(self):
+        """Starts clones in free slots.
+
+        Yields (index, None, error) for the clones that failed to start."""
+        now = time.time()
+        batch = []
+        for source, queue in self._queues.items():
+            if self._retry_at.get(source, 0) > now:
+                continue
+            free = self.limit - self._per_source[source]
+            while queue and free > 0:
+                batch.append(queue.popleft())
+                free -= 1
+        params_list = [self.specs[index] for index in batch]
+        for position, result, error in self.client.map(
+                'CloneVolume', params_list, concurrency=self.concurrency):
+            index = batch[position]
+            source = self.specs[index]['volumeID']
+            if error is None:
+                self._retries.pop(index, None)
+                self._running[result['asyncHandle']] = (index, result)
+                self._per_source[source] += 1
+                self.waiter.add(result['asyncHandle'])
+            elif throttle.error_name(error) in _LIMIT_ERRORS and \
+                    self._may_retry(index, now):
+                # Clones of this source started by someone else; wait for
+                # one of ours (or the retry interval) and try again.
+                self._queues[source].appendleft(index)
+                self._retry_at[source] = now + self.retry_interval
+            else:
+                self.failed += 1
+                yield index, None, error
+        for source in [s for s, queue in self._queues.items() if not queue]:
+            del self._queues[source]
+
+    def _start_all(self):
+        """Starts every clone without waiting on any of them."""
+        for index, result, error in self.client.map(
+                'CloneVolume', self.specs, concurrency=self.concurrency,
+                ordered=True):
+            if error is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+            yield index, result, error
+        self._queues.clear()
+
+    def __iter__(self):
+        self.start_time = time.time()
+        if not self.wait:
+            for event in self._start_all():
+                yield event
+            return
+        if self.limit is None:
+            self.limit = clone_limit(self.client)
+        while self._queues or self._running:
+            for event in self._fill():
+                yield event
+            if not self._running:
+                time.sleep(self.retry_interval)
+                continue
+            for handle, _, error in self.waiter:
+                index, result = self._running.pop(handle)
+                source = self.specs[index]['volumeID']
+                self._per_source[source] -= 1
+                self._retry_at.pop(source, None)
+                if error is not None:
+                    self.failed += 1
+                    yield index, None, error
+                else:
+                    self.completed += 1
+                    yield index, result, None
+                for event in self._fill():
+                    yield event
@@ -0,0 +1,205 @@
+"""Run the same API call against many clusters at once.
+
+ClusterPool keeps one client (and so one connection pool and in-flight
+limiter) per cluster and fans a method call out to all of them on worker
+threads.  Results are yielded as each cluster answers, tagged with the
+cluster's name, so a fleet-wide query takes about as long as the slowest
+cluster rather than the sum of all of them.  A cluster that hasn't
+answered by its deadline is reported as failed and left behind.
+"""
+
+import threading
+import time
+
+from six.moves import queue
+
+from solidfire.managers import errors
+from solidfire import solidfire_element_api
+
+# Seconds each cluster gets to answer a fanned out call.
+DEFAULT_DEADLINE = 60
+
+# Records buffered per pool before workers wait on the consumer.
+RECORD_BUFFER = 1000
+
+
+def cluster_name(endpoint):
+    """Returns the name results from an endpoint are tagged with."""
+    return (endpoint.get('name') or endpoint.get('mvip') or
+            endpoint.get('url'))
+
+
+def _as_records(result):
+    if isinstance(result, dict):
+        return [result]
+    return result
+
+
+class ClusterPool(object):
+    """Clients for a set of clusters, called concurrently.
+
+    endpoints are endpoint dicts as taken by SolidFireAPI.  Each may also
+    carry 'name' (used to tag results, defaulting to the MVIP), and
+    'api_version' and 'deadline' overriding the pool wide values.  Other
+    keyword arguments are passed to every client."""
+
+    def __init__(self, endpoints, api_version=None,
+                 deadline=DEFAULT_DEADLINE, concurrency=None,
+                 **client_kwargs):
+        self.clusters = []
+        for endpoint in endpoints:
+            cluster_deadline = endpoint.get('deadline', deadline)
+            kwargs = dict(client_kwargs)
+            kwargs.setdefault('timeout', cluster_deadline)
+            client = solidfire_element_api.SolidFireAPI(
+                endpoint_dict=endpoint,
+                api_version=endpoint.get('api_version', api_version),
+                **kwargs)
+            name = cluster_name(endpoint)
+            if name in self.names:
+                # Clusters behind the same address on different ports.
+                name = endpoint.get('url')
+            self.clusters.append((name, client, cluster_deadline))
+        self.concurrency = concurrency or len(self.clusters)
+
+    @property
+    def names(self):
+        return [name for name, _, _ in self.clusters]
+
+    def client(self, name):
+        """Returns the client for one cluster of the pool."""
+        for cluster, client, _ in self.clusters:
+            if cluster == name:
+                return client
+        raise KeyError(name)
+
+    def close(self):
+        for _, client, _ in self.clusters:
+            client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _fan_out(self, method, args, kwargs, per_record):
+        """Yields (index, kind, payload) events from every cluster.
+
+        kind is 'record' (per_record only), 'result' or 'error'.  Calls
+        run on one thread per cluster, at most self.concurrency at a
+        time.  A cluster missing its deadline gets a timeout 'error' and
+        anything it sends afterwards is dropped."""
+        events = queue.Queue(RECORD_BUFFER)
+        slots = threading.Semaphore(max(1, int(self.concurrency)))
+        stop = threading.Event()
+        abandoned = set()
+
+        def put(event):
+            while not stop.is_set():
+                try:
+                    events.put(event, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def worker(index, client):
+            with slots:
+                if stop.is_set():
+                    return
+                put((index, 'start', time.time()))
+                try:
+                    result = getattr(client, method)(*args, **kwargs)
+                    if per_record:
+                        for record in _as_records(result):
+                            if index in abandoned or not put(
+                                    (index, 'record', record)):
+                                return
+                        result = None
+                    put((index, 'result', result))
+                except Exception as ex:
+                    put((index, 'error', ex))
+
+        for index, (_, client, _) in enumerate(self.clusters):
+            thread = threading.Thread(target=worker, args=(index, client))
+            thread.daemon = True
+            thread.start()
+
+        deadlines = {}
+        pending = set(range(len(self.clusters)))
+        try:
+            while pending:
+                # NOTE: Deadlines are checked on every event, not only
+                # when none arrive; a chatty cluster mustn't hold up the
+                # timeout of a silent one.
+                now = time.time()
+                for index in sorted(i for i, deadline in deadlines.items()
+                                    if deadline <= now):
+                    name, _, deadline = self.clusters[index]
+                    abandoned.add(index)
+                    pending.discard(index)
+                    del deadlines[index]
+                    yield index, 'error', errors.failure(
+                        '%s did not answer %s within %ss' %
+                        (name, method, deadline), 'xClusterTimeout')
+                if not pending:
+                    break
+                wait = None
+                if deadlines:
+                    wait = max(0, min(deadlines.values()) - time.time())
+                try:
+                    index, kind, payload = events.get(timeout=wait)
+                except queue.Empty:
+                    continue
+                if index not in pending:
+                    continue
+                if kind == 'start':
+                    deadlines[index] = payload + self.clusters[index][2]
+                    continue
+                if kind != 'record':
+                    pending.discard(index)
+                    deadlines.pop(index, None)
+                yield index, kind, payload
+        finally:
+            stop.set()
+
+    def map(self, method, *args, **kwargs):
+        """Calls client.<method>(*args, **kwargs) on every cluster.
+
+        Yields (cluster, result, error) as each cluster finishes, with
+        exactly one of result/error set."""
+        for index, kind, payload in self._fan_out(method, args, kwargs,
+                                                  False):
+            name = self.clusters[index][0]
+            if kind == 'error':
+                yield name, None, payload
+            else:
+                yield name, payload, None
+
+    def records(self, method, *args, **kwargs):
+        """Merged stream of the records returned by every cluster.
+
+        Yields (cluster, record, None) for each record as it arrives,
+        interleaving clusters, and (cluster, None, error) for a cluster
+        that failed or timed out.  Pass stream=True for list methods to
+        have records flow while responses are still being received.  A
+        method returning a single dict yields it as one record."""
+        for index, kind, payload in self._fan_out(method, args, kwargs,
+                                                  True):
+            name = self.clusters[index][0]
+            if kind == 'error':
+                yield name, None, payload
+            elif kind == 'record':
+                yield name, payload, None
+
+    def collect(self, method, *args, **kwargs):
+        """Returns ({cluster: result}, {cluster: error}) for a call."""
+        results = {}
+        errors = {}
+        for name, result, error in self.map(method, *args, **kwargs):
+            if error is not None:
+                errors[name] = error
+            else:
+                results[name] = result
+        return results, errors
@@ -0,0 +1,281 @@
+"""A read-through cache of the cluster's database entries.
+
+The cluster keeps a small hierarchical key/value store (Create/Get/Set/
+DeleteDatabaseEntry, ListDatabaseChildren[Data]) that agents use for
+configuration, and read in tight loops.  DatabaseCache keeps the entries
+it has seen, keyed by path, so repeated reads are dictionary lookups.
+prefetch() loads a whole subtree one level per round, with the
+ListDatabaseChildrenData calls of a level issued concurrently; once a
+path's children are known, reads of paths that don't exist below it are
+answered locally too.
+
+Writes use the entry's dataVersion for optimistic concurrency: set()
+sends the cached version, and a cluster that has a newer one rejects
+the write.  The cache then refreshes the entry and raises
+VersionConflict carrying it; update() wraps the read-modify-write in a
+retry loop.  Writes made through the same client, by this cache or not,
+patch it as they succeed (see SolidFireAPI.add_listener).  Changes made
+by other clients are picked up after ttl seconds, or invalidate().
+"""
+
+import copy
+import threading
+import time
+
+from solidfire import solidfire_element_api
+from solidfire import throttle
+from solidfire import utils
+
+# Times update() re-reads and retries after losing a write race.
+DEFAULT_UPDATE_RETRIES = 5
+
+_NO_SUCH_PATH = 'xDBNoSuchPath'
+_PATH_EXISTS = 'xDBPathExists'
+_VERSION_MISMATCH = 'xDBVersionMismatch'
+
+
+class VersionConflict(solidfire_element_api.SolidFireRequestException):
+    """A write lost to a newer dataVersion; entry is the current one.
+
+    entry is None if the path was deleted in the meantime."""
+
+    def __init__(self, arg, entry):
+        super(VersionConflict, self).__init__(arg)
+        self.entry = entry
+
+
+def _normalize(path):
+    return path.rstrip('/') or '/'
+
+
+def _join(parent, name):
+    return parent.rstrip('/') + '/' + name
+
+
+def _parent(path):
+    parent = path.rsplit('/', 1)[0]
+    return parent or '/'
+
+
+class DatabaseCache(object):
+    """Database entries ({path, data, dataVersion}) cached by path.
+
+    With ttl set, entries and child lists older than ttl seconds are
+    fetched again on their next read; by default they are kept until
+    invalidate()."""
+
+    def __init__(self, client, ttl=None,
+                 concurrency=utils.DEFAULT_CONCURRENCY):
+        self.client = client
+        self.ttl = ttl
+        self.concurrency = concurrency
+        self._lock = threading.RLock()
+        # path -> (entry, fetched); entry is None for a known absent path.
+        self._entries = {}
+        # path -> (set of child names, fetched)
+        self._children = {}
+        client.add_listener(self._on_request)
+
+    def close(self):
+        """Stops following writes made through the client."""
+        self.client.remove_listener(self._on_request)
+
+    def _fresh(self, fetched):
+        return self.ttl is None or time.time() - fetched <= self.ttl
+
+    def invalidate(self, path=None):
+        """Forgets path and everything below it, or the whole cache."""
+        with self._lock:
+            if path is None:
+                self._entries = {}
+                self._children = {}
+                return
+            path = _normalize(path)
+            prefix = path.rstrip('/') + '/'
+            for cached in (self._entries, self._children):
+                for key in [k for k in cached
+                            if k == path or k.startswith(prefix)]:
+                    del cached[key]
+
+    def _store(self, path, entry, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._entries[path] = (entry, now)
+            listed = self._children.get(_parent(path))
+            if listed is not None and path != '/':
+                name = path.rsplit('/', 1)[-1]
+                if entry is None:
+                    listed[0].discard(name)
+                else:
+                    listed[0].add(name)
+
+    def _cached(self, path):
+        """Returns (hit, entry) without going to the cluster."""
+        with self._lock:
+            found = self._entries.get(path)
+            if found is not None and self._fresh(found[1]):
+                return True, found[0]
+            listed = self._children.get(_parent(path))
+            if listed is not None and self._fresh(listed[1]) and \
+                    path.rsplit('/', 1)[-1] not in listed[0]:
+                return True, None
+        return False, None
+
+    def _fetch(self, path):
+        try:
+            entry = self.client.get_database_entry(path)
+        except solidfire_element_api.SolidFireRequestException as ex:
+            if throttle.error_name(ex) != _NO_SUCH_PATH:
+                raise
+            entry = None
+        self._store(path, entry)
+        return entry
+
+    def entry(self, path):
+        """Returns the entry at path (data and dataVersion), or None.
+
+        The entry is a copy; changing its data doesn't touch the cache."""
+        path = _normalize(path)
+        hit, entry = self._cached(path)
+        if not hit:
+            entry = self._fetch(path)
+        return copy.deepcopy(entry)
+
+    def get(self, path, default=None):
+        """Returns the data stored at path, or default if there is none."""
+        entry = self.entry(path)
+        return entry['data'] if entry is not None else default
+
+    def _store_children(self, path, result, now):
+        children = result.get('children', {})
+        if isinstance(children, dict):
+            children = children.items()
+        else:
+            children = [(child['path'].rsplit('/', 1)[-1], child)
+                        for child in children]
+        names = set()
+        with self._lock:
+            for name, child in children:
+                names.add(name)
+                self._entries[_join(path, name)] = (child, now)
+            self._children[path] = (names, now)
+        return sorted(names)
+
+    def children(self, path):
+        """Returns the names of path's children, loading their entries."""
+        path = _normalize(path)
+        with self._lock:
+            listed = self._children.get(path)
+            if listed is not None and self._fresh(listed[1]):
+                return sorted(listed[0])
+        result = self.client.list_database_children_data(path)
+        return self._store_children(path, result, time.time())
+
+    def prefetch(self, path, depth=None):
+        """Loads every entry below path, depth levels deep (all if None).
+
+        Returns the number of entries loaded.  Each level costs one
+        round of concurrent ListDatabaseChildrenData calls, one per
+        entry of the level above; leaves are only known to be leaves
+        after their own call, so pass depth when the layout is known."""
+        level = [_normalize(path)]
+        loaded = 0
+        while level and (depth is None or depth > 0):
+            now = time.time()
+            following = []
+            for index, result, error in self.client.map(
+                    'ListDatabaseChildrenData',
+                    [{'path': parent} for parent in level],
+                    concurrency=self.concurrency):
+                if error is not None:
+                    if throttle.error_name(error) == _NO_SUCH_PATH:
+                        continue
+                    raise error
+                parent = level[index]
+                names = self._store_children(parent, result, now)
+                loaded += len(names)
+                following.extend(_join(parent, name) for name in names)
+            level = following
+            if depth is not None:
+                depth -= 1
+        return loaded
+
+    def set(self, path, data, data_version=None):
+        """Writes data to path if it still has data_version.
+
+        data_version defaults to the cached entry's.  Returns the new
+        dataVersion, or raises VersionConflict with the current entry."""
+        path = _normalize(path)
+        if data_version is None:
+            current = self.entry(path)
+            if current is None:
+                raise VersionConflict(
+                    ('API response: %s',
+                     {'error': {'name': _NO_SUCH_PATH,
+                                'message': 'No such path %s' % path}}),
+                    None)
+            data_version = current['dataVersion']
+        try:
+            result = self.client.set_database_entry(path, data_version, data)
+        except solidfire_element_api.SolidFireRequestException as ex:
+            if throttle.error_name(ex) not in (_VERSION_MISMATCH,
+                                               _NO_SUCH_PATH):
+                raise
+            raise VersionConflict(ex.msg, self._fetch(path))
+        return result['dataVersion']
+
+    def update(self, path, func, retries=DEFAULT_UPDATE_RETRIES):
+        """Sets path to func(current data), retrying lost races.
+
+        func may be called several times and must not have side
+        effects.  Returns the new dataVersion."""
+        attempt = 0
+        while True:
+            entry = self.entry(path)
+            try:
+                if entry is None:
+                    return self.create(path, func(None))
+                return self.set(path, func(entry['data']),
+                                entry['dataVersion'])
+            except solidfire_element_api.SolidFireRequestException as ex:
+                if not isinstance(ex, VersionConflict):
+                    if throttle.error_name(ex) != _PATH_EXISTS:
+                        raise
+                    # Created by someone else since we looked.
+                    self._fetch(_normalize(path))
+                attempt += 1
+                if attempt > retries:
+                    raise
+
+    def create(self, path, data=None):
+        """Creates the entry at path and returns its dataVersion."""
+        result = self.client.create_database_entry(_normalize(path), data)
+        return result['dataVersion']
+
+    def delete(self, path, data_version=None):
+        """Deletes path if it still has data_version (cached by default)."""
+        path = _normalize(path)
+        if data_version is None:
+            current = self.entry(path)
+            if current is None:
+                return
+            data_version = current['dataVersion']
+        try:
+            self.client.delete_database_entry(path, data_version)
+        except solidfire_element_api.SolidFireRequestException as ex:
+            if throttle.error_name(ex) != _VERSION_MISMATCH:
+                raise
+            raise VersionConflict(ex.msg, self._fetch(path))
+
+    def _on_request(self, method, params, result):
+        if method not in ('CreateDatabaseEntry', 'SetDatabaseEntry',
+                          'DeleteDatabaseEntry'):
+            return
+        path = _normalize(params['path'])
+        if method == 'DeleteDatabaseEntry':
+            self.invalidate(path)
+            self._store(path, None)
+        else:
+            self._store(path, {'path': params['path'],
+                               'data': params.get('data'),
+                               'dataVersion': result['dataVersion']})
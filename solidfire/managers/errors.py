@@ -0,0 +1,10 @@
+"""Errors raised by the managers themselves rather than the cluster."""
+
+from solidfire import solidfire_element_api
+
+
+def failure(message, name):
+    """Builds an exception shaped like a failed API response."""
+    response = {'error': {'name': name, 'message': message}}
+    return solidfire_element_api.SolidFireRequestException(
+        ('API response: %s', response))
@@ -0,0 +1,342 @@
+"""A local SQLite mirror of a cluster's inventory.
+
+Inventory keeps volumes, accounts, snapshots and volume access groups in
+a SQLite file with the columns questions are usually asked about
+indexed, so reports and lookups run locally instead of listing the whole
+cluster every time.
+
+The first sync() loads everything.  Later syncs only fetch what is
+likely to have changed:
+
+* volumes created since the last sync, paged from the highest known ID;
+* the deleted volume list, which marks deletions;
+* the account list, whose per-account volume IDs show purges, restores
+  and volumes moved between accounts.  Those volumes are re-fetched.
+
+Changes that leave the account lists untouched (a resize, a QoS change)
+are only picked up by a full sync.  One runs automatically once
+full_interval seconds have passed since the last one, and
+refresh_volumes() re-fetches specific volumes on demand.
+"""
+
+import sqlite3
+import time
+
+from solidfire import codec
+from solidfire.managers import paging
+from solidfire.managers import volumes as volume_mgr
+
+SCHEMA_VERSION = 1
+
+# Seconds between automatic full re-syncs.
+DEFAULT_FULL_INTERVAL = 3600
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS volumes (
+    volumeID INTEGER PRIMARY KEY,
+    name TEXT,
+    accountID INTEGER,
+    status TEXT,
+    totalSize INTEGER,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS volumes_name ON volumes (name);
+CREATE INDEX IF NOT EXISTS volumes_account ON volumes (accountID, status);
+CREATE TABLE IF NOT EXISTS accounts (
+    accountID INTEGER PRIMARY KEY,
+    username TEXT,
+    status TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS accounts_username ON accounts (username);
+CREATE TABLE IF NOT EXISTS snapshots (
+    snapshotID INTEGER PRIMARY KEY,
+    volumeID INTEGER,
+    name TEXT,
+    createTime TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS snapshots_volume ON snapshots (volumeID);
+CREATE TABLE IF NOT EXISTS access_groups (
+    volumeAccessGroupID INTEGER PRIMARY KEY,
+    name TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS access_groups_name ON access_groups (name);
+'''
+
+_TABLES = ('volumes', 'accounts', 'snapshots', 'access_groups')
+
+
+def _encode(record):
+    return codec.encode(record).decode('utf-8')
+
+
+def _volume_row(vol):
+    return (vol['volumeID'], vol.get('name'), vol.get('accountID'),
+            vol.get('status'), vol.get('totalSize'), _encode(vol))
+
+
+def _account_row(account):
+    return (account['accountID'], account.get('username'),
+            account.get('status'), _encode(account))
+
+
+def _snapshot_row(snap):
+    return (snap['snapshotID'], snap.get('volumeID'), snap.get('name'),
+            snap.get('createTime'), _encode(snap))
+
+
+def _access_group_row(group):
+    return (group['volumeAccessGroupID'], group.get('name'), _encode(group))
+
+
+class Inventory(object):
+    """Local, queryable copy of one cluster's inventory."""
+
+    def __init__(self, client, path, api_version=None,
+                 full_interval=DEFAULT_FULL_INTERVAL,
+                 page_size=paging.DEFAULT_PAGE_SIZE):
+        self.client = client
+        self.path = path
+        self.api_version = api_version
+        self.full_interval = full_interval
+        self.page_size = page_size
+        self.db = sqlite3.connect(path)
+        self._create_schema()
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _create_schema(self):
+        with self.db:
+            self.db.executescript(_SCHEMA)
+            version = self._get_meta('schema')
+            if version is not None and int(version) != SCHEMA_VERSION:
+                for table in _TABLES + ('meta',):
+                    self.db.execute('DROP TABLE %s' % table)
+                self.db.executescript(_SCHEMA)
+            self._set_meta('schema', SCHEMA_VERSION)
+
+    def _get_meta(self, key):
+        row = self.db.execute('SELECT value FROM meta WHERE key = ?',
+                              (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.db.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                        (key, str(value)))
+
+    @property
+    def last_sync(self):
+        """Time of the last successful sync, or None."""
+        value = self._get_meta('last_sync')
+        return float(value) if value is not None else None
+
+    @property
+    def last_full_sync(self):
+        value = self._get_meta('last_full_sync')
+        return float(value) if value is not None else None
+
+    # Syncing
+
+    def _list_volumes(self, start_id=None):
+        """Pages through volumes (deleted ones included on API 8.0+)."""
+        if volume_mgr.supports_list_volumes(self.client, self.api_version):
+            return paging.iter_volumes(self.client, self.page_size,
+                                       start_id=start_id)
+        return paging.iter_active_volumes(self.client, self.page_size,
+                                          start_id=start_id)
+
+    def _upsert_volumes(self, vols):
+        cursor = self.db.executemany(
+            'INSERT OR REPLACE INTO volumes VALUES (?, ?, ?, ?, ?, ?)',
+            (_volume_row(vol) for vol in vols))
+        return max(cursor.rowcount, 0)
+
+    def _replace(self, table, rows, width):
+        self.db.execute('DELETE FROM %s' % table)
+        self.db.executemany('INSERT INTO %s VALUES (%s)' %
+                            (table, ', '.join(['?'] * width)), rows)
+
+    def _full_volumes(self):
+        self.db.execute('DELETE FROM volumes')
+        added = self._upsert_volumes(self._list_volumes())
+        if not volume_mgr.supports_list_volumes(self.client,
+                                                self.api_version):
+            added += self._upsert_volumes(
+                self.client.list_deleted_volumes(stream=True))
+        return {'added': added, 'updated': 0, 'removed': 0}
+
+    def _incremental_volumes(self, accounts):
+        max_id = self.db.execute(
+            'SELECT MAX(volumeID) FROM volumes').fetchone()[0] or 0
+        added = self._upsert_volumes(self._list_volumes(max_id + 1))
+
+        deleted = self.client.list_deleted_volumes()
+        deleted_ids = set(vol['volumeID'] for vol in deleted)
+        self._upsert_volumes(deleted)
+
+        # Every existing volume shows up in its account's volume list
+        # (or in the deleted list), so the accounts say which stored
+        # volumes were purged, restored or moved without listing them.
+        owners = {}
+        for account in accounts:
+            for volume_id in account.get('volumes', []):
+                owners[volume_id] = account['accountID']
+        stored = self.db.execute(
+            'SELECT volumeID, accountID, status FROM volumes').fetchall()
+        purged = []
+        stale = set(owners).difference(row[0] for row in stored)
+        for volume_id, account_id, status in stored:
+            if volume_id in deleted_ids:
+                continue
+            if volume_id not in owners:
+                purged.append((volume_id,))
+            elif status == 'deleted' or owners[volume_id] != account_id:
+                stale.add(volume_id)
+        self.db.executemany('DELETE FROM volumes WHERE volumeID = ?',
+                            purged)
+        updated = self._refresh(stale)
+        return {'added': added, 'updated': updated, 'removed': len(purged)}
+
+    def _refresh(self, volume_ids):
+        if not volume_ids:
+            return 0
+        found = volume_mgr.get_volumes(self.client, volume_ids,
+                                       api_version=self.api_version,
+                                       page_size=self.page_size)
+        self._upsert_volumes(found.values())
+        self.db.executemany('DELETE FROM volumes WHERE volumeID = ?',
+                            [(vid,) for vid in volume_ids
+                             if vid not in found])
+        return len(found)
+
+    def sync(self, full=False):
+        """Brings the local copy up to date with the cluster.
+
+        Returns a dict with the volume counts added, updated and removed,
+        and whether a full sync was done."""
+        now = time.time()
+        last_full = self.last_full_sync
+        full = (full or last_full is None or
+                now - last_full >= self.full_interval)
+        with self.db:
+            accounts = list(paging.iter_accounts(self.client,
+                                                 self.page_size))
+            if full:
+                stats = self._full_volumes()
+                self._set_meta('last_full_sync', now)
+            else:
+                stats = self._incremental_volumes(accounts)
+            self._replace('accounts', (_account_row(account)
+                                       for account in accounts), 4)
+            self._replace('snapshots', (
+                _snapshot_row(snap)
+                for snap in self.client.list_snapshots(stream=True)), 5)
+            self._replace('access_groups', (
+                _access_group_row(group) for group in
+                paging.iter_volume_access_groups(self.client,
+                                                 self.page_size)), 3)
+            self._set_meta('last_sync', now)
+        stats['full'] = full
+        return stats
+
+    def refresh_volumes(self, volume_ids):
+        """Re-fetches the given volumes, e.g. after modifying them."""
+        with self.db:
+            return self._refresh(set(int(vid) for vid in volume_ids))
+
+    # Queries
+
+    def _records(self, sql, params=()):
+        for (data,) in self.db.execute(sql, params):
+            yield codec.decode(data)
+
+    def volume(self, volume_id):
+        """Returns the stored volume with the given ID, or None."""
+        for vol in self._records('SELECT data FROM volumes '
+                                 'WHERE volumeID = ?', (int(volume_id),)):
+            return vol
+        return None
+
+    def volumes(self, name=None, account_id=None, status=None,
+                pattern=None):
+        """Yields stored volumes in volumeID order.
+
+        name matches exactly (and uses the index); pattern is an SQL LIKE
+        pattern, e.g. 'db-%'."""
+        clauses = []
+        params = []
+        if name is not None:
+            clauses.append('name = ?')
+            params.append(name)
+        if pattern is not None:
+            clauses.append('name LIKE ?')
+            params.append(pattern)
+        if account_id is not None:
+            clauses.append('accountID = ?')
+            params.append(int(account_id))
+        if status is not None:
+            clauses.append('status = ?')
+            params.append(status)
+        sql = 'SELECT data FROM volumes'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        return self._records(sql + ' ORDER BY volumeID', params)
+
+    def find_volumes(self, pattern):
+        """Yields volumes whose name matches an SQL LIKE pattern."""
+        return self.volumes(pattern=pattern)
+
+    def accounts(self):
+        return self._records('SELECT data FROM accounts ORDER BY accountID')
+
+    def account(self, account_id=None, username=None):
+        if account_id is not None:
+            sql, param = 'accountID = ?', int(account_id)
+        else:
+            sql, param = 'username = ?', username
+        for account in self._records('SELECT data FROM accounts WHERE ' +
+                                     sql, (param,)):
+            return account
+        return None
+
+    def snapshots(self, volume_id=None):
+        if volume_id is None:
+            return self._records('SELECT data FROM snapshots '
+                                 'ORDER BY snapshotID')
+        return self._records('SELECT data FROM snapshots WHERE volumeID = ? '
+                             'ORDER BY snapshotID', (int(volume_id),))
+
+    def access_groups(self):
+        return self._records('SELECT data FROM access_groups '
+                             'ORDER BY volumeAccessGroupID')
+
+    def account_totals(self, status='active'):
+        """Returns per account volume counts and provisioned bytes."""
+        rows = self.db.execute(
+            'SELECT a.accountID, a.username, COUNT(v.volumeID), '
+            'COALESCE(SUM(v.totalSize), 0) FROM accounts a '
+            'LEFT JOIN volumes v ON v.accountID = a.accountID '
+            'AND v.status = ? GROUP BY a.accountID ORDER BY a.accountID',
+            (status,))
+        return [{'accountID': account_id, 'username': username,
+                 'volumes': count, 'totalSize': total}
+                for account_id, username, count, total in rows]
+
+    def query(self, sql, params=()):
+        """Runs a read-only SQL query against the mirror, returning rows.
+
+        Record columns hold the full API object as JSON in `data`."""
+        return self.db.execute(sql, params).fetchall()
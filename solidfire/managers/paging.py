@@ -0,0 +1,104 @@
+"""Lazy, paged iteration over the SolidFire list methods.
+
+The list methods all take a start ID and a limit, so rather than pulling a
+whole inventory in one response these generators walk the ID space a page
+at a time and yield records as each page arrives.  Memory stays bounded by
+the page size regardless of cluster size.  Passing fields keeps only
+those keys of each record (the ID key is always kept), and start_id
+resumes a listing from a known ID.
+"""
+
+import heapq
+
+from solidfire import records
+
+DEFAULT_PAGE_SIZE = 1000
+
+
+def iter_pages(fetch, id_key, start_id=None, page_size=DEFAULT_PAGE_SIZE):
+    """Yields records from fetch(start_id, limit) one page at a time.
+
+    fetch must return a list of records sorted by id_key, starting at
+    (and including) start_id.  Iteration stops at the first short page."""
+    page_size = int(page_size)
+    while True:
+        page = fetch(start_id, page_size)
+        for record in page:
+            yield record
+        if len(page) < page_size:
+            return
+        start_id = page[-1][id_key] + 1
+
+
+def iter_volumes(client, page_size=DEFAULT_PAGE_SIZE, volume_status=None,
+                 accounts=None, is_paired=None, fields=None, start_id=None):
+    """Pages through ListVolumes (API 8.0+) in volumeID order."""
+    fields = records.with_keys(fields, 'volumeID')
+
+    def fetch(start_id, limit):
+        return client.list_volumes(start_volume_id=start_id, limit=limit,
+                                   volume_status=volume_status,
+                                   accounts=accounts, is_paired=is_paired,
+                                   fields=fields)
+    return iter_pages(fetch, 'volumeID', start_id, page_size)
+
+
+def iter_active_volumes(client, page_size=DEFAULT_PAGE_SIZE, fields=None,
+                        start_id=None):
+    """Pages through ListActiveVolumes in volumeID order."""
+    fields = records.with_keys(fields, 'volumeID')
+
+    def fetch(start_id, limit):
+        return client.list_active_volumes(start_volume_id=start_id,
+                                          limit=limit, fields=fields)
+    return iter_pages(fetch, 'volumeID', start_id, page_size)
+
+
+def iter_volumes_for_account(client, account_id,
+                             page_size=DEFAULT_PAGE_SIZE, fields=None,
+                             start_id=None):
+    """Pages through ListVolumesForAccount in volumeID order."""
+    fields = records.with_keys(fields, 'volumeID')
+
+    def fetch(start_id, limit):
+        return client.list_volumes_for_account(account_id,
+                                               start_volume_id=start_id,
+                                               limit=limit, fields=fields)
+    return iter_pages(fetch, 'volumeID', start_id, page_size)
+
+
+def iter_accounts(client, page_size=DEFAULT_PAGE_SIZE, fields=None,
+                  start_id=None):
+    """Pages through ListAccounts in accountID order."""
+    fields = records.with_keys(fields, 'accountID')
+
+    def fetch(start_id, limit):
+        return client.list_accounts(start_account_id=start_id, limit=limit,
+                                    fields=fields)
+    return iter_pages(fetch, 'accountID', start_id, page_size)
+
+
+def iter_volume_access_groups(client, page_size=DEFAULT_PAGE_SIZE,
+                              start_id=None):
+    """Pages through ListVolumeAccessGroups in volumeAccessGroupID order."""
+    def fetch(start_id, limit):
+        return client.list_volume_access_groups(
+            start_volume_access_group_id=start_id,
+            limit=limit)['volumeAccessGroups']
+    return iter_pages(fetch, 'volumeAccessGroupID', start_id, page_size)
+
+
+def _keyed(stream, key, position):
+    for record in stream:
+        yield record[key], position, record
+
+
+def merge_by_id(streams, key='volumeID'):
+    """Lazily merges record streams that are each already sorted by key.
+
+    Used to interleave e.g. active and deleted volumes without collecting
+    and sorting the combined listing."""
+    merged = heapq.merge(*[_keyed(stream, key, position)
+                           for position, stream in enumerate(streams)])
+    for _, _, record in merged:
+        yield record
@@ -0,0 +1,329 @@
+"""Snapshot many volumes on schedules without stampeding the cluster.
+
+A SnapshotScheduler holds one SnapshotSchedule (an interval) per volume
+in a TimingWheel, so adding, finding and expiring due snapshots costs
+the same for ten volumes or ten thousand.  Each volume gets a fixed
+phase within its interval, spread evenly by volume ID, so an hourly
+schedule over thousands of volumes turns into a steady trickle of
+CreateSnapshot calls rather than a burst at the top of the hour.
+
+Due snapshots are issued concurrently but no faster than a TokenBucket
+allows.  When the cluster pushes back (xMaxSnapshotsPerNodeExceeded,
+HTTP 5xx, timeouts or the like) the rate is halved; each successful call
+adds one call per second back, up to the configured rate, much as
+AIMDLimiter sizes in-flight calls.  CreateSnapshot isn't idempotent, so
+a snapshot is only retried, and only max_retries times, when the cluster
+turned it away without running it (see throttle.is_rejected); one that
+timed out may have been taken anyway and counts as failed.  How late
+each snapshot was issued and how many were issued per second are kept
+in fixed memory.
+"""
+
+import heapq
+import math
+import threading
+import time
+
+from solidfire import metrics
+from solidfire import throttle
+from solidfire import utils
+
+# CreateSnapshot calls started per second at most.
+DEFAULT_RATE = 10.0
+
+# Resolution of the timing wheel in seconds, and its number of slots;
+# intervals longer than slots * tick just wait extra turns of the wheel.
+DEFAULT_TICK = 1.0
+DEFAULT_SLOTS = 3600
+
+# Seconds before a snapshot refused because the cluster was busy is
+# tried again.
+DEFAULT_RETRY_INTERVAL = 5.0
+
+# Times a refused snapshot is retried before it counts as failed.
+DEFAULT_MAX_RETRIES = 5
+
+# The rate isn't cut below this fraction of the configured one.
+MIN_RATE_FRACTION = 0.05
+
+# Spreads consecutive volume IDs evenly over an interval.
+_GOLDEN = (math.sqrt(5) - 1) / 2
+
+_GONE_ERRORS = ('xVolumeIDDoesNotExist',)
+
+
+class TimingWheel(object):
+    """Hashed timing wheel of items due at given times.
+
+    schedule() is O(1); advance() only looks at the slots of the ticks
+    that passed, and at each item once per turn of the wheel."""
+
+    def __init__(self, tick=DEFAULT_TICK, slots=DEFAULT_SLOTS, start=None):
+        self.tick = float(tick)
+        self._slots = [[] for _ in range(slots)]
+        self._next = int((time.time() if start is None else start) //
+                         self.tick)
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def schedule(self, when, item):
+        """Adds item, due at epoch time when."""
+        # Items due in a tick already passed expire on the next advance.
+        tick = max(int(when // self.tick), self._next)
+        self._slots[tick % len(self._slots)].append((tick, when, item))
+        self._count += 1
+
+    def next_tick(self):
+        """Returns the time the next tick starts."""
+        return self._next * self.tick
+
+    def advance(self, now=None):
+        """Returns [(when, item)] of the items due by now, earliest first."""
+        target = int((time.time() if now is None else now) // self.tick)
+        if target < self._next:
+            return []
+        slots = len(self._slots)
+        if target - self._next >= slots:
+            # NOTE: Fell more than a whole turn behind (a long stall or a
+            # clock jump); every slot is visited once instead.
+            ticks = range(slots)
+        else:
+            ticks = range(self._next, target + 1)
+        due = []
+        for tick in ticks:
+            slot = self._slots[tick % slots]
+            keep = []
+            for entry in slot:
+                if entry[0] <= target:
+                    due.append((entry[1], entry[2]))
+                else:
+                    keep.append(entry)
+            self._slots[tick % slots] = keep
+        self._next = target + 1
+        self._count -= len(due)
+        due.sort(key=lambda entry: entry[0])
+        return due
+
+
+class SnapshotSchedule(object):
+    """Snapshots one volume every interval seconds.
+
+    name_format, if given, is passed through time.strftime with the UTC
+    time the snapshot was due; otherwise the cluster names it.  phase
+    places the snapshots within the interval (0 to 1); by default it is
+    derived from the volume ID."""
+
+    def __init__(self, volume_id, interval, name_format=None,
+                 attributes=None, phase=None):
+        self.volume_id = int(volume_id)
+        self.interval = float(interval)
+        self.name_format = name_format
+        self.attributes = attributes
+        if phase is None:
+            phase = (self.volume_id * _GOLDEN) % 1.0
+        self.phase = phase
+
+    def next_due(self, after):
+        """Returns the first time this schedule is due after `after`."""
+        offset = self.phase * self.interval
+        return after + self.interval - ((after - offset) % self.interval)
+
+    def snapshot_name(self, due):
+        if self.name_format is None:
+            return None
+        return time.strftime(self.name_format, time.gmtime(due))
+
+
+class SnapshotScheduler(object):
+    """Issues the snapshots of many SnapshotSchedules as they fall due.
+
+    Call run() to do so until stop(), or run_pending() from an existing
+    loop.  on_result, if given, is called as on_result(schedule, due,
+    result, error) for every CreateSnapshot issued."""
+
+    def __init__(self, client, schedules=(), rate=DEFAULT_RATE, burst=None,
+                 concurrency=utils.DEFAULT_CONCURRENCY, tick=DEFAULT_TICK,
+                 slots=DEFAULT_SLOTS,
+                 retry_interval=DEFAULT_RETRY_INTERVAL,
+                 max_retries=DEFAULT_MAX_RETRIES, on_result=None):
+        self.client = client
+        self.max_rate = float(rate)
+        self.bucket = throttle.TokenBucket(rate, burst)
+        self.concurrency = concurrency
+        self.retry_interval = retry_interval
+        self.max_retries = max_retries
+        self.on_result = on_result
+        self.wheel = TimingWheel(tick, slots)
+        self.lateness = metrics.MethodStats()
+        self.issued = 0
+        self.failed = 0
+        self.missed = 0
+        self.retried = 0
+        self.start_time = None
+        self._last_decrease = 0.0
+        self._schedules = {}
+        self._ready = []
+        self._sequence = 0
+        # (volume_id, due) -> retries so far of a refused snapshot
+        self._retries = {}
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        for schedule in schedules:
+            self.add(schedule)
+
+    def __len__(self):
+        return len(self._schedules)
+
+    def add(self, schedule, now=None):
+        """Adds or replaces the schedule of schedule.volume_id."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._schedules[schedule.volume_id] = schedule
+            due = schedule.next_due(now)
+            self.wheel.schedule(due, (schedule, due))
+
+    def remove(self, volume_id):
+        """Stops snapshotting a volume; returns its schedule or None."""
+        # NOTE: Entries left in the wheel are dropped when they expire.
+        with self._lock:
+            return self._schedules.pop(int(volume_id), None)
+
+    def _current(self, schedule):
+        return self._schedules.get(schedule.volume_id) is schedule
+
+    def _push(self, due, schedule):
+        self._sequence += 1
+        heapq.heappush(self._ready, (due, self._sequence, schedule))
+
+    def _reschedule(self, schedule, due, now):
+        following = due + schedule.interval
+        if following <= now:
+            # Too late for the ones in between; don't issue a burst of
+            # catch-up snapshots.
+            following = schedule.next_due(now)
+            self.missed += int(round((following - due) /
+                                     schedule.interval)) - 1
+        self.wheel.schedule(following, (schedule, following))
+
+    def _create(self, entry):
+        due, schedule = entry
+        return self.client.create_snapshot(
+            schedule.volume_id, name=schedule.snapshot_name(due),
+            attributes=schedule.attributes)
+
+    def run_pending(self, now=None):
+        """Issues the snapshots that are due and the rate allows.
+
+        Returns the number of CreateSnapshot calls made."""
+        now = time.time() if now is None else now
+        if self.start_time is None:
+            self.start_time = now
+        with self._lock:
+            for _, (schedule, due) in self.wheel.advance(now):
+                if self._current(schedule):
+                    self._push(due, schedule)
+            # Drop entries of removed or replaced schedules first, so
+            # they don't use up tokens.
+            ready = [entry for entry in self._ready
+                     if self._current(entry[2])]
+            if len(ready) < len(self._ready):
+                heapq.heapify(ready)
+                self._ready = ready
+            batch = []
+            for _ in range(self.bucket.take(len(self._ready), now)):
+                entry = heapq.heappop(self._ready)
+                batch.append((entry[0], entry[2]))
+        if not batch:
+            return 0
+        issued = time.time()
+        for index, result, error in utils.bounded_map(
+                self._create, batch, concurrency=self.concurrency):
+            due, schedule = batch[index]
+            self._finished(schedule, due, issued, result, error)
+        return len(batch)
+
+    def _finished(self, schedule, due, issued, result, error):
+        with self._lock:
+            if error is not None and throttle.is_overload(error):
+                # The cluster is busy: slow down.  Calls issued together
+                # all report it, so the rate is only cut once a second.
+                now = time.time()
+                if now - self._last_decrease > 1.0:
+                    self.bucket.set_rate(max(
+                        self.max_rate * MIN_RATE_FRACTION,
+                        self.bucket.rate / 2))
+                    self._last_decrease = now
+            key = (schedule.volume_id, due)
+            retries = self._retries.pop(key, 0)
+            if error is not None and throttle.is_rejected(error) and \
+                    retries < self.max_retries and self._current(schedule):
+                # Turned away without being run, so try it again shortly.
+                self.retried += 1
+                self._retries[key] = retries + 1
+                self.wheel.schedule(issued + self.retry_interval,
+                                    (schedule, due))
+                return
+            self.issued += 1
+            self.lateness.add(max(0.0, issued - due), error is None)
+            if error is None:
+                rate = self.bucket.rate
+                if rate < self.max_rate:
+                    self.bucket.set_rate(min(self.max_rate, rate + 1.0))
+            else:
+                self.failed += 1
+            if error is not None and \
+                    throttle.error_name(error) in _GONE_ERRORS:
+                self.remove(schedule.volume_id)
+            elif self._current(schedule):
+                self._reschedule(schedule, due, issued)
+        if self.on_result is not None:
+            self.on_result(schedule, due, result, error)
+
+    def wait_time(self, now=None):
+        """Seconds until run_pending() may have something to do."""
+        now = time.time() if now is None else now
+        with self._lock:
+            if self._ready:
+                return self.bucket.wait_time(now)
+            return max(0.0, self.wheel.next_tick() - now)
+
+    def run(self, duration=None):
+        """Issues snapshots until stop() is called or duration passes."""
+        self._stop.clear()
+        end = time.time() + duration if duration is not None else None
+        while not self._stop.is_set():
+            self.run_pending()
+            wait = self.wait_time()
+            if end is not None:
+                if time.time() >= end:
+                    break
+                wait = min(wait, end - time.time())
+            self._stop.wait(max(wait, 0.001))
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def throughput(self):
+        """Snapshots issued per second since the scheduler started."""
+        if self.start_time is None:
+            return 0.0
+        elapsed = time.time() - self.start_time
+        return self.issued / elapsed if elapsed else 0.0
+
+    def stats(self):
+        """Returns counters and lateness (in seconds) so far."""
+        with self._lock:
+            return {'schedules': len(self._schedules),
+                    'issued': self.issued,
+                    'failed': self.failed,
+                    'missed': self.missed,
+                    'retried': self.retried,
+                    'backlog': len(self._ready),
+                    'rate': round(self.bucket.rate, 2),
+                    'throughput': round(self.throughput, 2),
+                    'late_p50': round(self.lateness.percentile(50), 3),
+                    'late_p99': round(self.lateness.percentile(99), 3),
+                    'late_max': round(self.lateness.max_time, 3)}
@@ -0,0 +1,186 @@
+"""Fleet-wide snapshot index and retention pruning.
+
+SnapshotIndex is built from a single cluster-wide ListSnapshots and
+groups the snapshots by volume, oldest first, so per-volume questions
+need no further calls.  RetentionPolicy describes what to keep (the
+last N snapshots of a volume, those newer than some age, or both) for
+some volumes or for snapshots carrying certain attributes.
+retention_plan() works out locally which snapshots the policies let go
+of, and prune() deletes them with DeleteSnapshot calls issued
+concurrently.  Snapshots that aren't in the 'done' state, such as the
+active one or one still being replicated, are never deleted, and
+neither are those whose state isn't known (listed without 'status').
+"""
+
+import calendar
+import time
+
+from solidfire import throttle
+from solidfire import utils
+
+# Keys kept per snapshot in an index.
+FIELDS = ('snapshotID', 'volumeID', 'name', 'createTime', 'status',
+          'totalSize', 'attributes')
+
+# Only snapshots in these states are deleted.
+PRUNABLE_STATUSES = ('done',)
+
+
+def parse_time(value):
+    """Returns a createTime ('2016-05-04T10:01:02Z') as epoch seconds."""
+    value = value.rstrip('Z').split('.')[0]
+    return calendar.timegm(time.strptime(value, '%Y-%m-%dT%H:%M:%S'))
+
+
+def _sort_key(snapshot):
+    # NOTE: createTime has one second resolution; the ID breaks ties in
+    # creation order.
+    return snapshot.get('createTime') or '', snapshot['snapshotID']
+
+
+class SnapshotIndex(object):
+    """Snapshots grouped by volumeID, each group oldest first."""
+
+    def __init__(self, snapshots=()):
+        self._by_volume = {}
+        for snapshot in snapshots:
+            self._by_volume.setdefault(snapshot['volumeID'],
+                                       []).append(snapshot)
+        for group in self._by_volume.values():
+            group.sort(key=_sort_key)
+
+    @classmethod
+    def load(cls, client, fields=FIELDS):
+        """Builds the index with one ListSnapshots call for all volumes."""
+        return cls(client.list_snapshots(stream=True, fields=fields))
+
+    def __len__(self):
+        return sum(len(group) for group in self._by_volume.values())
+
+    def __iter__(self):
+        for volume_id in sorted(self._by_volume):
+            for snapshot in self._by_volume[volume_id]:
+                yield snapshot
+
+    def volume_ids(self):
+        return sorted(self._by_volume)
+
+    def for_volume(self, volume_id):
+        """Returns the snapshots of a volume, oldest first."""
+        return list(self._by_volume.get(int(volume_id), ()))
+
+    def latest(self, volume_id):
+        """Returns the newest snapshot of a volume, or None."""
+        group = self._by_volume.get(int(volume_id))
+        return group[-1] if group else None
+
+    def discard(self, snapshot_ids):
+        """Drops the given snapshots, e.g. after deleting them."""
+        snapshot_ids = set(snapshot_ids)
+        for volume_id in list(self._by_volume):
+            group = [snapshot for snapshot in self._by_volume[volume_id]
+                     if snapshot['snapshotID'] not in snapshot_ids]
+            if group:
+                self._by_volume[volume_id] = group
+            else:
+                del self._by_volume[volume_id]
+
+
+class RetentionPolicy(object):
+    """Keeps the last keep_last snapshots and those under max_age seconds.
+
+    With both set a snapshot is kept if either rule keeps it.  The policy
+    only governs snapshots of volume_ids (all volumes if None) whose
+    attributes include every item of attributes (if given); both rules
+    count the governed snapshots of each volume separately."""
+
+    def __init__(self, keep_last=None, max_age=None, volume_ids=None,
+                 attributes=None):
+        if keep_last is None and max_age is None:
+            raise ValueError('A retention policy needs keep_last, max_age '
+                             'or both')
+        self.keep_last = keep_last
+        self.max_age = max_age
+        self.volume_ids = (set(int(vid) for vid in volume_ids)
+                           if volume_ids is not None else None)
+        self.attributes = attributes or {}
+
+    def governs(self, snapshot):
+        if self.volume_ids is not None and \
+                snapshot['volumeID'] not in self.volume_ids:
+            return False
+        attributes = snapshot.get('attributes') or {}
+        return all(attributes.get(key) == value
+                   for key, value in self.attributes.items())
+
+    def keep(self, snapshots, now):
+        """Returns the IDs to keep of one volume's governed snapshots.
+
+        snapshots are oldest first; any without a createTime are kept."""
+        kept = set()
+        if self.keep_last:
+            kept.update(snapshot['snapshotID']
+                        for snapshot in snapshots[-self.keep_last:])
+        if self.max_age is not None:
+            cutoff = now - self.max_age
+            kept.update(snapshot['snapshotID'] for snapshot in snapshots
+                        if not snapshot.get('createTime') or
+                        parse_time(snapshot['createTime']) > cutoff)
+        return kept
+
+
+def retention_plan(index, policies, now=None):
+    """Returns (delete, skipped): the snapshots policies let go of.
+
+    A snapshot is deleted only if at least one policy governs it and none
+    of those keeps it; snapshots no policy governs are left alone.
+    skipped holds those that would be deleted but aren't known to be in
+    a prunable state.  Both lists are in volume, then creation order."""
+    now = time.time() if now is None else now
+    delete = []
+    skipped = []
+    for volume_id in index.volume_ids():
+        snapshots = index.for_volume(volume_id)
+        governed = set()
+        kept = set()
+        for policy in policies:
+            mine = [snapshot for snapshot in snapshots
+                    if policy.governs(snapshot)]
+            governed.update(snapshot['snapshotID'] for snapshot in mine)
+            kept.update(policy.keep(mine, now))
+        for snapshot in snapshots:
+            if snapshot['snapshotID'] not in governed or \
+                    snapshot['snapshotID'] in kept:
+                continue
+            # NOTE: A snapshot without a status (listed without that
+            # field, or by an older API) may still be in use; keep it.
+            if snapshot.get('status') in PRUNABLE_STATUSES:
+                delete.append(snapshot)
+            else:
+                skipped.append(snapshot)
+    return delete, skipped
+
+
+def prune(client, snapshots, concurrency=utils.DEFAULT_CONCURRENCY,
+          index=None):
+    """Deletes snapshots concurrently; returns (deleted, errors).
+
+    deleted lists the snapshot IDs that are gone, including any that were
+    already deleted by someone else, and errors maps the others' IDs to
+    the exception.  Deleted snapshots are discarded from index if given."""
+    snapshot_ids = [snapshot['snapshotID'] for snapshot in snapshots]
+    deleted = []
+    errors = {}
+    for position, result, error in client.map(
+            'DeleteSnapshot',
+            [{'snapshotID': snapshot_id} for snapshot_id in snapshot_ids],
+            concurrency=concurrency):
+        snapshot_id = snapshot_ids[position]
+        if error is not None and \
+                throttle.error_name(error) != 'xSnapshotIDDoesNotExist':
+            errors[snapshot_id] = error
+        else:
+            deleted.append(snapshot_id)
+    if index is not None:
+        index.discard(deleted)
+    return sorted(deleted), errors
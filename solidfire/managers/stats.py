@@ -0,0 +1,187 @@
+"""Periodic volume statistics for many volumes at once.
+
+GetVolumeStats reports one volume's cumulative counters per call.
+VolumeStatsSampler instead fetches a whole round of volumes with the
+bulk list methods: one ListVolumeStatsByVolume call for every volume, or
+ListVolumeStats (API 8.0+) over chunks of the requested IDs issued
+concurrently.  Each round is packed into a Sample of flat integer arrays
+and kept in a fixed size ring, and rates() turns the last two rounds
+into per-second IOPS, throughput and per-interval latency.  Memory stays
+constant however long a sampler runs.
+"""
+
+import array
+import bisect
+import collections
+import time
+
+from solidfire.managers import volumes as volume_mgr
+from solidfire import utils
+
+# Counters stored per volume, in this order.  Missing ones are stored as
+# -1 (older clusters don't report the latency totals).
+FIELDS = ('readOps', 'writeOps', 'readBytes', 'writeBytes',
+          'readLatencyUSecTotal', 'writeLatencyUSecTotal', 'latencyUSec')
+_INDEX = dict((field, index) for index, field in enumerate(FIELDS))
+
+# Volume IDs per ListVolumeStats call.
+DEFAULT_CHUNK_SIZE = 500
+
+# Samples kept by a sampler; two are enough for rates.
+DEFAULT_HISTORY = 2
+
+
+class Sample(object):
+    """One round of stats: sorted volume IDs and their packed counters."""
+
+    __slots__ = ('time', 'volume_ids', 'values')
+
+    def __init__(self, sample_time, stats):
+        self.time = sample_time
+        self.volume_ids = array.array('q')
+        self.values = array.array('q')
+        for stat in sorted(stats, key=lambda s: s['volumeID']):
+            self.volume_ids.append(stat['volumeID'])
+            self.values.extend(int(stat.get(field, -1)) for field in FIELDS)
+
+    def __len__(self):
+        return len(self.volume_ids)
+
+    def _row(self, index):
+        start = index * len(FIELDS)
+        return self.values[start:start + len(FIELDS)]
+
+    def get(self, volume_id):
+        """Returns {field: value} for a volume, or None if not sampled."""
+        index = bisect.bisect_left(self.volume_ids, volume_id)
+        if index == len(self.volume_ids) or \
+                self.volume_ids[index] != volume_id:
+            return None
+        return dict(zip(FIELDS, self._row(index)))
+
+    def rows(self):
+        """Yields (volumeID, counters) in volumeID order."""
+        for index, volume_id in enumerate(self.volume_ids):
+            yield volume_id, self._row(index)
+
+
+def _latency(ops, latency_total):
+    if ops > 0 and latency_total >= 0:
+        return latency_total // ops
+    return None
+
+
+def rates(previous, current):
+    """Yields per volume rates between two samples, in volumeID order.
+
+    Volumes missing from either sample, or whose counters went backwards
+    (a re-created volume), are skipped.  Latencies are averages over the
+    interval when the cluster reports latency totals, and otherwise the
+    cluster's own recent latencyUSec."""
+    elapsed = current.time - previous.time
+    if elapsed <= 0:
+        return
+    old_rows = previous.rows()
+    old_id, old = next(old_rows, (None, None))
+    for volume_id, new in current.rows():
+        while old_id is not None and old_id < volume_id:
+            old_id, old = next(old_rows, (None, None))
+        if old_id != volume_id:
+            continue
+        delta = [n - o for n, o in zip(new, old)]
+        if any(value < 0 for value in delta[:4]):
+            continue
+        read_ops = delta[_INDEX['readOps']]
+        write_ops = delta[_INDEX['writeOps']]
+        read_latency = write_latency = None
+        latency = new[_INDEX['latencyUSec']]
+        if new[_INDEX['readLatencyUSecTotal']] >= 0:
+            read_total = delta[_INDEX['readLatencyUSecTotal']]
+            write_total = delta[_INDEX['writeLatencyUSecTotal']]
+            read_latency = _latency(read_ops, read_total)
+            write_latency = _latency(write_ops, write_total)
+            latency = _latency(read_ops + write_ops,
+                               read_total + write_total)
+        yield {'volumeID': volume_id,
+               'readIOPS': int(read_ops / elapsed),
+               'writeIOPS': int(write_ops / elapsed),
+               'readBps': int(delta[_INDEX['readBytes']] / elapsed),
+               'writeBps': int(delta[_INDEX['writeBytes']] / elapsed),
+               'readLatencyUSec': read_latency,
+               'writeLatencyUSec': write_latency,
+               'latencyUSec': latency if latency != -1 else None}
+
+
+class VolumeStatsSampler(object):
+    """Takes rounds of stats for a set of volumes (default: all of them).
+
+    volume_ids are fetched with ListVolumeStats in chunks of chunk_size,
+    up to concurrency calls at a time, on API 8.0+; older clusters and
+    the all volumes case use a single ListVolumeStatsByVolume call.
+    Chunks that fail are left out of the sample and listed in errors."""
+
+    def __init__(self, client, volume_ids=None, api_version=None,
+                 chunk_size=DEFAULT_CHUNK_SIZE,
+                 concurrency=utils.DEFAULT_CONCURRENCY,
+                 history=DEFAULT_HISTORY):
+        self.client = client
+        self.volume_ids = (sorted(set(int(vid) for vid in volume_ids))
+                           if volume_ids else None)
+        self.api_version = api_version
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.samples = collections.deque(maxlen=max(2, history))
+        self.errors = []
+
+    def _fetch(self):
+        fields = ('volumeID',) + FIELDS
+        if self.volume_ids is None:
+            return self.client.list_volume_stats_by_volume(stream=True,
+                                                           fields=fields)
+        if not volume_mgr.supports_list_volumes(self.client,
+                                                self.api_version):
+            wanted = set(self.volume_ids)
+            return (stat for stat in
+                    self.client.list_volume_stats_by_volume(stream=True,
+                                                            fields=fields)
+                    if stat['volumeID'] in wanted)
+        chunks = [self.volume_ids[i:i + self.chunk_size]
+                  for i in range(0, len(self.volume_ids), self.chunk_size)]
+        stats = []
+        for index, result, error in utils.bounded_map(
+                lambda chunk: self.client.list_volume_stats(chunk,
+                                                            fields=fields),
+                chunks, concurrency=self.concurrency):
+            if error is not None:
+                self.errors.append((chunks[index], error))
+            else:
+                stats.extend(result)
+        return stats
+
+    def sample(self):
+        """Takes one round of stats, adds it to samples and returns it."""
+        self.errors = []
+        started = time.time()
+        sample = Sample(started, self._fetch())
+        self.samples.append(sample)
+        return sample
+
+    def rates(self):
+        """Rates between the two most recent samples (see rates())."""
+        if len(self.samples) < 2:
+            return iter(())
+        return rates(self.samples[-2], self.samples[-1])
+
+    def watch(self, interval, count=None):
+        """Samples every interval seconds, yielding each round's rates.
+
+        The first round only primes the counters.  Stops after count
+        rounds of rates, or never when count is None."""
+        self.sample()
+        rounds = 0
+        while count is None or rounds < count:
+            time.sleep(max(0, self.samples[-1].time + interval -
+                           time.time()))
+            self.sample()
+            rounds += 1
+            yield self.rates()
@@ -0,0 +1,109 @@
+"""Volume lookups that avoid listing the whole cluster.
+
+Volume IDs are handed out in increasing order, so a single volume or a
+batch of recently created ones can be fetched with a start ID and a small
+limit instead of scanning every volume on the cluster.  The same trick
+lets create_volumes() look up a whole batch of new volumes at once.
+"""
+
+from solidfire.managers import paging
+from solidfire import utils
+
+
+def supports_list_volumes(client, api_version=None):
+    """True if the API has ListVolumes, with deleted volumes and filters.
+
+    ListVolumes arrived in API 8.0; api_version defaults to the
+    client's."""
+    if api_version is None:
+        api_version = client.api_version
+    return api_version is not None and float(api_version) >= 8
+
+
+def _find_deleted(client, volume_ids):
+    return dict((vol['volumeID'], vol)
+                for vol in client.list_deleted_volumes()
+                if vol['volumeID'] in volume_ids)
+
+
+def get_volume(client, volume_id, api_version=None):
+    """Returns the volume with the given ID, or None if it doesn't exist.
+
+    Costs a single ListVolumes call with limit=1 on API 8.0+.  Older
+    clusters use ListActiveVolumes the same way and fall back to
+    ListDeletedVolumes only when the volume isn't active."""
+    volume_id = int(volume_id)
+    if supports_list_volumes(client, api_version):
+        vols = client.list_volumes(start_volume_id=volume_id, limit=1)
+    else:
+        vols = client.list_active_volumes(start_volume_id=volume_id,
+                                          limit=1)
+    if vols and vols[0]['volumeID'] == volume_id:
+        return vols[0]
+    if supports_list_volumes(client, api_version):
+        return None
+    return _find_deleted(client, set([volume_id])).get(volume_id)
+
+
+def get_volumes(client, volume_ids, api_version=None,
+                page_size=paging.DEFAULT_PAGE_SIZE):
+    """Returns a dict of volumeID -> volume for the requested IDs.
+
+    The span between the lowest and highest ID is paged through once, so
+    fetching a batch of freshly created volumes costs a single call in
+    the common case.  IDs that don't exist are left out of the result."""
+    wanted = set(int(vid) for vid in volume_ids)
+    if not wanted:
+        return {}
+    low, high = min(wanted), max(wanted)
+    list_volumes = supports_list_volumes(client, api_version)
+
+    def fetch(start_id, limit):
+        if list_volumes:
+            return client.list_volumes(start_volume_id=start_id, limit=limit)
+        return client.list_active_volumes(start_volume_id=start_id,
+                                          limit=limit)
+
+    found = {}
+    for vol in paging.iter_pages(fetch, 'volumeID', start_id=low,
+                                 page_size=min(page_size, high - low + 1)):
+        if vol['volumeID'] > high:
+            break
+        if vol['volumeID'] in wanted:
+            found[vol['volumeID']] = vol
+    missing = wanted.difference(found)
+    if missing and not list_volumes:
+        found.update(_find_deleted(client, missing))
+    return found
+
+
+def create_volumes(client, specs, concurrency=utils.DEFAULT_CONCURRENCY,
+                   api_version=None):
+    """Creates a batch of volumes with up to `concurrency` calls in flight.
+
+    specs is a list of CreateVolume parameter dicts (name, accountID,
+    totalSize and optionally enable512e, qos, attributes).  Returns
+    (volumes, errors): volumes maps the index of each spec that succeeded
+    to its new volume, errors maps the index of each that failed to the
+    exception.  A failure never stops the rest of the batch.
+
+    Clusters that return the new volume from CreateVolume cost one call
+    per volume; otherwise the new volumes are fetched afterwards with a
+    single ranged listing (see get_volumes)."""
+    volumes = {}
+    volume_ids = {}
+    errors = {}
+    for index, result, error in client.map('CreateVolume', specs,
+                                           concurrency=concurrency):
+        if error is not None:
+            errors[index] = error
+        elif result.get('volume'):
+            volumes[index] = result['volume']
+        else:
+            volume_ids[index] = result['volumeID']
+    if volume_ids:
+        found = get_volumes(client, volume_ids.values(),
+                            api_version=api_version)
+        for index, volume_id in volume_ids.items():
+            volumes[index] = found.get(volume_id, {'volumeID': volume_id})
+    return volumes, errors
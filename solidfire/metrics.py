@@ -0,0 +1,105 @@
+"""Fixed-memory request metrics for the API clients.
+
+Every call is folded into per-method counters and a log-scale latency
+histogram, and the most recent calls are kept in a bounded ring buffer.
+Memory use depends only on the number of distinct methods called, so a
+client can run for as long as needed without its history growing.
+"""
+
+import bisect
+import collections
+import threading
+
+DEFAULT_HISTORY_SIZE = 1000
+
+# Histogram bucket upper bounds in seconds: 0.5ms up to ~2 minutes, each
+# bucket 20% wider than the one before it.
+BUCKET_BOUNDS = []
+_bound = 0.0005
+while _bound < 120:
+    BUCKET_BOUNDS.append(_bound)
+    _bound *= 1.2
+del _bound
+
+
+class MethodStats(object):
+    """Counters and latency histogram for a single API method."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+
+    def add(self, duration, ok=True, bytes_out=0, bytes_in=0):
+        self.calls += 1
+        if not ok:
+            self.errors += 1
+        self.bytes_out += bytes_out
+        self.bytes_in += bytes_in
+        self.total_time += duration
+        self.max_time = max(self.max_time, duration)
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS, duration)] += 1
+
+    def percentile(self, pct):
+        """Returns the latency (upper bucket bound) at the given percentile."""
+        if not self.calls:
+            return 0.0
+        target = self.calls * pct / 100.0
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target:
+                if index < len(BUCKET_BOUNDS):
+                    return min(BUCKET_BOUNDS[index], self.max_time)
+                break
+        return self.max_time
+
+
+class MetricsStore(object):
+    """Thread-safe per-method call statistics plus recent call history.
+
+    recent holds (method, start_time, duration, status) tuples for the
+    last history_size calls, status being 'ok' or 'failed'."""
+
+    def __init__(self, history_size=DEFAULT_HISTORY_SIZE):
+        self.methods = {}
+        self.recent = collections.deque(maxlen=history_size)
+        self._lock = threading.Lock()
+
+    def record(self, method, start_time, duration, ok=True,
+               bytes_out=0, bytes_in=0):
+        with self._lock:
+            stats = self.methods.get(method)
+            if stats is None:
+                stats = self.methods[method] = MethodStats()
+            stats.add(duration, ok, bytes_out, bytes_in)
+            self.recent.append((method, start_time, duration,
+                                'ok' if ok else 'failed'))
+
+    def reset(self):
+        with self._lock:
+            self.methods = {}
+            self.recent.clear()
+
+    def summary(self):
+        """Returns one dict per method, latencies in milliseconds."""
+        with self._lock:
+            rows = []
+            for method in sorted(self.methods):
+                stats = self.methods[method]
+                rows.append({
+                    'method': method,
+                    'calls': stats.calls,
+                    'errors': stats.errors,
+                    'bytes_out': stats.bytes_out,
+                    'bytes_in': stats.bytes_in,
+                    'p50_ms': round(stats.percentile(50) * 1000, 1),
+                    'p90_ms': round(stats.percentile(90) * 1000, 1),
+                    'p99_ms': round(stats.percentile(99) * 1000, 1),
+                    'max_ms': round(stats.max_time * 1000, 1),
+                })
+            return rows
@@ -0,0 +1,319 @@
+"""Compact in-memory representations of API records.
+
+List responses decode to one dict per record, each carrying its own copy
+of every key and of nested values such as qos that are usually identical
+across the cluster.  For large inventories that adds up, so this module
+offers two leaner forms:
+
+* Record subclasses (see record_type and Volume) keep attributes in
+  __slots__ instead of a per-object dict.
+* RecordTable (and VolumeTable) stores records column by column, with
+  integer and boolean columns packed into arrays.
+
+Both share equal short strings, and the nested values of fields that
+repeat across records (SHARED_FIELDS), between records through an
+Interner.  Shared nested values are handed out as read-only copies.
+project() is the dict level counterpart used by the client's fields=
+projection.
+"""
+
+import array
+
+import six
+
+# Members of the volume object returned by the list methods.
+VOLUME_FIELDS = (
+    'volumeID', 'name', 'accountID', 'access', 'attributes', 'createTime',
+    'deleteTime', 'purgeTime', 'enable512e', 'iqn', 'qos',
+    'scsiEUIDeviceID', 'scsiNAADeviceID', 'sliceCount', 'status',
+    'totalSize', 'virtualVolumeID', 'volumeAccessGroups', 'volumePairs',
+)
+
+# Nested values that are usually the same for many volumes; nested values
+# of other fields (attributes, for one) are mostly unique and kept as is.
+SHARED_FIELDS = ('qos', 'volumeAccessGroups', 'volumePairs')
+
+_MISSING = object()
+
+
+def project(record, fields):
+    """Returns a dict holding only the given keys of record."""
+    return dict((key, record[key]) for key in fields if key in record)
+
+
+def with_keys(fields, *keys):
+    """Returns fields extended with any of keys it lacks.
+
+    None (meaning every field) is returned unchanged."""
+    if fields is None:
+        return None
+    fields = list(fields)
+    for key in keys:
+        if key not in fields:
+            fields.append(key)
+    return fields
+
+
+def _freeze(value):
+    """Returns a hashable key for a JSON value, tagged with its types.
+
+    The types keep 1, 1.0 and True (equal in Python) from sharing a key."""
+    if isinstance(value, dict):
+        return dict, tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return list, tuple(_freeze(v) for v in value)
+    return type(value), value
+
+
+def _read_only(*args, **kwargs):
+    raise TypeError('shared values are read-only; copy them first')
+
+
+class ReadOnlyDict(dict):
+    """A dict that refuses to be modified; copies of it are plain dicts."""
+
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+class ReadOnlyList(list):
+    """A list that refuses to be modified; copies of it are plain lists."""
+
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    __setslice__ = __delslice__ = _read_only
+    append = clear = extend = insert = pop = remove = _read_only
+    reverse = sort = _read_only
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+
+def read_only(value):
+    """Returns a read-only deep copy of a decoded JSON value."""
+    if isinstance(value, dict):
+        return ReadOnlyDict((k, read_only(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return ReadOnlyList(read_only(v) for v in value)
+    return value
+
+
+class Interner(object):
+    """Returns one shared instance for equal short strings and JSON values.
+
+    Long strings (names, IQNs, timestamps) are mostly unique, so they are
+    passed through rather than growing the table for no gain.  Lists and
+    dicts are only shared when empty or when they belong to one of
+    shared_fields, and are then returned as read-only copies."""
+
+    max_string = 16
+
+    def __init__(self, shared_fields=SHARED_FIELDS):
+        self.shared_fields = frozenset(shared_fields)
+        self._values = {}
+
+    def __call__(self, value, field=None):
+        if isinstance(value, six.string_types):
+            if len(value) > self.max_string:
+                return value
+            return self._values.setdefault((type(value), value), value)
+        if isinstance(value, (dict, list)):
+            if value and field not in self.shared_fields:
+                return value
+            key = _freeze(value)
+            shared = self._values.get(key)
+            if shared is None:
+                shared = self._values[key] = read_only(value)
+            return shared
+        return value
+
+
+class Record(object):
+    """Base class for slotted records; see record_type.
+
+    Records support the read side of the dict protocol so they can be
+    passed to code written against the decoded dicts.  A field that was
+    not present in the source dict is missing, not None."""
+
+    __slots__ = ()
+
+    def __init__(self, **kwargs):
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+    @classmethod
+    def from_dict(cls, data, interner=None):
+        """Builds a record from a decoded dict, ignoring unknown keys."""
+        record = cls.__new__(cls)
+        for key in cls.__slots__:
+            value = data.get(key, _MISSING)
+            if value is not _MISSING:
+                if interner is not None:
+                    value = interner(value, key)
+                setattr(record, key, value)
+        return record
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.__slots__ and hasattr(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [key for key in self.__slots__ if hasattr(self, key)]
+
+    def as_dict(self):
+        return dict((key, getattr(self, key)) for key in self.keys())
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            other = other.as_dict()
+        return self.as_dict() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, ', '.join(
+            '%s=%r' % (key, getattr(self, key)) for key in self.keys()))
+
+
+def record_type(name, fields):
+    """Creates a Record subclass with one slot per field."""
+    return type(str(name), (Record,), {'__slots__': tuple(fields)})
+
+
+Volume = record_type('Volume', VOLUME_FIELDS)
+
+
+class _Column(object):
+    """One column of a RecordTable.
+
+    Values are packed into a typed array while every value seen is an int
+    (or every value a bool), and kept in a list otherwise."""
+
+    __slots__ = ('typecode', 'values')
+
+    def __init__(self):
+        self.typecode = None
+        self.values = None
+
+    def _unpack(self):
+        if self.typecode == 'b':
+            self.values = [bool(value) for value in self.values]
+        elif self.typecode is not None:
+            self.values = list(self.values)
+        self.typecode = None
+
+    def append(self, value):
+        if self.values is None:
+            if isinstance(value, bool):
+                self.typecode, self.values = 'b', array.array('b')
+            elif isinstance(value, six.integer_types):
+                self.typecode, self.values = 'q', array.array('q')
+            else:
+                self.values = []
+        if self.typecode == 'b' and not isinstance(value, bool):
+            self._unpack()
+        elif self.typecode == 'q':
+            if (isinstance(value, bool) or
+                    not isinstance(value, six.integer_types)):
+                self._unpack()
+            else:
+                try:
+                    self.values.append(value)
+                    return
+                except OverflowError:
+                    self._unpack()
+        self.values.append(value)
+
+    def get(self, index):
+        value = self.values[index]
+        if self.typecode == 'b':
+            return bool(value)
+        return value
+
+
+class RecordTable(object):
+    """A column-oriented, append-only collection of records.
+
+    Only the given fields are kept.  Rows are returned as new dicts; the
+    nested values of shared_fields inside them are shared, read-only
+    copies (see Interner)."""
+
+    def __init__(self, fields, shared_fields=SHARED_FIELDS):
+        self.fields = tuple(fields)
+        self._columns = dict((field, _Column()) for field in self.fields)
+        self._interner = Interner(shared_fields)
+        self._length = 0
+
+    @classmethod
+    def from_records(cls, records, *args):
+        table = cls(*args)
+        table.extend(records)
+        return table
+
+    def append(self, record):
+        for field in self.fields:
+            value = record.get(field, _MISSING)
+            if value is not _MISSING:
+                value = self._interner(value, field)
+            self._columns[field].append(value)
+        self._length += 1
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def __len__(self):
+        return self._length
+
+    def column(self, field):
+        """Returns every value of one field, None where it was missing."""
+        col = self._columns[field]
+        values = [col.get(index) for index in range(self._length)]
+        return [None if value is _MISSING else value for value in values]
+
+    def row(self, index):
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('RecordTable index out of range')
+        row = {}
+        for field in self.fields:
+            value = self._columns[field].get(index)
+            if value is not _MISSING:
+                row[field] = value
+        return row
+
+    __getitem__ = row
+
+    def __iter__(self):
+        for index in range(self._length):
+            yield self.row(index)
+
+
+class VolumeTable(RecordTable):
+    """RecordTable of volumes, keeping VOLUME_FIELDS unless told otherwise."""
+
+    def __init__(self, fields=VOLUME_FIELDS):
+        super(VolumeTable, self).__init__(fields)
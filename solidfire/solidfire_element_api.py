@@ -1,12 +1,32 @@
-import json
 import logging
+import threading
+import time
 
 import warnings
-import requests
-from requests.packages.urllib3 import exceptions
+
+from solidfire import codec
+from solidfire import metrics
+from solidfire import records
+from solidfire import throttle
+from solidfire import utils
 
 LOG = logging.getLogger(__name__)
 
+# Number of per-host connection pools kept by a client, and the maximum
+# number of keep-alive connections held open to any single endpoint.
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = 10
+
+# Seconds to wait on the cluster for each request.
+DEFAULT_TIMEOUT = 30
+
+# Endpoint used by clients created without an api_version.  Every cluster
+# serves it, so version discovery (managers.capabilities) works through it.
+BASE_API_VERSION = '1.0'
+
+# Bytes read off the socket at a time when streaming list responses.
+STREAM_CHUNK_SIZE = 64 * 1024
+
 
 class SolidFireRequestException(Exception):
     message = "An unknown exception occurred."
@@ -20,10 +40,106 @@ class SolidFireAPI(object):
     def __init__(self, *args, **kwargs):
         self.endpoint_dict = kwargs.get('endpoint_dict')
         self.api_version = kwargs.get('api_version')
+        self.pool_connections = kwargs.get('pool_connections',
+                                           DEFAULT_POOL_CONNECTIONS)
+        self.pool_maxsize = kwargs.get('pool_maxsize', DEFAULT_POOL_MAXSIZE)
+        self.timeout = kwargs.get('timeout', DEFAULT_TIMEOUT)
+        self.max_in_flight = kwargs.get('max_in_flight', self.pool_maxsize)
+        self.retry_policy = kwargs.get(
+            'retry_policy',
+            throttle.RetryPolicy(kwargs.get('max_retries',
+                                            throttle.DEFAULT_MAX_RETRIES)))
         self.raw = True
-        self.request_history = []
+        self.metrics = metrics.MetricsStore(
+            kwargs.get('history_size', metrics.DEFAULT_HISTORY_SIZE))
+        # Bounded (method, start_time, duration, status) history.
+        self.request_history = self.metrics.recent
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._limiters = {}
+        self._listeners = []
+
+    @property
+    def session(self):
+        """Keep-alive HTTP session shared by every call on this client.
+
+        The session is built on first use and is safe to share between
+        threads; callers block once pool_maxsize connections to a single
+        endpoint are in use rather than opening extra ones."""
+        if self._session is None:
+            # NOTE: requests is imported here rather than at module level
+            # since it dominates import time, and sfcli commands that
+            # never reach the cluster (--help) shouldn't pay for it.
+            import requests
+            import requests.adapters
+
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = requests.adapters.HTTPAdapter(
+                        pool_connections=self.pool_connections,
+                        pool_maxsize=self.pool_maxsize,
+                        pool_block=True)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    session.verify = False
+                    self._session = session
+        return self._session
+
+    def close(self):
+        """Close any pooled connections held by this client."""
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def add_listener(self, callback):
+        """Calls callback(method, params, result) after each successful call.
+
+        Caches built on top of a client (such as AccountDirectory) use this
+        to see writes made through it.  Streamed list calls aren't
+        reported."""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        self._listeners.remove(callback)
+
+    def _notify(self, method, params, result):
+        for callback in list(self._listeners):
+            callback(method, params, result)
+
+    def _get_limiter(self, endpoint_url):
+        """Returns the adaptive in-flight limiter for an endpoint."""
+        limiter = self._limiters.get(endpoint_url)
+        if limiter is None:
+            with self._session_lock:
+                limiter = self._limiters.setdefault(
+                    endpoint_url, throttle.AIMDLimiter(self.max_in_flight))
+        return limiter
+
+    def _post(self, url, endpoint_dict, data, stream=False):
+        from requests.packages.urllib3 import exceptions
 
-    def send_request(self, method, params, endpoint=None):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", exceptions.InsecureRequestWarning)
+            req = self.session.post(url,
+                                    data=data,
+                                    auth=(endpoint_dict['login'],
+                                          endpoint_dict['password']),
+                                    verify=False,
+                                    timeout=self.timeout,
+                                    stream=stream)
+        if req.status_code >= 500:
+            req.close()
+            response = {'error': {'name': 'xHTTPError',
+                                  'code': req.status_code,
+                                  'message': 'HTTP %s from %s' %
+                                             (req.status_code, url)}}
+            raise SolidFireRequestException(('API response: %s', response))
+        return req
+
+    def _prepare_request(self, method, params, endpoint=None):
+        """Returns the (url, endpoint_dict, payload) for an API call."""
         if params is None:
             params = {}
 
@@ -31,31 +147,148 @@ class SolidFireAPI(object):
         # to enable some of the multi-cluster features like replication etc
         if endpoint is None:
             endpoint_dict = self.endpoint_dict
+        else:
+            endpoint_dict = endpoint
         payload = {'method': method, 'params': params}
 
-        url = '%s/json-rpc/%s/' % (endpoint_dict['url'], self.api_version)
+        url = '%s/json-rpc/%s/' % (endpoint_dict['url'],
+                                   self.api_version or BASE_API_VERSION)
+        return url, endpoint_dict, payload
 
-        LOG.debug('Issue SolidFire API call: %s' % json.dumps(payload))
+    def _parse_response(self, response, result_key=None, fields=None):
+        """Checks a decoded API response and returns its result.
 
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore", exceptions.InsecureRequestWarning)
-            req = requests.post(url,
-                                data=json.dumps(payload),
-                                auth=(endpoint_dict['login'],
-                                      endpoint_dict['password']),
-                                verify=False,
-                                timeout=30)
-        response = req.json()
-        req.close()
-        # TODO(jdg): Fix the above, failure cases like wrong password
-        # missing something that cause req.json to puke
-
-        LOG.debug('Raw response data from SolidFire API: %s' % response)
-        # TODO(jdg): Add check/retry catch for things where it's appropriate
+        If result_key is given only that member of the result is returned,
+        which lets the method wrappers below stay transport agnostic.  With
+        fields, each record in that member is cut down to those keys."""
+        LOG.debug('Raw response data from SolidFire API: %s', response)
         if 'error' in response:
             msg = ('API response: %s'), response
             raise SolidFireRequestException(msg)
-        return response['result']
+        if result_key is None:
+            return response['result']
+        result = response['result'][result_key]
+        if fields is not None:
+            result = [records.project(record, fields) for record in result]
+        return result
+
+    def send_request(self, method, params, endpoint=None, result_key=None,
+                     stream=False, fields=None):
+        """Issue an API call and return its result.
+
+        With stream=True a generator over the records in result[result_key]
+        is returned instead, decoded incrementally as the body arrives; the
+        list_* methods expose this through their own stream argument.
+        fields projects those records down to the listed keys."""
+        if stream:
+            return self._stream_request(method, params, endpoint, result_key,
+                                        fields)
+
+        url, endpoint_dict, payload = self._prepare_request(method, params,
+                                                            endpoint)
+
+        data = codec.encode(payload)
+        LOG.debug('Issue SolidFire API call: %s', codec.LazyText(data))
+
+        limiter = self._get_limiter(endpoint_dict['url'])
+        attempt = 0
+        while True:
+            attempt += 1
+            limiter.acquire()
+            start_time = time.time()
+            overloaded = False
+            ok = False
+            bytes_in = 0
+            try:
+                req = self._post(url, endpoint_dict, data)
+                bytes_in = len(req.content)
+                response = codec.decode(req.content)
+                # TODO(jdg): Fix the above, failure cases like wrong password
+                # missing something that cause req.json to puke
+                result = self._parse_response(response, result_key, fields)
+                ok = True
+            except Exception as ex:
+                overloaded = throttle.is_overload(ex)
+                if not self.retry_policy.should_retry(method, ex, attempt):
+                    raise
+                LOG.debug('Retrying %s after error: %s', method, ex)
+            finally:
+                duration = time.time() - start_time
+                limiter.release(method, duration, overloaded)
+                self.metrics.record(method, start_time, duration, ok,
+                                    len(data), bytes_in)
+            if ok:
+                if self._listeners:
+                    self._notify(method, params, response['result'])
+                return result
+            time.sleep(self.retry_policy.delay(attempt))
+
+    def _stream_request(self, method, params, endpoint, result_key,
+                        fields=None):
+        """Yields the records of result[result_key] as they are received.
+
+        The response body is decoded element by element straight off the
+        socket instead of being read and parsed as a whole."""
+        url, endpoint_dict, payload = self._prepare_request(method, params,
+                                                            endpoint)
+
+        data = codec.encode(payload)
+        LOG.debug('Issue SolidFire API call: %s', codec.LazyText(data))
+
+        limiter = self._get_limiter(endpoint_dict['url'])
+        limiter.acquire()
+        start_time = time.time()
+        try:
+            req = self._post(url, endpoint_dict, data, stream=True)
+        except Exception as ex:
+            duration = time.time() - start_time
+            limiter.release(method, duration, throttle.is_overload(ex))
+            self.metrics.record(method, start_time, duration, False,
+                                len(data))
+            raise
+        overloaded = False
+        ok = False
+        bytes_in = 0
+        try:
+            parser = utils.JSONArrayStream(result_key)
+            for chunk in req.iter_content(STREAM_CHUNK_SIZE):
+                bytes_in += len(chunk)
+                for record in parser.feed(chunk):
+                    if fields is not None:
+                        record = records.project(record, fields)
+                    yield record
+            response = parser.close()
+            ok = response is None or 'error' not in response
+        except Exception as ex:
+            overloaded = throttle.is_overload(ex)
+            raise
+        finally:
+            req.close()
+            # NOTE: the slot is held until the body has been read or the
+            # caller dropped the generator, as the cluster is still busy
+            # sending it until then.
+            duration = time.time() - start_time
+            limiter.release(method, duration, overloaded)
+            self.metrics.record(method, start_time, duration, ok, len(data),
+                                bytes_in)
+        if response is not None:
+            # No array in the body, most likely an error response.
+            for record in self._parse_response(response, result_key,
+                                               fields):
+                yield record
+
+    def map(self, method, params_list, concurrency=utils.DEFAULT_CONCURRENCY,
+            ordered=False):
+        """Issue `method` once for every dict in params_list concurrently.
+
+        Calls run on a bounded pool of `concurrency` threads sharing this
+        client's connection pool.  Yields (index, result, error) tuples in
+        completion order, or in input order if `ordered` is set; error is
+        the SolidFireRequestException (or transport error) for that item,
+        and a failed item never aborts the rest of the batch."""
+        return utils.bounded_map(
+            lambda params: self.send_request(method, params),
+            params_list, concurrency=concurrency, ordered=ordered)
 
     def clone_volume(self, volume_id, name, new_account_id=None,
                      new_size=None, access=None, snapshot_id=None,
@@ -79,7 +312,7 @@ class SolidFireAPI(object):
         from the source volume."""
 
         params = {"volumeID": volume_id, "name": name}
-        if new_account_id is None:
+        if new_account_id is not None:
             params["newAccountID"] = new_account_id
         if new_size is not None:
             params["newSize"] = new_size
@@ -118,7 +351,8 @@ class SolidFireAPI(object):
         if qos is not None:
             params["qos"] = qos
         params['attributes'] = attributes
-        return self.send_request('CreateVolume', params)['volumeID']
+        return self.send_request('CreateVolume', params,
+                                 result_key='volumeID')
 
     def delete_volume(self, volume_id):
         """DeleteVolume marks an active volume for deletion.
@@ -162,7 +396,35 @@ class SolidFireAPI(object):
             'GetVolumeStats',
             params)
 
-    def list_active_volumes(self, start_volume_id=None, limit=None):
+    def list_volume_stats(self, volume_ids, stream=False, fields=None):
+        """Retrieves activity measurements for a list of volumes.
+
+        Values are cumulative from the creation of each volume.  Requires
+        API 8.0 or later."""
+
+        params = {"volumeIDs": volume_ids}
+        return self.send_request(
+            'ListVolumeStats',
+            params,
+            result_key='volumeStats',
+            stream=stream,
+            fields=fields)
+
+    def list_volume_stats_by_volume(self, stream=False, fields=None):
+        """Retrieves activity measurements for every volume.
+
+        Values are cumulative from the creation of each volume."""
+
+        params = {}
+        return self.send_request(
+            'ListVolumeStatsByVolume',
+            params,
+            result_key='volumeStats',
+            stream=stream,
+            fields=fields)
+
+    def list_active_volumes(self, start_volume_id=None, limit=None,
+                            stream=False, fields=None):
         params = {}
         if start_volume_id is not None:
             params["startVolumeID"] = start_volume_id
@@ -170,16 +432,23 @@ class SolidFireAPI(object):
             params["limit"] = limit
         return self.send_request(
             'ListActiveVolumes',
-            params)['volumes']
+            params,
+            result_key='volumes',
+            stream=stream,
+            fields=fields)
 
-    def list_deleted_volumes(self):
+    def list_deleted_volumes(self, stream=False, fields=None):
         params = {}
         return self.send_request(
             'ListDeletedVolumes',
-            params)['volumes']
+            params,
+            result_key='volumes',
+            stream=stream,
+            fields=fields)
 
     def list_volumes(self, start_volume_id=None, limit=None,
-                     volume_status=None, accounts=None, is_paired=None):
+                     volume_status=None, accounts=None, is_paired=None,
+                     stream=False, fields=None):
         params = {}
         if start_volume_id is not None:
             params["startVolumeID"] = start_volume_id
@@ -191,10 +460,14 @@ class SolidFireAPI(object):
             params["accounts"] = accounts
         if is_paired is not None:
             params["isPaired"] = is_paired
-        return self.send_request('ListVolumes', params)['volumes']
+        return self.send_request('ListVolumes', params,
+                                 result_key='volumes',
+                                 stream=stream,
+                                 fields=fields)
 
     def list_volumes_for_account(self, account_id,
-                                 start_volume_id=None, limit=None):
+                                 start_volume_id=None, limit=None,
+                                 stream=False, fields=None):
         params = {"accountID": account_id}
         if start_volume_id is not None:
             params["startVolumeID"] = start_volume_id
@@ -202,7 +475,10 @@ class SolidFireAPI(object):
             params["limit"] = limit
         return self.send_request(
             'ListVolumesForAccount',
-            params)['volumes']
+            params,
+            result_key='volumes',
+            stream=stream,
+            fields=fields)
 
     def modify_volume(self, volume_id, account_id=None,
                       access=None, set_create_time=None, qos=None,
@@ -279,14 +555,18 @@ class SolidFireAPI(object):
     def get_account_efficiency(self, account_id):
         return self.send_request('GetAccountEfficiency', {})
 
-    def list_accounts(self, start_account_id=None, limit=None):
+    def list_accounts(self, start_account_id=None, limit=None,
+                      stream=False, fields=None):
         """Returns list of accounts, with optional paging support."""
         params = {}
         if start_account_id is not None:
             params["startAccountID"] = start_account_id
         if limit is not None:
             params["limit"] = limit
-        return self.send_request('ListAccounts', params)['accounts']
+        return self.send_request('ListAccounts', params,
+                                 result_key='accounts',
+                                 stream=stream,
+                                 fields=fields)
 
     def modify_account(self, account_id, status=None,
                        initiator_secret=None, target_secret=None,
@@ -299,9 +579,9 @@ class SolidFireAPI(object):
             else:
                 raise
         if initiator_secret:
-            params['initiator_secret'] = initiator_secret
+            params['initiatorSecret'] = initiator_secret
         if target_secret:
-            params['target_secret'] = target_secret
+            params['targetSecret'] = target_secret
         if attributes:
             params['attributes'] = attributes
         return self.send_request('ModifyAccount', params)
@@ -410,13 +690,16 @@ class SolidFireAPI(object):
             'DeleteSnapshot',
             params)
 
-    def list_snapshots(self, volume_id=None):
+    def list_snapshots(self, volume_id=None, stream=False, fields=None):
         """Used to return attributes of each snapshot taken on the volume."""
 
         params = {}
         if volume_id is not None:
             params["volumeID"] = volume_id
-        return self.send_request('ListSnapshots', params)['snapshots']
+        return self.send_request('ListSnapshots', params,
+                                 result_key='snapshots',
+                                 stream=stream,
+                                 fields=fields)
 
     def list_active_nodes(self):
         params = {}
@@ -0,0 +1,623 @@
+"""Offline end-to-end benchmarks against the fake cluster.
+
+Each scenario runs the library or the sfcli commands against a FakeCluster
+served from a separate process, so client-side measurements aren't mixed
+up with the server's work.  Wall time, API calls/sec (as counted by the
+server), the client's peak resident set size and its peak Python heap
+(tracemalloc) are reported per scenario and cluster size:
+
+    python -m solidfire.tests.benchmark --sizes 1000,10000,100000
+
+The RSS figure is the benchmark process's high-water mark (ru_maxrss) once
+the scenario has finished, so it never goes down from one row to the next;
+run a single scenario with --only to see its own peak.
+"""
+
+from __future__ import print_function
+
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from click import testing
+import prettytable
+import requests
+
+from solidfire import codec
+from solidfire import records
+from solidfire.cli import cli as sfcli
+from solidfire.cli import formatter as cli_formatter
+from solidfire.cli import utils as cli_utils
+from solidfire.managers import access_groups
+from solidfire.managers import accounts
+from solidfire.managers import clusters
+from solidfire.managers import database
+from solidfire.managers import inventory
+from solidfire.managers import paging
+from solidfire.managers import scheduler
+from solidfire.managers import snapshots
+from solidfire.managers import stats
+from solidfire import solidfire_element_api as api
+from solidfire.tests import fake_cluster
+
+SCENARIOS = []
+
+
+def scenario(name, per_size=True):
+    """Registers a benchmark; the function gets a Bench and returns notes."""
+    def register(func):
+        SCENARIOS.append((name, per_size, func))
+        return func
+    return register
+
+
+def _serve(conn, kwargs):
+    cluster = fake_cluster.FakeCluster(**kwargs).start()
+    conn.send(cluster.endpoint_dict)
+    conn.recv()
+    cluster.stop()
+
+
+class Bench(object):
+    """A fake cluster in a child process plus helpers to drive it."""
+
+    def __init__(self, size, **kwargs):
+        self.size = size
+        parent, child = multiprocessing.Pipe()
+        kwargs.setdefault('async_delay', 0.05)
+        self._conn = parent
+        self._process = multiprocessing.Process(
+            target=_serve, args=(child, dict(kwargs, volume_count=size)))
+        self._process.daemon = True
+        self._process.start()
+        self.endpoint_dict = parent.recv()
+        self.created = []
+
+    def stop(self):
+        self._conn.send('stop')
+        self._process.join()
+
+    def client(self, **kwargs):
+        kwargs.setdefault('api_version', '8.0')
+        return api.SolidFireAPI(endpoint_dict=self.endpoint_dict, **kwargs)
+
+    def call_count(self):
+        calls = self.client().send_request('FakeClusterCallCounts', {})
+        return sum(calls['calls'].values()) - calls['calls'].get(
+            'FakeClusterCallCounts', 0)
+
+    def sfcli(self, *args):
+        env = dict((k, str(v)) for k, v in self.endpoint_dict.items())
+        result = testing.CliRunner().invoke(sfcli.cli, list(args), env=env)
+        if result.exception is not None and result.exit_code != 0:
+            raise result.exception
+        return result.output
+
+
+def _max_rss():
+    """Returns this process's peak resident set size in bytes, or None."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # NOTE: Linux reports kilobytes, macOS bytes.
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def _run(func, bench, trace):
+    calls = bench.call_count()
+    if trace:
+        tracemalloc.start()
+    start = time.time()
+    notes = func(bench)
+    wall = time.time() - start
+    peak = None
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return wall, bench.call_count() - calls, peak, notes
+
+
+@scenario('pooled-calls', per_size=False)
+def bench_pooled(bench, count=300):
+    client = bench.client()
+    for i in range(count):
+        client.get_cluster_info()
+
+
+@scenario('unpooled-calls', per_size=False)
+def bench_unpooled(bench, count=300):
+    # What every call cost before the client kept a session: a fresh
+    # connection (and TLS handshake on https) per request.
+    url = '%s/json-rpc/8.0/' % bench.endpoint_dict['url']
+    auth = (bench.endpoint_dict['login'], bench.endpoint_dict['password'])
+    body = json.dumps({'method': 'GetClusterInfo', 'params': {}})
+    for i in range(count):
+        requests.post(url, data=body, auth=auth, verify=False).json()
+
+
+LIST_FIELDS = ['volumeID', 'iqn', 'enable512e', 'qos', 'totalSize']
+
+
+def _held(build):
+    """Returns build() and the MB of heap its result keeps alive."""
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        gc.collect()
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        gc.collect()
+        held = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+    return result, held / 1024.0 / 1024.0
+
+
+def _startup(bench, args, runs=10):
+    """Median wall time of a fresh sfcli process running args."""
+    env = dict(os.environ)
+    env.update((k, str(v)) for k, v in bench.endpoint_dict.items())
+    command = [sys.executable, '-c',
+               'from solidfire.cli.cli import cli; cli()'] + list(args)
+    times = []
+    with open(os.devnull, 'w') as devnull:
+        for i in range(runs):
+            start = time.time()
+            subprocess.check_call(command, env=env, stdout=devnull,
+                                  stderr=devnull)
+            times.append(time.time() - start)
+    return 'median %.0fms per process' % (sorted(times)[runs // 2] * 1000)
+
+
+@scenario('startup-help', per_size=False)
+def bench_startup_help(bench):
+    return _startup(bench, ['--help'])
+
+
+@scenario('startup-volumes-list', per_size=False)
+def bench_startup_list(bench):
+    return _startup(bench, ['volumes', 'list'])
+
+
+@scenario('fleet-capacity', per_size=False)
+def bench_fleet(bench, count=8, latency=0.2):
+    # Extra clusters run in this process; they mostly sleep out their
+    # latency, which is what a remote cluster looks like to the client.
+    fleet = [fake_cluster.FakeCluster(latency=latency).start()
+             for i in range(count)]
+    try:
+        endpoints = [cluster.endpoint_dict for cluster in fleet]
+        start = time.time()
+        for endpoint in endpoints:
+            api.SolidFireAPI(endpoint_dict=endpoint,
+                             api_version='8.0').get_cluster_capacity()
+        sequential = time.time() - start
+        start = time.time()
+        with clusters.ClusterPool(endpoints, api_version='8.0') as pool:
+            results, errors = pool.collect('get_cluster_capacity')
+        return '%d clusters: sequential %.2fs, pool %.2fs' % (
+            len(results), sequential, time.time() - start)
+    finally:
+        for cluster in fleet:
+            cluster.stop()
+
+
+@scenario('list-whole')
+def bench_list_whole(bench):
+    vols, held = _held(bench.client().list_volumes)
+    return '%d volumes, %.1fMB held' % (len(vols), held)
+
+
+@scenario('list-projected')
+def bench_list_projected(bench):
+    vols, held = _held(lambda: bench.client().list_volumes(
+        fields=LIST_FIELDS))
+    return '%d volumes, %.1fMB held' % (len(vols), held)
+
+
+@scenario('records-slotted')
+def bench_records_slotted(bench):
+    def build():
+        interner = records.Interner()
+        return [records.Volume.from_dict(vol, interner)
+                for vol in bench.client().list_volumes(stream=True)]
+    vols, held = _held(build)
+    return '%d volumes, %.1fMB held' % (len(vols), held)
+
+
+@scenario('records-table')
+def bench_records_table(bench):
+    table, held = _held(lambda: records.VolumeTable.from_records(
+        bench.client().list_volumes(stream=True)))
+    return '%d volumes, %.1fMB held' % (len(table), held)
+
+
+@scenario('list-stream')
+def bench_list_stream(bench):
+    start = time.time()
+    first = None
+    count = 0
+    for vol in bench.client().list_volumes(stream=True):
+        if first is None:
+            first = time.time() - start
+        count += 1
+    return 'first record after %.3fs' % first
+
+
+@scenario('list-paged')
+def bench_list_paged(bench):
+    start = time.time()
+    first = None
+    for vol in paging.iter_volumes(bench.client()):
+        if first is None:
+            first = time.time() - start
+    return 'first record after %.3fs' % first
+
+
+@scenario('cli-volumes-list')
+def bench_cli_list(bench):
+    bench.sfcli('volumes', 'list')
+
+
+@scenario('cli-volumes-show')
+def bench_cli_show(bench):
+    bench.sfcli('volumes', 'show', str(bench.size // 2 or 1))
+
+
+def _inventory(bench):
+    """Returns an Inventory of the bench cluster in a per-bench file."""
+    if getattr(bench, 'inventory_path', None) is None:
+        bench.inventory_path = os.path.join(tempfile.mkdtemp(),
+                                            'inventory.db')
+    return inventory.Inventory(bench.client(), bench.inventory_path)
+
+
+@scenario('inventory-full-sync')
+def bench_inventory_full(bench):
+    with _inventory(bench) as inv:
+        stats = inv.sync(full=True)
+    size = os.path.getsize(bench.inventory_path)
+    return '%d volumes, %.1fMB on disk' % (stats['added'],
+                                           size / 1024.0 / 1024.0)
+
+
+@scenario('inventory-incremental-sync')
+def bench_inventory_incremental(bench):
+    with _inventory(bench) as inv:
+        stats = inv.sync()
+    return '%(added)d added, %(updated)d updated, %(removed)d removed' % stats
+
+
+@scenario('inventory-find')
+def bench_inventory_find(bench):
+    name = 'volume-%d' % (bench.size // 2)
+    with _inventory(bench) as inv:
+        start = time.time()
+        found = [vol['volumeID'] for vol in inv.volumes(name=name)]
+        local = time.time() - start
+    start = time.time()
+    remote = [vol['volumeID'] for vol in paging.iter_volumes(bench.client())
+              if vol['name'] == name]
+    assert found == remote
+    return 'by name: %.1fms local, %.3fs listing the cluster' % (
+        local * 1000, time.time() - start)
+
+
+@scenario('stats-round')
+def bench_stats_round(bench, single=100):
+    client = bench.client()
+    sampler = stats.VolumeStatsSampler(client, range(1, bench.size + 1))
+    start = time.time()
+    sampler.sample()
+    chunked = time.time() - start
+    start = time.time()
+    for volume_id in range(1, min(single, bench.size) + 1):
+        client.get_volume_stats(volume_id)
+    per_volume = (time.time() - start) / min(single, bench.size)
+    return 'chunked %.3fs, one call per volume ~%.1fs' % (
+        chunked, per_volume * bench.size)
+
+
+@scenario('account-lookups', per_size=False)
+def bench_account_lookups(bench, count=500):
+    client = bench.client()
+    names = ['account-%d' % (i % 10) for i in range(count)]
+    start = time.time()
+    for name in names:
+        client.get_account_by_name(name)
+    remote = time.time() - start
+    directory = accounts.AccountDirectory(client)
+    start = time.time()
+    for name in names:
+        directory.by_name(name)
+    cached = time.time() - start
+    directory.close()
+    return '%d by name: %.3fs with GetAccountByName, %.3fs cached' % (
+        count, remote, cached)
+
+
+@scenario('database-reads', per_size=False)
+def bench_database_reads(bench, groups=10, keys=20, count=1000):
+    client = bench.client()
+    # NOTE: Scenarios run twice (timed, then traced); create the tree once.
+    if not client.list_database_children('/bench')['children']:
+        client.create_database_entry('/bench', {})
+        for group in range(groups):
+            client.create_database_entry('/bench/g%d' % group, {})
+            for key in range(keys):
+                client.create_database_entry(
+                    '/bench/g%d/k%d' % (group, key), {'value': key})
+    paths = ['/bench/g%d/k%d' % (i % groups, i % keys)
+             for i in range(count)]
+    start = time.time()
+    for path in paths:
+        client.get_database_entry(path)
+    remote = time.time() - start
+    cache = database.DatabaseCache(client)
+    start = time.time()
+    cache.prefetch('/bench', depth=2)
+    for path in paths:
+        cache.get(path)
+    cached = time.time() - start
+    cache.close()
+    return '%d reads: %.3fs with GetDatabaseEntry, %.3fs cached' % (
+        count, remote, cached)
+
+
+@scenario('access-group-resync', per_size=False)
+def bench_access_group_resync(bench, volumes=2000, changed=10, single=100):
+    # The desired membership is shifted up by changed volume IDs.
+    changed = min(changed, bench.size // 2)
+    volumes = min(volumes, bench.size - changed)
+    single = min(single, volumes)
+    client = bench.client()
+    groups = client.list_volume_access_groups()['volumeAccessGroups']
+    group_ids = [g['volumeAccessGroupID'] for g in groups
+                 if g['name'] == 'bench-vag']
+    if group_ids:
+        client.modify_volume_access_group(
+            group_ids[0], volumes=list(range(1, volumes + 1)))
+    else:
+        client.create_volume_access_group(
+            'bench-vag', volumes=list(range(1, volumes + 1)))
+    desired = {'bench-vag': {
+        'volumes': list(range(changed + 1, volumes + changed + 1))}}
+    calls = bench.call_count()
+    start = time.time()
+    plan, errors = access_groups.reconcile(client, desired)
+    reconciled = time.time() - start
+    calls = bench.call_count() - calls
+    group_id = plan.group_ids['bench-vag']
+    start = time.time()
+    for volume_id in range(1, single + 1):
+        client.add_volumes_to_volume_access_group(group_id, [volume_id])
+    per_volume = (time.time() - start) / single
+    return 'resync %d volumes: %d calls %.3fs, one call per volume ~%.1fs' % (
+        volumes, calls, reconciled, per_volume * volumes)
+
+
+@scenario('snapshot-prune', per_size=False)
+def bench_snapshot_prune(bench, volumes=500, per_volume=4, single=50):
+    volumes = min(volumes, bench.size)
+    single = min(single, volumes)
+    client = bench.client()
+    for index, result, error in client.map(
+            'CreateSnapshot',
+            [{'volumeID': volume_id} for volume_id in range(1, volumes + 1)
+             for i in range(per_volume)]):
+        if error is not None:
+            raise error
+    # Per volume listing and serial deletes, timed on a sample.
+    start = time.time()
+    for volume_id in range(1, single + 1):
+        client.delete_snapshot(
+            client.list_snapshots(volume_id)[0]['snapshotID'])
+    one_by_one = (time.time() - start) / single
+    start = time.time()
+    index = snapshots.SnapshotIndex.load(client)
+    delete, skipped = snapshots.retention_plan(
+        index, [snapshots.RetentionPolicy(keep_last=1)])
+    deleted, errors = snapshots.prune(client, delete, index=index)
+    pruned = time.time() - start
+    return ('%d of %d snapshots pruned in %.2fs, per volume and serial '
+            '~%.1fs' % (len(deleted), len(delete) + len(index),
+                        pruned, one_by_one * len(delete)))
+
+
+@scenario('snapshot-schedule', per_size=False)
+def bench_snapshot_schedule(bench, volumes=2000, interval=10, single=50):
+    volumes = min(volumes, bench.size)
+    single = min(single, volumes)
+    client = bench.client()
+    # A cron job snapshotting every volume serially at the top of the
+    # interval, timed on a sample.
+    start = time.time()
+    for volume_id in range(1, single + 1):
+        client.create_snapshot(volume_id)
+    serial = (time.time() - start) / single * volumes
+    per_second = {}
+
+    def on_result(schedule, due, result, error):
+        second = int(time.time())
+        per_second[second] = per_second.get(second, 0) + 1
+
+    sched = scheduler.SnapshotScheduler(
+        client, [scheduler.SnapshotSchedule(volume_id, interval)
+                 for volume_id in range(1, volumes + 1)],
+        rate=volumes, on_result=on_result)
+    sched.run(interval)
+    stats = sched.stats()
+    return ('%d volumes every %ds: %.0f/s, peak %d/s, late p99 %.3fs; '
+            'serial cron ~%.1fs' % (volumes, interval, stats['throughput'],
+                                   max(per_second.values() or [0]),
+                                   stats['late_p99'], serial))
+
+
+class _FirstWrite(object):
+    """Discards output, remembering when the first of it was written."""
+
+    def __init__(self):
+        self.first = None
+        self.size = 0
+
+    def write(self, text):
+        if self.first is None:
+            self.first = time.time()
+        self.size += len(text)
+
+
+def _render_scenario(format):
+    def bench_render(bench):
+        out = _FirstWrite()
+        start = time.time()
+        volumes = paging.iter_volumes(bench.client(), fields=LIST_FIELDS)
+        cli_utils.print_list(volumes, LIST_FIELDS, format=format, out=out)
+        return 'first output after %.3fs, %d bytes' % (out.first - start,
+                                                     out.size)
+    return bench_render
+
+
+for _format in cli_formatter.FORMATS:
+    scenario('render-%s' % _format)(_render_scenario(_format))
+del _format
+
+
+def _time_codec(encode, decode, body, repeat=3):
+    """Best of `repeat` decode and re-encode times of a response body."""
+    decodes, encodes = [], []
+    for i in range(repeat):
+        start = time.time()
+        doc = decode(body)
+        mid = time.time()
+        encode(doc)
+        decodes.append(mid - start)
+        encodes.append(time.time() - mid)
+    return min(decodes), min(encodes)
+
+
+def _codec_scenario(method):
+    def bench_codec(bench):
+        url = '%s/json-rpc/8.0/' % bench.endpoint_dict['url']
+        auth = (bench.endpoint_dict['login'], bench.endpoint_dict['password'])
+        body = requests.post(url, data=codec.encode({'method': method,
+                                                      'params': {}}),
+                             auth=auth, verify=False).content
+        notes = []
+        for name in sorted(set([codec.BACKEND, 'json'])):
+            funcs = codec._load_backend(name)
+            dec, enc = _time_codec(funcs[0], funcs[1], body)
+            notes.append('%s dec %.2fms enc %.2fms' % (name, dec * 1000,
+                                                       enc * 1000))
+        notes.append('%.2fMB' % (len(body) / 1024.0 / 1024.0))
+        return ', '.join(notes)
+    return bench_codec
+
+
+for _method in ('GetClusterInfo', 'ListAccounts', 'ListVolumeAccessGroups',
+                'ListVolumes'):
+    scenario('codec-%s' % _method)(_codec_scenario(_method))
+del _method
+
+
+@scenario('cli-create-count')
+def bench_cli_create(bench, count=200):
+    start = time.time()
+    output = bench.sfcli('volumes', 'create', '1073741824',
+                         '--account-id', '1', '--name', 'bench',
+                         '--count', str(count))
+    elapsed = time.time() - start
+    vols = bench.client().list_volumes(start_volume_id=bench.size + 1)
+    bench.created = [vol['volumeID'] for vol in vols]
+    return '%d created, %.1f creates/s' % (len(bench.created),
+                                           len(bench.created) / elapsed)
+
+
+@scenario('cli-clone-count')
+def bench_cli_clone(bench, count=20):
+    start = time.time()
+    bench.sfcli('volumes', 'clone', '1', '--name', 'bench-clone',
+                '--count', str(count))
+    return '%d clones, %.1f clones/s' % (count,
+                                         count / (time.time() - start))
+
+
+@scenario('cli-delete')
+def bench_cli_delete(bench):
+    bench.sfcli('volumes', 'delete', *[str(v) for v in bench.created])
+    return '%d volumes' % len(bench.created)
+
+
+@scenario('cli-purge')
+def bench_cli_purge(bench):
+    bench.sfcli('volumes', 'purge', *[str(v) for v in bench.created])
+    return '%d volumes' % len(bench.created)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', default='1000,10000',
+                        help='Comma separated volume counts.')
+    parser.add_argument('--only', default=None,
+                        help='Comma separated scenario names to run.')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Server side latency per call in seconds.')
+    parser.add_argument('--certfile', help='Serve HTTPS with this cert.')
+    parser.add_argument('--keyfile', help='Key for --certfile.')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='Skip the second, tracemalloc instrumented run.')
+    args = parser.parse_args(argv)
+
+    only = args.only.split(',') if args.only else None
+    server_args = {'latency': args.latency, 'certfile': args.certfile,
+                   'keyfile': args.keyfile}
+    table = prettytable.PrettyTable(['scenario', 'volumes', 'wall_s',
+                                     'calls', 'calls/s', 'max_rss_mb',
+                                     'heap_mb', 'notes'])
+    table.align = 'r'
+    table.align['notes'] = 'l'
+    sizes = [int(size) for size in args.sizes.split(',')]
+    for index, size in enumerate(sizes):
+        bench = Bench(size, **server_args)
+        try:
+            for name, per_size, func in SCENARIOS:
+                if only and name not in only:
+                    continue
+                if not per_size and index:
+                    continue
+                wall, calls, peak, notes = _run(func, bench, False)
+                rss = _max_rss()
+                if not args.no_memory and name not in ('cli-create-count',
+                                                       'cli-delete',
+                                                       'cli-purge'):
+                    peak = _run(func, bench, True)[2]
+                table.add_row([name, size if per_size else '-',
+                               '%.3f' % wall, calls,
+                               '%.1f' % (calls / wall if wall else 0),
+                               '-' if rss is None else
+                               '%.1f' % (rss / 1024.0 / 1024.0),
+                               '-' if peak is None else
+                               '%.1f' % (peak / 1024.0 / 1024.0),
+                               notes or ''])
+                print('%s (%s volumes): %.3fs' % (name, size, wall),
+                      file=sys.stderr)
+        finally:
+            bench.stop()
+    print(table)
+
+
+if __name__ == '__main__':
+    main()
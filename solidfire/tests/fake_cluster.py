@@ -0,0 +1,748 @@
+"""A local stand-in for a SolidFire cluster's JSON-RPC endpoint.
+
+FakeCluster keeps an in-memory inventory of volumes, accounts, snapshots,
+access groups and database entries and answers the API methods wrapped by
+solidfire_element_api over HTTP (or HTTPS when given a certificate).
+Response latency and random busy faults can be injected, which makes it
+usable for offline benchmarking as well as manual testing:
+
+    >>> cluster = FakeCluster(volume_count=10000, latency=0.002)
+    >>> cluster.start()
+    >>> client = SolidFireAPI(endpoint_dict=cluster.endpoint_dict,
+    ...                       api_version='8.0')
+    >>> cluster.stop()
+
+It can also be run on its own with `python -m solidfire.tests.fake_cluster`.
+"""
+
+import base64
+import bisect
+import json
+import random
+import threading
+import time
+
+from six.moves import BaseHTTPServer
+from six.moves import socketserver
+
+# API version each method first appeared in, for those newer than 1.0.
+METHOD_VERSIONS = {
+    'ListVolumes': 8.0,
+    'ListVolumeStats': 8.0,
+}
+
+QOS_CURVE = {'4096': 100, '8192': 160, '16384': 270, '32768': 500,
+             '65536': 1000, '131072': 1950, '262144': 3900,
+             '524288': 7600, '1048576': 15000}
+
+LIMITS = {
+    'accountCountMax': 5000,
+    'accountNameLengthMax': 64,
+    'accountNameLengthMin': 1,
+    'bulkVolumeJobsPerNodeMax': 8,
+    'bulkVolumeJobsPerVolumeMax': 2,
+    'cloneJobsPerVolumeMax': 2,
+    'clusterPairsCountMax': 4,
+    'initiatorsPerVolumeAccessGroupCountMax': 64,
+    'snapshotsPerVolumeMax': 32,
+    'volumeAccessGroupCountMax': 1000,
+    'volumeCountMax': 2000000,
+    'volumesPerAccountCountMax': 2000,
+    'volumesPerVolumeAccessGroupCountMax': 2000,
+}
+
+
+class FakeClusterError(Exception):
+    """Raised by method handlers to return an API error response."""
+
+    def __init__(self, name, message, code=500):
+        super(FakeClusterError, self).__init__(message)
+        self.name = name
+        self.message = message
+        self.code = code
+
+
+def _timestamp(when=None):
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(when))
+
+
+def _page(records, ids, start_id, limit):
+    """Returns up to limit records with ID >= start_id from sorted ids."""
+    index = bisect.bisect_left(ids, start_id or 0)
+    end = len(ids) if limit is None else index + int(limit)
+    return [records[rid] for rid in ids[index:end]]
+
+
+class FakeCluster(object):
+    """In-memory SolidFire cluster served over JSON-RPC."""
+
+    def __init__(self, volume_count=0, account_count=10, latency=0.0,
+                 error_rate=0.0, async_delay=0.5, api_version='8.0',
+                 login='admin', password='admin', host='127.0.0.1', port=0,
+                 certfile=None, keyfile=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.async_delay = async_delay
+        self.api_version = api_version
+        self.login = login
+        self.password = password
+        self.host = host
+        self.port = port
+        self.certfile = certfile
+        self.keyfile = keyfile
+        self.calls = {}
+        self.server = None
+        self._lock = threading.RLock()
+        self._next_id = {}
+
+        self.volumes = {}
+        self.volume_ids = []
+        self.accounts = {}
+        self.account_ids = []
+        self.snapshots = {}
+        self.snapshot_ids = []
+        self.access_groups = {}
+        self.access_group_ids = []
+        self.async_handles = {}
+        self.database = {}
+
+        for i in range(account_count):
+            self._add_account('account-%d' % i)
+        for i in range(volume_count):
+            self._add_volume('volume-%d' % i,
+                             self.account_ids[i % len(self.account_ids)]
+                             if self.account_ids else 0,
+                             1024 ** 3)
+
+    # Inventory helpers
+
+    def _new_id(self, kind):
+        self._next_id[kind] = self._next_id.get(kind, 0) + 1
+        return self._next_id[kind]
+
+    def _add_account(self, username, attributes=None):
+        account_id = self._new_id('account')
+        self.accounts[account_id] = {
+            'accountID': account_id,
+            'username': username,
+            'status': 'active',
+            'initiatorSecret': 'initiator-%d' % account_id,
+            'targetSecret': 'target-%d' % account_id,
+            'volumes': [],
+            'attributes': attributes or {},
+        }
+        self.account_ids.append(account_id)
+        return account_id
+
+    def _add_volume(self, name, account_id, total_size, enable512e=True,
+                    qos=None, attributes=None, access='readWrite'):
+        volume_id = self._new_id('volume')
+        volume_qos = {'minIOPS': 100, 'maxIOPS': 15000, 'burstIOPS': 15000,
+                      'burstTime': 60, 'curve': dict(QOS_CURVE)}
+        volume_qos.update(qos or {})
+        self.volumes[volume_id] = {
+            'volumeID': volume_id,
+            'name': name,
+            'accountID': account_id,
+            'access': access,
+            'attributes': attributes or {},
+            'createTime': _timestamp(),
+            'deleteTime': '',
+            'purgeTime': '',
+            'enable512e': enable512e,
+            'iqn': 'iqn.2010-01.com.solidfire:fake.%s.%d' % (name, volume_id),
+            'qos': volume_qos,
+            'scsiEUIDeviceID': '%032x' % volume_id,
+            'scsiNAADeviceID': '%032x' % (volume_id << 64),
+            'sliceCount': 1,
+            'status': 'active',
+            'totalSize': int(total_size),
+            'volumeAccessGroups': [],
+            'volumePairs': [],
+        }
+        self.volume_ids.append(volume_id)
+        if account_id in self.accounts:
+            self.accounts[account_id]['volumes'].append(volume_id)
+        return volume_id
+
+    def _volume(self, volume_id, status=None):
+        vol = self.volumes.get(int(volume_id))
+        if vol is None or (status is not None and vol['status'] != status):
+            raise FakeClusterError('xVolumeIDDoesNotExist',
+                                   'VolumeID %s does not exist.' % volume_id)
+        return vol
+
+    def _account(self, account_id):
+        account = self.accounts.get(int(account_id))
+        if account is None:
+            raise FakeClusterError('xUnknownAccount',
+                                   'Unknown account %s' % account_id)
+        return account
+
+    def _access_group(self, group_id):
+        group = self.access_groups.get(int(group_id))
+        if group is None:
+            raise FakeClusterError(
+                'xVolumeAccessGroupIDDoesNotExist',
+                'VolumeAccessGroupID %s does not exist.' % group_id)
+        return group
+
+    def _new_async_handle(self, result_type, result, source_id=None):
+        handle = self._new_id('async')
+        self.async_handles[handle] = {
+            'resultType': result_type,
+            'result': result,
+            'sourceID': source_id,
+            'createTime': time.time(),
+        }
+        return handle
+
+    def _running_clones(self, volume_id):
+        now = time.time()
+        return len([h for h in self.async_handles.values()
+                    if h['sourceID'] == volume_id and
+                    now - h['createTime'] < self.async_delay])
+
+    # Volumes
+
+    def rpc_CreateVolume(self, params):
+        self._account(params['accountID'])
+        volume_id = self._add_volume(params['name'], params['accountID'],
+                                     params['totalSize'],
+                                     params.get('enable512e', True),
+                                     params.get('qos'),
+                                     params.get('attributes'))
+        return {'volumeID': volume_id,
+                'volume': self.volumes[volume_id]}
+
+    def rpc_CloneVolume(self, params):
+        src = self._volume(params['volumeID'], 'active')
+        if params.get('newAccountID') is not None:
+            self._account(params['newAccountID'])
+        if (self._running_clones(src['volumeID']) >=
+                LIMITS['cloneJobsPerVolumeMax']):
+            raise FakeClusterError('xMaxClonesPerVolumeExceeded',
+                                   'Too many clones already in progress.')
+        volume_id = self._add_volume(
+            params['name'],
+            params.get('newAccountID') or src['accountID'],
+            params.get('newSize') or src['totalSize'],
+            src['enable512e'], src['qos'],
+            params.get('attributes', src['attributes']),
+            params.get('access', src['access']))
+        clone_id = self._new_id('clone')
+        handle = self._new_async_handle('Clone', {'cloneID': clone_id,
+                                                  'volumeID': volume_id},
+                                        src['volumeID'])
+        return {'volumeID': volume_id, 'cloneID': clone_id,
+                'asyncHandle': handle}
+
+    def rpc_CopyVolume(self, params):
+        src = self._volume(params['volumeID'], 'active')
+        self._volume(params['dstVolumeID'], 'active')
+        clone_id = self._new_id('clone')
+        handle = self._new_async_handle('Clone', {'cloneID': clone_id},
+                                        src['volumeID'])
+        return {'cloneID': clone_id, 'asyncHandle': handle}
+
+    def rpc_CancelClone(self, params):
+        return {}
+
+    def rpc_DeleteVolume(self, params):
+        vol = self._volume(params['volumeID'], 'active')
+        vol['status'] = 'deleted'
+        vol['deleteTime'] = _timestamp()
+        vol['purgeTime'] = _timestamp(time.time() + 8 * 3600)
+        return {}
+
+    def rpc_PurgeDeletedVolume(self, params):
+        vol = self._volume(params['volumeID'], 'deleted')
+        del self.volumes[vol['volumeID']]
+        self.volume_ids.remove(vol['volumeID'])
+        account = self.accounts.get(vol['accountID'])
+        if account is not None:
+            account['volumes'].remove(vol['volumeID'])
+        return {}
+
+    def rpc_ModifyVolume(self, params):
+        vol = self._volume(params['volumeID'], 'active')
+        if 'accountID' in params and params['accountID'] != vol['accountID']:
+            new_account = self._account(params['accountID'])
+            old_account = self.accounts.get(vol['accountID'])
+            if old_account is not None:
+                old_account['volumes'].remove(vol['volumeID'])
+            new_account['volumes'].append(vol['volumeID'])
+        for key in ('accountID', 'access', 'totalSize', 'attributes'):
+            if key in params:
+                vol[key] = params[key]
+        if 'qos' in params:
+            vol['qos'].update(params['qos'])
+        return {}
+
+    def rpc_GetVolumeStats(self, params):
+        vol = self._volume(params['volumeID'])
+        return {'volumeStats': self._volume_stats(vol['volumeID'])}
+
+    def _volume_stats(self, volume_id):
+        # Counters grow steadily with time so consecutive samples differ.
+        elapsed = int((time.time() % 86400) * 1000)
+        ops = elapsed * (volume_id % 7 + 1)
+        return {'volumeID': volume_id,
+                'accountID': self.volumes[volume_id]['accountID'],
+                'timestamp': _timestamp(),
+                'readOps': ops,
+                'writeOps': ops // 2,
+                'readBytes': ops * 4096,
+                'writeBytes': ops * 2048,
+                'latencyUSec': 500 + volume_id % 300,
+                'readLatencyUSecTotal': ops * (400 + volume_id % 300),
+                'writeLatencyUSecTotal': ops // 2 * (600 + volume_id % 300),
+                'actualIOPS': volume_id % 1000,
+                'volumeSize': self.volumes[volume_id]['totalSize']}
+
+    def rpc_ListVolumeStats(self, params):
+        return {'volumeStats': [self._volume_stats(self._volume(vid)
+                                                   ['volumeID'])
+                                for vid in params['volumeIDs']]}
+
+    def rpc_ListVolumeStatsByVolume(self, params):
+        return {'volumeStats': [self._volume_stats(vid)
+                                for vid in self.volume_ids
+                                if self.volumes[vid]['status'] == 'active']}
+
+    def _list_volumes(self, params, status=None):
+        status = params.get('volumeStatus', status)
+        accounts = params.get('accounts')
+        limit = params.get('limit')
+        vols = []
+        ids = self.volume_ids
+        index = bisect.bisect_left(ids, params.get('startVolumeID') or 0)
+        while index < len(ids) and (limit is None or len(vols) < limit):
+            vol = self.volumes[ids[index]]
+            index += 1
+            if status is not None and vol['status'] != status:
+                continue
+            if accounts and vol['accountID'] not in accounts:
+                continue
+            vols.append(vol)
+        return {'volumes': vols}
+
+    def rpc_ListVolumes(self, params):
+        return self._list_volumes(params)
+
+    def rpc_ListActiveVolumes(self, params):
+        return self._list_volumes(params, 'active')
+
+    def rpc_ListDeletedVolumes(self, params):
+        return self._list_volumes({}, 'deleted')
+
+    def rpc_ListVolumesForAccount(self, params):
+        self._account(params['accountID'])
+        params = dict(params, accounts=[params['accountID']])
+        return self._list_volumes(params)
+
+    # Accounts
+
+    def rpc_AddAccount(self, params):
+        if [a for a in self.accounts.values()
+                if a['username'] == params['username']]:
+            raise FakeClusterError('xDuplicateUsername',
+                                   'Username already exists.')
+        account_id = self._add_account(params['username'],
+                                       params.get('attributes'))
+        for key in ('initiatorSecret', 'targetSecret'):
+            if key in params:
+                self.accounts[account_id][key] = params[key]
+        return {'accountID': account_id,
+                'account': self.accounts[account_id]}
+
+    def rpc_GetAccountByID(self, params):
+        return {'account': self._account(params['accountID'])}
+
+    def rpc_GetAccountByName(self, params):
+        for account in self.accounts.values():
+            if account['username'] == params['username']:
+                return {'account': account}
+        raise FakeClusterError('xUnknownAccount',
+                               'Unknown account %s' % params['username'])
+
+    def rpc_GetAccountEfficiency(self, params):
+        return {'compression': 1.5, 'deduplication': 2.0,
+                'thinProvisioning': 3.0, 'missingVolumes': []}
+
+    def rpc_ListAccounts(self, params):
+        return {'accounts': _page(self.accounts, self.account_ids,
+                                  params.get('startAccountID'),
+                                  params.get('limit'))}
+
+    def rpc_ModifyAccount(self, params):
+        account = self._account(params['accountID'])
+        for key in ('status', 'initiatorSecret', 'targetSecret',
+                    'attributes'):
+            if key in params:
+                account[key] = params[key]
+        return {}
+
+    def rpc_RemoveAccount(self, params):
+        account = self._account(params['accountID'])
+        if account['volumes']:
+            raise FakeClusterError('xAccountHasVolumes',
+                                   'Account still has volumes.')
+        del self.accounts[account['accountID']]
+        self.account_ids.remove(account['accountID'])
+        return {}
+
+    # Cluster
+
+    def rpc_GetClusterCapacity(self, params):
+        used = sum(vol['totalSize'] for vol in self.volumes.values())
+        return {'clusterCapacity': {'activeBlockSpace': used // 4,
+                                    'provisionedSpace': used,
+                                    'maxProvisionedSpace': 1024 ** 5,
+                                    'activeSessions': 0,
+                                    'timestamp': _timestamp()}}
+
+    def rpc_GetClusterInfo(self, params):
+        return {'clusterInfo': {'name': 'fake-cluster',
+                                'mvip': self.host,
+                                'svip': self.host,
+                                'uniqueID': 'fake',
+                                'attributes': {}}}
+
+    def rpc_GetClusterVersionInfo(self, params):
+        return {'clusterAPIVersion': self.api_version,
+                'clusterVersion': '%s.0.0' % self.api_version,
+                'clusterVersionInfo': [],
+                'softwareVersionInfo': {}}
+
+    def rpc_GetLimits(self, params):
+        return dict(LIMITS)
+
+    def rpc_ListServices(self, params):
+        return {'services': []}
+
+    def rpc_ListActiveNodes(self, params):
+        return {'nodes': []}
+
+    def rpc_ListAllNodes(self, params):
+        return {'nodes': [], 'pendingNodes': []}
+
+    def rpc_ListPendingNodes(self, params):
+        return {'pendingNodes': []}
+
+    def rpc_GetAsyncResult(self, params):
+        handle = self.async_handles.get(params['asyncHandle'])
+        if handle is None:
+            raise FakeClusterError('xInvalidAsyncResultHandle',
+                                   'Unknown async handle %s' %
+                                   params['asyncHandle'])
+        status = {'resultType': handle['resultType'],
+                  'createTime': _timestamp(handle['createTime']),
+                  'lastUpdateTime': _timestamp()}
+        if time.time() - handle['createTime'] < self.async_delay:
+            status['status'] = 'running'
+            return status
+        # A final result is only handed out once.
+        del self.async_handles[params['asyncHandle']]
+        status['status'] = 'complete'
+        status['result'] = handle['result']
+        return status
+
+    # Snapshots
+
+    def rpc_CreateSnapshot(self, params):
+        vol = self._volume(params['volumeID'], 'active')
+        snapshot_id = self._new_id('snapshot')
+        self.snapshots[snapshot_id] = {
+            'snapshotID': snapshot_id,
+            'volumeID': vol['volumeID'],
+            'name': params.get('name') or _timestamp(),
+            'attributes': params.get('attributes', {}),
+            'checksum': '0x0',
+            'createTime': _timestamp(),
+            'status': 'done',
+            'totalSize': vol['totalSize'],
+        }
+        self.snapshot_ids.append(snapshot_id)
+        return {'snapshotID': snapshot_id, 'checksum': '0x0'}
+
+    def rpc_DeleteSnapshot(self, params):
+        if params['snapshotID'] not in self.snapshots:
+            raise FakeClusterError('xSnapshotIDDoesNotExist',
+                                   'SnapshotID %s does not exist.' %
+                                   params['snapshotID'])
+        del self.snapshots[params['snapshotID']]
+        self.snapshot_ids.remove(params['snapshotID'])
+        return {}
+
+    def rpc_ListSnapshots(self, params):
+        snapshots = [self.snapshots[sid] for sid in self.snapshot_ids]
+        if params.get('volumeID') is not None:
+            snapshots = [snap for snap in snapshots
+                         if snap['volumeID'] == params['volumeID']]
+        return {'snapshots': snapshots}
+
+    # Volume access groups
+
+    def rpc_CreateVolumeAccessGroup(self, params):
+        group_id = self._new_id('access_group')
+        self.access_groups[group_id] = {
+            'volumeAccessGroupID': group_id,
+            'name': params['name'],
+            'initiators': list(params.get('initiators', [])),
+            'volumes': list(params.get('volumes', [])),
+            'deletedVolumes': [],
+            'attributes': params.get('attributes', {}),
+        }
+        self.access_group_ids.append(group_id)
+        return {'volumeAccessGroupID': group_id}
+
+    def rpc_ListVolumeAccessGroups(self, params):
+        return {'volumeAccessGroups': _page(
+            self.access_groups, self.access_group_ids,
+            params.get('startVolumeAccessGroupID'), params.get('limit'))}
+
+    def rpc_DeleteVolumeAccessGroup(self, params):
+        group = self._access_group(params['volumeAccessGroupID'])
+        del self.access_groups[group['volumeAccessGroupID']]
+        self.access_group_ids.remove(group['volumeAccessGroupID'])
+        return {}
+
+    def rpc_ModifyVolumeAccessGroup(self, params):
+        group = self._access_group(params['volumeAccessGroupID'])
+        for key in ('name', 'initiators', 'volumes', 'attributes'):
+            if key in params:
+                group[key] = params[key]
+        return {}
+
+    def _add_members(self, params, key):
+        group = self._access_group(params['volumeAccessGroupID'])
+        for member in params[key]:
+            if member not in group[key]:
+                group[key].append(member)
+        return {}
+
+    def _remove_members(self, params, key):
+        group = self._access_group(params['volumeAccessGroupID'])
+        group[key] = [m for m in group[key] if m not in params[key]]
+        return {}
+
+    def rpc_AddInitiatorsToVolumeAccessGroup(self, params):
+        return self._add_members(params, 'initiators')
+
+    def rpc_RemoveInitiatorsFromVolumeAccessGroup(self, params):
+        return self._remove_members(params, 'initiators')
+
+    def rpc_AddVolumesToVolumeAccessGroup(self, params):
+        return self._add_members(params, 'volumes')
+
+    def rpc_RemoveVolumesFromVolumeAccessGroup(self, params):
+        return self._remove_members(params, 'volumes')
+
+    # Database entries
+
+    def _entry(self, path):
+        entry = self.database.get(path)
+        if entry is None:
+            raise FakeClusterError('xDBNoSuchPath',
+                                   'No such path %s' % path)
+        return entry
+
+    def _check_version(self, entry, params):
+        if params['dataVersion'] != entry['dataVersion']:
+            raise FakeClusterError('xDBVersionMismatch',
+                                   'dataVersion %s does not match %s' %
+                                   (params['dataVersion'],
+                                    entry['dataVersion']))
+
+    def _children(self, path):
+        prefix = path.rstrip('/') + '/'
+        return sorted(p for p in self.database
+                      if p.startswith(prefix) and
+                      '/' not in p[len(prefix):])
+
+    def rpc_CreateDatabaseEntry(self, params):
+        if params['path'] in self.database:
+            raise FakeClusterError('xDBPathExists',
+                                   'Path %s exists' % params['path'])
+        self.database[params['path']] = {'path': params['path'],
+                                         'data': params.get('data'),
+                                         'dataVersion': 1}
+        return {'dataVersion': 1}
+
+    def rpc_DeleteDatabaseEntry(self, params):
+        self._check_version(self._entry(params['path']), params)
+        del self.database[params['path']]
+        return {}
+
+    def rpc_GetDatabaseEntry(self, params):
+        return dict(self._entry(params['path']))
+
+    def rpc_SetDatabaseEntry(self, params):
+        entry = self._entry(params['path'])
+        self._check_version(entry, params)
+        entry['data'] = params['data']
+        entry['dataVersion'] += 1
+        return {'dataVersion': entry['dataVersion']}
+
+    def rpc_ListDatabaseChildren(self, params):
+        return {'children': [p.rsplit('/', 1)[-1]
+                             for p in self._children(params['path'])]}
+
+    def rpc_ListDatabaseChildrenData(self, params):
+        return {'children': dict(
+            (p.rsplit('/', 1)[-1], dict(self.database[p]))
+            for p in self._children(params['path']))}
+
+    # Not part of the Element API; lets benchmarks count server-side calls.
+
+    def rpc_FakeClusterCallCounts(self, params):
+        return {'calls': dict(self.calls)}
+
+    # JSON-RPC plumbing
+
+    def handle(self, method, params, version=None):
+        """Runs one API method and returns the response dict.
+
+        version is the API version from the request URL, if any; like a
+        real cluster, methods newer than it are unknown.  The result may
+        reference live cluster state; respond() serializes it while still
+        holding the lock."""
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            if version is not None:
+                try:
+                    version = float(version)
+                except ValueError:
+                    version = None
+                if version is None or version > float(self.api_version):
+                    return {'error': {'name': 'xUnknownAPIVersion',
+                                      'code': 500,
+                                      'message': 'Unknown API version'}}
+            handler = getattr(self, 'rpc_%s' % method, None)
+            if handler is None or (version is not None and
+                                   METHOD_VERSIONS.get(method, 0) > version):
+                return {'error': {'name': 'xUnknownAPIMethod', 'code': 500,
+                                  'message': 'Unknown method %s' % method}}
+            if self.error_rate and random.random() < self.error_rate:
+                return {'error': {'name': 'xExceededLimit', 'code': 500,
+                                  'message': 'Cluster is busy.'}}
+            try:
+                return {'result': handler(params or {})}
+            except FakeClusterError as ex:
+                return {'error': {'name': ex.name, 'code': ex.code,
+                                  'message': ex.message}}
+            except (KeyError, TypeError, ValueError) as ex:
+                return {'error': {'name': 'xInvalidParameter', 'code': 500,
+                                  'message': 'Invalid parameter %s' % ex}}
+
+    def respond(self, request, version=None):
+        """Handles a decoded JSON-RPC request and returns the encoded body."""
+        with self._lock:
+            response = self.handle(request.get('method'),
+                                   request.get('params'), version)
+            response['id'] = request.get('id')
+            return json.dumps(response).encode('utf-8')
+
+    @property
+    def url(self):
+        scheme = 'https' if self.certfile else 'http'
+        return '%s://%s:%s' % (scheme, self.host, self.port)
+
+    @property
+    def endpoint_dict(self):
+        return {'mvip': self.host, 'login': self.login,
+                'password': self.password, 'port': self.port,
+                'url': self.url}
+
+    def start(self):
+        """Starts serving on a background thread; returns self."""
+        self.server = _Server((self.host, self.port), _Handler)
+        self.server.cluster = self
+        if self.certfile:
+            import ssl
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(self.certfile, self.keyfile)
+            self.server.socket = context.wrap_socket(self.server.socket,
+                                                     server_side=True)
+        self.port = self.server.server_address[1]
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class _Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _authorized(self, cluster):
+        expected = base64.b64encode(
+            ('%s:%s' % (cluster.login, cluster.password)).encode('utf-8'))
+        return (self.headers.get('Authorization', '') ==
+                'Basic %s' % expected.decode('ascii'))
+
+    def do_POST(self):
+        cluster = self.server.cluster
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if not self._authorized(cluster):
+            self._send(401, b'')
+            return
+        request = json.loads(body.decode('utf-8'))
+        if cluster.latency:
+            time.sleep(cluster.latency)
+        # /json-rpc/<version>/
+        parts = [part for part in self.path.split('/') if part]
+        version = parts[1] if len(parts) > 1 else None
+        self._send(200, cluster.respond(request, version))
+
+    def _send(self, status, data):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--port', type=int, default=8443)
+    parser.add_argument('--volumes', type=int, default=1000)
+    parser.add_argument('--accounts', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--api-version', default='8.0')
+    parser.add_argument('--certfile')
+    parser.add_argument('--keyfile')
+    args = parser.parse_args()
+    cluster = FakeCluster(volume_count=args.volumes,
+                          account_count=args.accounts,
+                          latency=args.latency, error_rate=args.error_rate,
+                          api_version=args.api_version, port=args.port,
+                          certfile=args.certfile, keyfile=args.keyfile)
+    cluster.start()
+    print('Serving fake cluster at %s (login admin/admin)' % cluster.url)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        cluster.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Checks AsyncResultWaiter polling and CloneOrchestrator without waiting."""
+
+import socket
+import time
+import unittest
+
+from solidfire.managers import async_results
+from solidfire.managers import clones
+from solidfire.solidfire_element_api import SolidFireAPI
+from solidfire.solidfire_element_api import SolidFireRequestException
+from solidfire.tests.fake_cluster import FakeCluster
+
+RUNNING = {'status': 'running'}
+COMPLETE = {'status': 'complete', 'result': {}}
+
+
+def _fault(name):
+    return SolidFireRequestException(
+        ('API response: %s', {'error': {'name': name, 'code': 500,
+                                        'message': name}}))
+
+
+class _Client(object):
+    """Answers GetAsyncResult from a list of (result, error) per handle."""
+
+    def __init__(self, **answers):
+        self.answers = answers
+        self.polls = []
+
+    def map(self, method, params_list, concurrency=None, ordered=False):
+        for index, params in enumerate(params_list):
+            handle = params['asyncHandle']
+            self.polls.append(handle)
+            result, error = self.answers[handle].pop(0)
+            yield index, result, error
+
+
+class WaiterTest(unittest.TestCase):
+
+    def wait(self, client, **kwargs):
+        waiter = async_results.AsyncResultWaiter(
+            client, sorted(client.answers), initial_interval=0,
+            max_interval=0, **kwargs)
+        return waiter, dict((handle, (result, error))
+                            for handle, result, error in waiter)
+
+    def test_transport_error_keeps_polling(self):
+        client = _Client(a=[(None, socket.timeout('timed out')),
+                            (None, IOError('connection reset')),
+                            (RUNNING, None), (COMPLETE, None)])
+        waiter, done = self.wait(client)
+        self.assertEqual(done, {'a': (COMPLETE, None)})
+        self.assertEqual(client.polls, ['a'] * 4)
+        self.assertEqual(waiter.poll_errors, 2)
+        self.assertEqual(waiter.failed, 0)
+
+    def test_busy_cluster_keeps_polling(self):
+        client = _Client(a=[(None, _fault('xServiceUnavailable')),
+                            (COMPLETE, None)])
+        waiter, done = self.wait(client)
+        self.assertEqual(done, {'a': (COMPLETE, None)})
+
+    def test_failed_result_fails(self):
+        failed = {'status': 'complete',
+                  'error': {'name': 'xCloneFailed', 'message': 'failed'}}
+        client = _Client(a=[(failed, None)],
+                         b=[(None, _fault('xInvalidAsyncResultHandle'))])
+        waiter, done = self.wait(client)
+        self.assertEqual(waiter.failed, 2)
+        self.assertEqual(client.polls, ['a', 'b'])
+
+    def test_poll_errors_are_capped(self):
+        client = _Client(a=[(None, IOError('unreachable'))] * 3)
+        waiter, done = self.wait(client, max_poll_errors=3)
+        self.assertIsInstance(done['a'][1], IOError)
+        self.assertEqual(len(client.polls), 3)
+
+
+class NoWaitTest(unittest.TestCase):
+
+    def setUp(self):
+        # Clones that never finish on their own.
+        self.cluster = FakeCluster(volume_count=1, async_delay=60).start()
+        self.client = SolidFireAPI(endpoint_dict=self.cluster.endpoint_dict,
+                                   api_version='8.0')
+
+    def tearDown(self):
+        self.client.close()
+        self.cluster.stop()
+
+    def test_every_clone_is_started_at_once(self):
+        specs = [{'volumeID': 1, 'name': 'clone-%d' % i} for i in range(4)]
+        start = time.time()
+        events = list(clones.CloneOrchestrator(self.client, specs,
+                                               wait=False))
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual([index for index, _, _ in events], [0, 1, 2, 3])
+        started = [result for _, result, error in events if error is None]
+        # Beyond cloneJobsPerVolumeMax the cluster turns clones away.
+        self.assertEqual(len(started), 2)
+        for result in started:
+            self.assertIn('asyncHandle', result)
+        self.assertEqual(
+            self.client.get_async_result(
+                started[0]['asyncHandle'])['status'], 'running')
+
+
+if __name__ == '__main__':
+    unittest.main()
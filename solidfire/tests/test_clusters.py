@@ -0,0 +1,51 @@
+"""Checks ClusterPool deadlines."""
+
+import time
+import unittest
+
+from solidfire import throttle
+from solidfire.managers import clusters
+
+
+class _SlowClient(object):
+    """Answers nothing for seconds."""
+
+    def list_volumes(self, **kwargs):
+        time.sleep(3)
+        return []
+
+
+class _StreamingClient(object):
+    """Sends many records at once."""
+
+    def list_volumes(self, **kwargs):
+        for volume_id in range(1500):
+            yield {'volumeID': volume_id}
+
+
+class DeadlineTest(unittest.TestCase):
+
+    def test_slow_cluster_times_out_while_another_streams(self):
+        pool = clusters.ClusterPool([], concurrency=2)
+        pool.clusters = [('slow', _SlowClient(), 0.2),
+                         ('busy', _StreamingClient(), 60)]
+        start = time.time()
+        events = []
+        for name, record, error in pool.records('list_volumes',
+                                                stream=True):
+            events.append((name, time.time() - start, error))
+            # A slow consumer, so records are always waiting.
+            time.sleep(0.001)
+        errors = [(name, elapsed, error) for name, elapsed, error in events
+                  if error is not None]
+        self.assertEqual(len(errors), 1)
+        name, elapsed, error = errors[0]
+        self.assertEqual(name, 'slow')
+        self.assertEqual(throttle.error_name(error), 'xClusterTimeout')
+        self.assertLess(elapsed, 1.0)
+        # The other cluster kept streaming after the timeout.
+        self.assertEqual(events[-1][0], 'busy')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+"""Checks that the sfcli command manifest matches the command modules."""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from solidfire.cli import commands
+
+
+class ManifestTest(unittest.TestCase):
+
+    def test_manifest_matches_modules(self):
+        from solidfire.cli.commands._manifest import COMMANDS
+        self.assertEqual(COMMANDS, commands.scan(),
+                         'Regenerate the manifest with '
+                         'commands.write_manifest()')
+
+    def test_load_manifest_matches_scan(self):
+        self.assertEqual(commands.load_manifest(), commands.scan())
+
+
+class StaleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self._write('cmd_one.py', 'def cli():\n    """One."""\n')
+        commands.write_manifest(self.path)
+        self.manifest = {'one': 'One.'}
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def _write(self, filename, source):
+        with open(os.path.join(self.path, filename), 'w') as module:
+            module.write(source)
+
+    def test_fresh(self):
+        self.assertEqual(commands.scan(self.path), self.manifest)
+        self.assertFalse(commands.is_stale(self.manifest, self.path))
+
+    def test_added_module(self):
+        self._write('cmd_two.py', 'def cli():\n    """Two."""\n')
+        self.assertTrue(commands.is_stale(self.manifest, self.path))
+
+    def test_removed_module(self):
+        os.remove(os.path.join(self.path, 'cmd_one.py'))
+        self.assertTrue(commands.is_stale(self.manifest, self.path))
+
+    def test_changed_module(self):
+        later = time.time() + commands.MTIME_SLACK + 10
+        os.utime(os.path.join(self.path, 'cmd_one.py'), (later, later))
+        self.assertTrue(commands.is_stale(self.manifest, self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+"""Checks what DatabaseCache hands out and raises."""
+
+import unittest
+
+from solidfire.managers import database
+from solidfire.solidfire_element_api import SolidFireAPI
+from solidfire import throttle
+from solidfire.tests.fake_cluster import FakeCluster
+
+
+class DatabaseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cluster = FakeCluster(volume_count=0).start()
+        self.client = SolidFireAPI(endpoint_dict=self.cluster.endpoint_dict,
+                                   api_version='8.0')
+        self.cache = database.DatabaseCache(self.client)
+
+    def tearDown(self):
+        self.client.close()
+        self.cluster.stop()
+
+    def test_entry_is_a_deep_copy(self):
+        self.cache.create('/a', {'hosts': ['one']})
+        entry = self.cache.entry('/a')
+        entry['data']['hosts'].append('two')
+        self.assertEqual(self.cache.get('/a'), {'hosts': ['one']})
+
+    def test_set_missing_path(self):
+        with self.assertRaises(database.VersionConflict) as caught:
+            self.cache.set('/missing', 1)
+        self.assertEqual(caught.exception.msg[0], 'API response: %s')
+        self.assertEqual(throttle.error_name(caught.exception),
+                         'xDBNoSuchPath')
+        self.assertIsNone(caught.exception.entry)
+
+
+if __name__ == '__main__':
+    unittest.main()
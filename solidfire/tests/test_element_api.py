@@ -0,0 +1,262 @@
+"""Checks that SolidFireAPI and AsyncSolidFireAPI behave the same.
+
+Each test makes the same calls through both clients, each against its own
+FakeCluster built the same way, and compares the results and errors.
+"""
+
+import sys
+import unittest
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+from solidfire.solidfire_element_api import SolidFireAPI
+from solidfire.solidfire_element_api import SolidFireRequestException
+from solidfire.tests.fake_cluster import FakeCluster
+
+# Members holding the time of the call, which may differ between clusters.
+TIME_KEYS = ('createTime', 'lastUpdateTime')
+
+VOLUME_COUNT = 5
+
+
+def _untimed(value):
+    """Returns value with the TIME_KEYS left out of every dict in it."""
+    if isinstance(value, dict):
+        return dict((key, _untimed(item)) for key, item in value.items()
+                    if key not in TIME_KEYS)
+    if isinstance(value, (list, tuple)):
+        return [_untimed(item) for item in value]
+    return value
+
+
+def _public(cls):
+    return set(name for name in dir(cls) if not name.startswith('_'))
+
+
+@unittest.skipIf(sys.version_info < (3, 6), 'asyncio client needs 3.6+')
+class ElementAPIParityTest(unittest.TestCase):
+
+    def setUp(self):
+        from solidfire.async_element_api import AsyncSolidFireAPI
+
+        self.clusters = [FakeCluster(volume_count=VOLUME_COUNT,
+                                     async_delay=0).start()
+                         for _ in range(2)]
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.client = SolidFireAPI(
+            endpoint_dict=self.clusters[0].endpoint_dict, api_version='8.0')
+        self.async_client = AsyncSolidFireAPI(
+            endpoint_dict=self.clusters[1].endpoint_dict, api_version='8.0')
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.async_client.aclose())
+        self.loop.close()
+        asyncio.set_event_loop(None)
+        self.client.close()
+        for cluster in self.clusters:
+            cluster.stop()
+
+    def _collect(self, iterator):
+        """Drains an async generator on the test's event loop."""
+        items = []
+        while True:
+            try:
+                items.append(self.loop.run_until_complete(
+                    iterator.__anext__()))
+            except StopAsyncIteration:
+                return items
+
+    def both(self, call):
+        """Returns the results of call(client) for both clients."""
+        return (call(self.client),
+                self.loop.run_until_complete(call(self.async_client)))
+
+    def assertSameResult(self, call):
+        result, async_result = self.both(call)
+        self.assertEqual(_untimed(result), _untimed(async_result))
+        return result
+
+    def assertSameError(self, call):
+        with self.assertRaises(SolidFireRequestException) as caught:
+            call(self.client)
+        with self.assertRaises(SolidFireRequestException) as async_caught:
+            self.loop.run_until_complete(call(self.async_client))
+        self.assertEqual(caught.exception.msg, async_caught.exception.msg)
+        return caught.exception.msg[1]['error']['name']
+
+    def test_same_public_methods(self):
+        from solidfire.async_element_api import AsyncSolidFireAPI
+
+        self.assertEqual(_public(SolidFireAPI),
+                         _public(AsyncSolidFireAPI) - set(['aclose']))
+        # Inherited code paths must still be able to call these.
+        for name in ('close', '_post'):
+            self.assertFalse(asyncio.iscoroutinefunction(
+                getattr(AsyncSolidFireAPI, name)))
+
+    def test_stream_is_refused(self):
+        with self.assertRaises(ValueError):
+            self.loop.run_until_complete(
+                self.async_client.list_volumes(stream=True))
+
+    def test_limiter_slots_are_returned(self):
+        self.loop.run_until_complete(self.async_client.list_volumes())
+        with self.assertRaises(SolidFireRequestException):
+            self.loop.run_until_complete(
+                self.async_client.get_database_entry('/missing'))
+        limiter = self.async_client._get_limiter(
+            self.clusters[1].endpoint_dict['url'])
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_list_volumes(self):
+        volumes = self.assertSameResult(lambda c: c.list_volumes())
+        self.assertEqual(len(volumes), VOLUME_COUNT)
+        self.assertSameResult(lambda c: c.list_volumes(
+            start_volume_id=2, limit=2, fields=['volumeID', 'name']))
+
+    def test_clone_volume(self):
+        clone = self.assertSameResult(
+            lambda c: c.clone_volume(1, 'clone', attributes={'a': 1}))
+        result = self.assertSameResult(
+            lambda c: c.get_async_result(clone['asyncHandle']))
+        self.assertEqual(result['status'], 'complete')
+        self.assertEqual(
+            'xInvalidAsyncResultHandle',
+            self.assertSameError(
+                lambda c: c.get_async_result(clone['asyncHandle'])))
+        self.assertEqual(
+            'xVolumeIDDoesNotExist',
+            self.assertSameError(lambda c: c.clone_volume(999, 'missing')))
+
+    def test_database_entries(self):
+        self.assertSameResult(
+            lambda c: c.create_database_entry('/a', {'x': 1}))
+        self.assertSameResult(lambda c: c.create_database_entry('/a/b', 2))
+        self.assertSameResult(lambda c: c.set_database_entry('/a', 1, 3))
+        entry = self.assertSameResult(lambda c: c.get_database_entry('/a'))
+        self.assertEqual(entry['dataVersion'], 2)
+        self.assertSameResult(lambda c: c.list_database_children('/a'))
+        self.assertSameResult(lambda c: c.list_database_children_data('/a'))
+        self.assertEqual(
+            'xDBVersionMismatch',
+            self.assertSameError(lambda c: c.set_database_entry('/a', 1, 4)))
+        self.assertEqual(
+            'xDBPathExists',
+            self.assertSameError(lambda c: c.create_database_entry('/a')))
+        self.assertSameResult(lambda c: c.delete_database_entry('/a/b', 1))
+        self.assertEqual(
+            'xDBNoSuchPath',
+            self.assertSameError(lambda c: c.get_database_entry('/a/b')))
+
+    def test_map(self):
+        params_list = [{'volumeID': volume_id}
+                       for volume_id in (1, 999, 2, 3)]
+        results = list(self.client.map('GetVolumeStats', params_list,
+                                       ordered=True))
+        async_results = self._collect(self.async_client.map(
+            'GetVolumeStats', params_list, ordered=True))
+        self.assertEqual([index for index, _, _ in results],
+                         [index for index, _, _ in async_results])
+        for (_, result, error), (_, async_result, async_error) in zip(
+                results, async_results):
+            self.assertEqual(result is None, async_result is None)
+            if error is None:
+                self.assertIsNone(async_error)
+                self.assertEqual(set(result), set(async_result))
+            else:
+                self.assertIsInstance(error, SolidFireRequestException)
+                self.assertIsInstance(async_error,
+                                      SolidFireRequestException)
+                self.assertEqual(error.msg, async_error.msg)
+        self.assertEqual([result is None for _, result, _ in results],
+                         [False, True, False, False])
+
+
+class StreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cluster = FakeCluster(volume_count=VOLUME_COUNT).start()
+        self.client = SolidFireAPI(endpoint_dict=self.cluster.endpoint_dict,
+                                   api_version='8.0')
+        self.limiter = self.client._get_limiter(
+            self.cluster.endpoint_dict['url'])
+
+    def tearDown(self):
+        self.client.close()
+        self.cluster.stop()
+
+    def test_slot_is_held_while_streaming(self):
+        volumes = self.client.list_volumes(stream=True)
+        next(volumes)
+        self.assertEqual(self.limiter.in_flight, 1)
+        self.assertEqual(len(list(volumes)), VOLUME_COUNT - 1)
+        self.assertEqual(self.limiter.in_flight, 0)
+
+    def test_slot_is_returned_when_stream_is_dropped(self):
+        volumes = self.client.list_volumes(stream=True)
+        next(volumes)
+        volumes.close()
+        self.assertEqual(self.limiter.in_flight, 0)
+
+
+@unittest.skipIf(sys.version_info < (3, 6), 'asyncio client needs 3.6+')
+class HTTPTest(unittest.TestCase):
+    """Responses the fake cluster doesn't send, from a raw server."""
+
+    RESPONSE = (b'HTTP/1.1 100 Continue\r\n\r\n'
+                b'HTTP/1.1 200 OK\r\n'
+                b'Content-Type: application/json\r\n\r\n'
+                b'{"id": null, "result": {"volumes": []}}')
+
+    def setUp(self):
+        from solidfire.async_element_api import AsyncSolidFireAPI
+
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.requests = 0
+        self.server = self.loop.run_until_complete(
+            asyncio.start_server(self._answer, '127.0.0.1', 0))
+        port = self.server.sockets[0].getsockname()[1]
+        self.client = AsyncSolidFireAPI(
+            endpoint_dict={'login': 'admin', 'password': 'admin',
+                           'url': 'http://127.0.0.1:%d' % port},
+            api_version='8.0')
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.client.aclose())
+        self.server.close()
+        self.loop.run_until_complete(self.server.wait_closed())
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    async def _answer(self, reader, writer):
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        await reader.readexactly(int(headers['content-length']))
+        self.requests += 1
+        # No Content-Length: the body ends when the connection does.
+        writer.write(self.RESPONSE)
+        await writer.drain()
+        writer.close()
+
+    def test_interim_response_and_body_to_eof(self):
+        for _ in range(2):
+            self.assertEqual(
+                self.loop.run_until_complete(self.client.list_volumes()),
+                [])
+        self.assertEqual(self.requests, 2)
+        # A connection whose body ended at EOF is never pooled.
+        self.assertFalse(any(self.client._pool._idle.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+"""Checks when SnapshotScheduler retries a failed CreateSnapshot."""
+
+import socket
+import time
+import unittest
+
+from solidfire.managers import scheduler
+from solidfire.solidfire_element_api import SolidFireRequestException
+
+INTERVAL = 3600
+
+
+def _fault(name, code=500):
+    return SolidFireRequestException(
+        ('API response: %s', {'error': {'name': name, 'code': code,
+                                        'message': name}}))
+
+
+class _Client(object):
+    """Raises the next of errors on each CreateSnapshot, then succeeds."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = []
+
+    def create_snapshot(self, volume_id, name=None, attributes=None):
+        self.calls.append(volume_id)
+        if self.errors:
+            raise self.errors.pop(0)
+        return {'snapshotID': len(self.calls)}
+
+
+class RetryTest(unittest.TestCase):
+
+    def run_scheduler(self, client, rounds=4, **kwargs):
+        sched = scheduler.SnapshotScheduler(client, retry_interval=0,
+                                            **kwargs)
+        schedule = scheduler.SnapshotSchedule(1, INTERVAL)
+        sched.add(schedule)
+        due = schedule.next_due(time.time())
+        # Each round runs whatever was retried in the round before; the
+        # next regular snapshot is an interval away.
+        for index in range(rounds):
+            sched.run_pending(due + 1 + index)
+        return sched
+
+    def test_timed_out_create_is_not_reissued(self):
+        client = _Client(socket.timeout('timed out'))
+        sched = self.run_scheduler(client)
+        self.assertEqual(client.calls, [1])
+        self.assertEqual(sched.failed, 1)
+        self.assertEqual(sched.retried, 0)
+
+    def test_server_error_is_not_reissued(self):
+        client = _Client(_fault('xHTTPError', 500))
+        sched = self.run_scheduler(client)
+        self.assertEqual(client.calls, [1])
+        self.assertEqual(sched.failed, 1)
+
+    def test_rejected_create_is_retried(self):
+        client = _Client(_fault('xMaxSnapshotsPerNodeExceeded'),
+                         _fault('xHTTPError', 503))
+        sched = self.run_scheduler(client)
+        self.assertEqual(client.calls, [1, 1, 1])
+        self.assertEqual(sched.retried, 2)
+        self.assertEqual(sched.issued, 1)
+        self.assertEqual(sched.failed, 0)
+
+    def test_retries_are_capped(self):
+        client = _Client(*[_fault('xServiceUnavailable')] * 10)
+        sched = self.run_scheduler(client, rounds=10, max_retries=2)
+        self.assertEqual(client.calls, [1, 1, 1])
+        self.assertEqual(sched.retried, 2)
+        self.assertEqual(sched.failed, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+"""Checks which snapshots retention_plan() lets go of."""
+
+import unittest
+
+from solidfire.managers import snapshots
+
+
+def _snapshot(snapshot_id, create_time, **kwargs):
+    snapshot = {'snapshotID': snapshot_id, 'volumeID': 1,
+                'createTime': create_time}
+    snapshot.update(kwargs)
+    return snapshot
+
+
+class RetentionPlanTest(unittest.TestCase):
+
+    def plan(self, *listed):
+        index = snapshots.SnapshotIndex(listed)
+        policy = snapshots.RetentionPolicy(keep_last=1)
+        delete, skipped = snapshots.retention_plan(index, [policy])
+        return ([snapshot['snapshotID'] for snapshot in delete],
+                [snapshot['snapshotID'] for snapshot in skipped])
+
+    def test_done_snapshots_are_deleted(self):
+        self.assertEqual(
+            self.plan(_snapshot(1, '2016-01-01T00:00:00Z', status='done'),
+                      _snapshot(2, '2016-01-02T00:00:00Z', status='done')),
+            ([1], []))
+
+    def test_other_states_are_skipped(self):
+        self.assertEqual(
+            self.plan(_snapshot(1, '2016-01-01T00:00:00Z',
+                                status='preparing'),
+                      _snapshot(2, '2016-01-02T00:00:00Z', status='done')),
+            ([], [1]))
+
+    def test_snapshot_without_status_is_kept(self):
+        self.assertEqual(
+            self.plan(_snapshot(1, '2016-01-01T00:00:00Z'),
+                      _snapshot(2, '2016-01-02T00:00:00Z')),
+            ([], [1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
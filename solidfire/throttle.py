@@ -0,0 +1,213 @@
+"""Adaptive concurrency limiting and retry policy for API requests.
+
+A busy cluster answers with throttling faults or HTTP 5xx errors long
+before it stops responding.  AIMDLimiter uses those signals, along with
+response latency, to find the number of in-flight calls an endpoint can
+sustain: the limit grows by one per window of successful calls and is
+halved whenever the endpoint shows signs of overload.  RetryPolicy decides
+which failed calls may be re-issued and how long to wait between tries.
+TokenBucket shapes the rate at which calls are started rather than how
+many are in flight.
+"""
+
+import random
+import threading
+import time
+
+# Faults the cluster uses to say "not now" rather than "never".
+RETRYABLE_ERRORS = frozenset([
+    'xDBConnectionLoss',
+    'xDBOperationTimeout',
+    'xNotReadyForIO',
+    'xSliceNotRegistered',
+    'xExceededLimit',
+    'xMaxClonesPerNodeExceeded',
+    'xMaxClonesPerVolumeExceeded',
+    'xMaxSnapshotsPerNodeExceeded',
+    'xServiceUnavailable',
+])
+
+# Faults with which the cluster turns a call away without acting on it,
+# so even a call with side effects can be made again.
+REJECTED_ERRORS = frozenset([
+    'xExceededLimit',
+    'xMaxClonesPerNodeExceeded',
+    'xMaxClonesPerVolumeExceeded',
+    'xMaxSnapshotsPerNodeExceeded',
+    'xNotReadyForIO',
+    'xServiceUnavailable',
+])
+
+# HTTP statuses answered before the request is handled at all.
+REJECTED_HTTP_STATUSES = frozenset([429, 503])
+
+# Method name prefixes of calls that have no side effects on the cluster
+# and can be re-issued freely.
+SAFE_METHOD_PREFIXES = ('Get', 'List')
+
+# Reads that still must not be repeated: a final async result is only
+# handed out once, so a retry after a lost response would lose it.
+UNSAFE_METHODS = frozenset(['GetAsyncResult'])
+
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_MIN_IN_FLIGHT = 1
+DEFAULT_INITIAL_IN_FLIGHT = 4
+
+# Smoothed latency this many times over the best seen is treated as
+# congestion.  Set to None on a limiter to react to errors only.
+LATENCY_TOLERANCE = 10.0
+
+
+def error_name(error):
+    """Returns the cluster fault name carried by a request exception."""
+    msg = getattr(error, 'msg', None)
+    try:
+        return msg[1]['error']['name']
+    except (TypeError, KeyError, IndexError):
+        return None
+
+
+def is_overload(error):
+    """True if error means the endpoint is busy, not that the call is bad."""
+    name = error_name(error)
+    if name is not None:
+        return name in RETRYABLE_ERRORS or name == 'xHTTPError'
+    # Transport level failures such as timeouts and refused connections.
+    return isinstance(error, (IOError, OSError))
+
+
+def is_rejected(error):
+    """True if the cluster refused the call outright, so it didn't run.
+
+    Unlike is_overload, timeouts and other transport errors don't count:
+    the call may well have gone through."""
+    name = error_name(error)
+    if name == 'xHTTPError':
+        return error.msg[1]['error'].get('code') in REJECTED_HTTP_STATUSES
+    return name in REJECTED_ERRORS
+
+
+class AIMDLimiter(object):
+    """Caps the number of concurrent calls to a single endpoint."""
+
+    def __init__(self, maximum, minimum=DEFAULT_MIN_IN_FLIGHT,
+                 initial=DEFAULT_INITIAL_IN_FLIGHT, decrease=0.5,
+                 latency_tolerance=LATENCY_TOLERANCE):
+        self.maximum = maximum
+        self.minimum = minimum
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.in_flight = 0
+        self.min_latency = {}
+        self.avg_latency = {}
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def try_acquire(self):
+        """Takes a slot if one is free; returns whether it did."""
+        with self._cond:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, method, latency, overloaded=False):
+        """Returns a slot, feeding back how the call went.
+
+        Smoothed latency is compared with the best seen for the same
+        method, since a large listing is expected to take longer than a
+        single Get."""
+        with self._cond:
+            self.in_flight -= 1
+            if not overloaded and self.latency_tolerance is not None:
+                best = self.min_latency.get(method)
+                if best is None or latency < best:
+                    self.min_latency[method] = best = latency
+                avg = self.avg_latency.get(method, latency)
+                avg = 0.8 * avg + 0.2 * latency
+                self.avg_latency[method] = avg
+                overloaded = avg > best * self.latency_tolerance
+            now = time.time()
+            if overloaded:
+                # Calls that were already in flight when the endpoint got
+                # busy all report it; only back off once per round trip.
+                if now - self._last_decrease > latency:
+                    self.limit = max(self.minimum,
+                                     self.limit * self.decrease)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+
+class TokenBucket(object):
+    """Hands out rate tokens per second, saving up at most burst."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self.tokens = self.burst
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if now > self._updated:
+            self.tokens = min(self.burst, self.tokens +
+                              (now - self._updated) * self.rate)
+            self._updated = now
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._refill(time.time())
+            self.rate = float(rate)
+
+    def take(self, count=1, now=None):
+        """Takes up to count whole tokens without waiting; returns how many."""
+        with self._lock:
+            self._refill(time.time() if now is None else now)
+            granted = min(int(count), int(self.tokens))
+            self.tokens -= granted
+            return granted
+
+    def wait_time(self, now=None):
+        """Seconds until the next whole token is available."""
+        with self._lock:
+            self._refill(time.time() if now is None else now)
+            if self.tokens >= 1 or self.rate <= 0:
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """Blocks until a token is available and takes it."""
+        while not self.take():
+            time.sleep(self.wait_time())
+
+
+class RetryPolicy(object):
+    """Retries read-only calls on transient failures with jittered backoff."""
+
+    def __init__(self, max_retries=DEFAULT_MAX_RETRIES, base_delay=0.5,
+                 max_delay=10.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, method, error, attempt):
+        if attempt > self.max_retries:
+            return False
+        if (not method.startswith(SAFE_METHOD_PREFIXES) or
+                method in UNSAFE_METHODS):
+            return False
+        return is_overload(error)
+
+    def delay(self, attempt):
+        """Full-jitter exponential backoff for the given attempt number."""
+        return random.uniform(0, min(self.max_delay,
+                                     self.base_delay * 2 ** (attempt - 1)))
@@ -1,6 +1,13 @@
 #!/usr/bin/env/python
 
+import codecs
+import json
 import re
+import threading
+
+from six.moves import queue
+
+DEFAULT_CONCURRENCY = 8
 
 
 def string_to_bytes(val):
@@ -9,9 +16,9 @@ def string_to_bytes(val):
                       'G': 1000 ** 3, 'T': 1000 ** 4,
                       'GB': 1000 ** 3, 'TB': 1000 ** 4}
     if val.isdigit():
-        return val
+        return int(val)
 
-    parsed_val = filter(None, re.split(r'(\d+)', val))
+    parsed_val = [part for part in re.split(r'(\d+)', val) if part]
     if len(parsed_val) != 2:
         raise
     if parsed_val[1] in conversion_map.keys():
@@ -27,3 +34,162 @@ def kv_string_to_dict(kv_string):
         kvs = item.split('=')
         new_dict[kvs[0]] = kvs[1]
     return new_dict
+
+
+def bounded_map(func, items, concurrency=DEFAULT_CONCURRENCY, ordered=False):
+    """Calls func on each item using at most `concurrency` worker threads.
+
+    Yields an (index, result, error) tuple per item, where index is the
+    position of the item in `items` and exactly one of result/error is
+    set.  Tuples are yielded as soon as each call finishes, or in input
+    order when `ordered` is True.  Abandoning the generator stops workers
+    from picking up any further items."""
+    items = list(items)
+    if not items:
+        return
+    todo = queue.Queue()
+    for index, item in enumerate(items):
+        todo.put((index, item))
+    done = queue.Queue()
+    stop = threading.Event()
+
+    def worker():
+        while not stop.is_set():
+            try:
+                index, item = todo.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                done.put((index, func(item), None))
+            except Exception as ex:
+                done.put((index, None, ex))
+
+    for i in range(max(1, min(int(concurrency), len(items)))):
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+
+    try:
+        pending = {}
+        next_index = 0
+        for i in range(len(items)):
+            entry = done.get()
+            if not ordered:
+                yield entry
+                continue
+            pending[entry[0]] = entry
+            while next_index in pending:
+                yield pending.pop(next_index)
+                next_index += 1
+    finally:
+        stop.set()
+
+
+class JSONArrayStream(object):
+    """Incrementally decodes the elements of one array in a JSON document.
+
+    Text is pushed in with feed(), which returns every element of the
+    array named `key` in the response's result object that has been
+    completely received so far.  Only the current partial element is
+    buffered, so a response holding tens of thousands of records never
+    has to be materialized at once, and whatever follows the array is
+    dropped.  close() returns the fully decoded document if the array was
+    never found (for instance an error response), or None otherwise."""
+
+    _whitespace = ' \t\n\r,'
+    _structure = re.compile(r'["{}\[\]:,]')
+    _string = re.compile(r'"(?:[^"\\]|\\.)*"', re.S)
+
+    def __init__(self, key):
+        self._key = key
+        self._decoder = json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._buf = ''
+        # Up to the array: how far _buf has been scanned, and one
+        # [bracket, last key] per enclosing object or array.
+        self._scanned = 0
+        self._stack = []
+        self._in_array = False
+        self._done = False
+
+    def _find_array(self):
+        """Scans _buf for the array; True once it starts at _buf[0]."""
+        buf = self._buf
+        pos = self._scanned
+        stack = self._stack
+        while True:
+            match = self._structure.search(buf, pos)
+            if match is None:
+                pos = len(buf)
+                break
+            pos = match.start()
+            char = match.group()
+            if char == '"':
+                string = self._string.match(buf, pos)
+                if string is None:
+                    # Partial string, wait for the rest of it.
+                    break
+                if stack and stack[-1][0] == '{' and stack[-1][1] is None:
+                    stack[-1][1] = json.loads(string.group())
+                pos = string.end()
+                continue
+            pos += 1
+            if char == '[' and len(stack) == 2 and \
+                    stack[0] == ['{', 'result'] and \
+                    stack[1] == ['{', self._key]:
+                self._buf = buf[pos:]
+                self._stack = []
+                return True
+            if char in '{[':
+                stack.append([char, None])
+            elif char in '}]':
+                if stack:
+                    stack.pop()
+            elif char == ',' and stack and stack[-1][0] == '{':
+                # The next string is a key again.
+                stack[-1][1] = None
+        self._scanned = pos
+        return False
+
+    def feed(self, data):
+        if self._done:
+            return []
+        if isinstance(data, bytes):
+            data = self._text.decode(data)
+        self._buf += data
+        if not self._in_array:
+            if not self._find_array():
+                return []
+            self._in_array = True
+
+        records = []
+        buf = self._buf
+        pos = 0
+        while True:
+            while pos < len(buf) and buf[pos] in self._whitespace:
+                pos += 1
+            if pos == len(buf):
+                break
+            if buf[pos] == ']':
+                self._done = True
+                pos = len(buf)
+                break
+            try:
+                record, end = self._decoder.raw_decode(buf, pos)
+            except ValueError:
+                # Partial element, wait for the rest of it.
+                break
+            if end == len(buf):
+                # A bare number may still be continued by the next chunk.
+                break
+            records.append(record)
+            pos = end
+        self._buf = buf[pos:]
+        return records
+
+    def close(self):
+        if self._in_array:
+            if not self._done:
+                raise ValueError('Truncated JSON array in response')
+            return None
+        return json.loads(self._buf + self._text.decode(b'', final=True))